@@ -4,7 +4,6 @@
 from http.server import BaseHTTPRequestHandler
 import json
 import os
-import google.genai as genai
 
 class handler(BaseHTTPRequestHandler):
     def do_POST(self):
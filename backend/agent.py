@@ -3,20 +3,33 @@ Advanced agent processor with mem0 integration and content routing
 Adapted for Google's URL Context tool
 """
 import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from datetime import datetime
 import json
-from mem0 import Memory
 import hashlib
-import re
+from concurrent.futures import ThreadPoolExecutor
+from app_factory import LazyClient, get_memory
+from classifier import create_classifier
+from metadata_extractor import extract_metadata
+import tracing
+from retrieval import RetrievalEngine
+from vector_index import HashingEmbedder, VectorIndex
 
 class WebsiteEaterAgent:
     def __init__(self, config: Dict[str, Any]):
         self.config = config
-        self.memory = Memory()
+        # One mem0 instance per process, shared with the app and built on first use
+        self.memory = config.get('memory') or LazyClient(get_memory)
         self.genai_client = config.get('genai_client')
         self.model_id = config.get('model_id', 'gemini-2.5-flash-preview-05-20')
         
+        # Local hybrid (BM25 + vector) index used for related-content lookups
+        self.retrieval = config.get('retrieval_engine') or RetrievalEngine(VectorIndex(HashingEmbedder()))
+        
+        # mem0 IDs of memories added or found by this agent, keyed by local_id (a cache; mem0 is the source of truth)
+        self.memory_ids: Dict[str, Any] = {}
+        self.write_concurrency = config.get('write_concurrency', 8)
+        
         # Content type handlers
         self.content_handlers = {
             'research': self.handle_research_content,
@@ -50,23 +63,17 @@ class WebsiteEaterAgent:
                 'destinations': ['product_database', 'knowledge_base']
             }
         }
+        
+        # Keyword rules compiled into a single-pass matcher, or a trained model when configured
+        self.classifier = create_classifier(self.routing_rules, config.get('classifier_model_path'))
     
     def identify_content_type(self, content: Dict[str, Any]) -> str:
         """Identify the type of content based on text analysis"""
-        text = content.get('content', '').lower()
-        
-        scores = {}
-        for content_type, rules in self.routing_rules.items():
-            score = 0
-            for keyword in rules['keywords']:
-                if keyword in text:
-                    score += text.count(keyword)
-            scores[content_type] = score
-        
-        # Return the content type with highest score, or 'general' if no matches
-        if max(scores.values()) > 0:
-            return max(scores, key=scores.get)
-        return 'general'
+        return self.classifier.classify(content.get('content', ''))
+    
+    def identify_content_types(self, contents: List[Dict[str, Any]]) -> List[str]:
+        """Classify many extractions in one batch"""
+        return self.classifier.classify_batch([c.get('content', '') for c in contents])
     
     def generate_content_hash(self, content: str) -> str:
         """Generate a hash for content deduplication"""
@@ -74,112 +81,220 @@ class WebsiteEaterAgent:
     
     def extract_metadata_from_content(self, content: str) -> Dict[str, Any]:
         """Extract metadata from Gemini's response"""
-        metadata = {}
-        
-        # Try to extract title
-        title_match = re.search(r'(?:Title|Título|Heading):\s*(.+)', content, re.IGNORECASE)
-        if title_match:
-            metadata['title'] = title_match.group(1).strip()
-        
-        # Try to extract author
-        author_match = re.search(r'(?:Author|Autor|By):\s*(.+)', content, re.IGNORECASE)
-        if author_match:
-            metadata['author'] = author_match.group(1).strip()
+        return extract_metadata(content)
+    
+    def local_id(self, user_id: str, content_hash: str) -> str:
+        """Key for a memory in the local retrieval index (hashes are deduplicated per user)"""
+        return f"{user_id}:{content_hash}"
+    
+    @staticmethod
+    def mem0_results(response) -> List[Dict[str, Any]]:
+        """Result items from a mem0 call, whichever shape the installed version returns"""
+        items = response.get('results', []) if isinstance(response, dict) else response
+        return [item for item in items or [] if isinstance(item, dict)]
+    
+    def find_memory_id(self, user_id: str, content_hash: str) -> Optional[str]:
+        """mem0 ID of the user's memory with this content hash - mem0 is persistent, so this also finds
+        memories stored before a restart or by another worker"""
+        with tracing.span('mem0.search'):
+            response = self.memory.search(query=content_hash, user_id=user_id, limit=5,
+                                          filters={'content_hash': content_hash})
+        for item in self.mem0_results(response):
+            if (item.get('metadata') or {}).get('content_hash', item.get('content_hash')) == content_hash:
+                return item.get('id')
+        return None
+    
+    def build_metadata(self, extracted_data: Dict[str, Any], content: str,
+                       content_type: str = None) -> Dict[str, Any]:
+        """Run the local stages: hashing, metadata extraction and content type"""
+        metadata = {
+            'url': extracted_data.get('url'),
+            'domain': extracted_data.get('domain'),
+            'timestamp': extracted_data.get('timestamp'),
+            'content_hash': self.generate_content_hash(content),
+            'content_length': len(content),
+            'extraction_status': extracted_data.get('extraction_status')
+        }
         
-        # Try to extract date
-        date_match = re.search(r'(?:Date|Published|Fecha):\s*(.+)', content, re.IGNORECASE)
-        if date_match:
-            metadata['publish_date'] = date_match.group(1).strip()
+        # Extract additional metadata from content
+        extracted_metadata = self.extract_metadata_from_content(content)
+        metadata.update(extracted_metadata)
         
-        # Extract keywords (look for comma-separated lists after Keywords:)
-        keywords_match = re.search(r'(?:Keywords|Tags):\s*(.+)', content, re.IGNORECASE)
-        if keywords_match:
-            keywords = [k.strip() for k in keywords_match.group(1).split(',')]
-            metadata['keywords'] = keywords
+        # Add URL metadata if available
+        if extracted_data.get('url_metadata'):
+            metadata['url_metadata'] = extracted_data['url_metadata']
         
+        # Identify content type
+        metadata['content_type'] = content_type or self.identify_content_type(extracted_data)
         return metadata
     
     def process(self, extracted_data: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         """Main processing pipeline for Gemini-extracted content"""
-        try:
-            # Extract content
-            content = extracted_data.get('content', '')
-            if not content:
-                return {
+        return self.process_batch([extracted_data], user_id)[0]
+    
+    def process_batch(self, extracted_items: List[Dict[str, Any]], user_id: str) -> List[Dict[str, Any]]:
+        """Process several extractions together; returns one result per item, in order.
+        Only the local side is batched (content types, one embedding batch and one vector upsert). mem0 still
+        gets one search per item this process has not seen and one add per new item - it has no bulk calls -
+        so those run concurrently, bounded by write_concurrency, rather than in fewer round trips"""
+        results: List[Dict[str, Any]] = [None] * len(extracted_items)
+        candidates = []
+        pending = []
+        # local_id -> indexes of later items in this batch with the same content
+        batch_duplicates: Dict[str, List[int]] = {}
+        content_types = self.identify_content_types(extracted_items)
+        
+        for i, extracted_data in enumerate(extracted_items):
+            try:
+                content = extracted_data.get('content', '')
+                if not content:
+                    results[i] = {
+                        'status': 'error',
+                        'error': 'No content extracted'
+                    }
+                    continue
+                
+                metadata = self.build_metadata(extracted_data, content, content_types[i])
+                local_id = self.local_id(user_id, metadata['content_hash'])
+                if local_id in batch_duplicates:
+                    batch_duplicates[local_id].append(i)
+                    continue
+                batch_duplicates[local_id] = []
+                candidates.append((i, extracted_data, content, metadata, local_id))
+            except Exception as e:
+                results[i] = {
                     'status': 'error',
-                    'error': 'No content extracted'
+                    'error': str(e),
+                    'error_type': type(e).__name__
                 }
-            
-            # Create metadata
-            metadata = {
-                'url': extracted_data.get('url'),
-                'domain': extracted_data.get('domain'),
-                'timestamp': extracted_data.get('timestamp'),
-                'content_hash': self.generate_content_hash(content),
-                'content_length': len(content),
-                'extraction_status': extracted_data.get('extraction_status')
-            }
-            
-            # Extract additional metadata from content
-            extracted_metadata = self.extract_metadata_from_content(content)
-            metadata.update(extracted_metadata)
-            
-            # Add URL metadata if available
-            if extracted_data.get('url_metadata'):
-                metadata['url_metadata'] = extracted_data['url_metadata']
-            
-            # Identify content type
-            content_type = self.identify_content_type(extracted_data)
-            metadata['content_type'] = content_type
-            
-            # Check for duplicates
-            existing_memories = self.memory.search(
-                query=metadata['content_hash'],
-                user_id=user_id,
-                limit=1
-            )
-            
-            if existing_memories and len(existing_memories) > 0:
-                return {
-                    'status': 'duplicate',
-                    'existing_memory_id': existing_memories[0].get('id'),
-                    'message': 'Content already processed'
+        
+        # Check for duplicates - IDs this process already knows first, then one exact-hash search in mem0
+        # per remaining item (concurrent, not batched)
+        unknown = [c for c in candidates if c[4] not in self.memory_ids]
+        if unknown:
+            find_memory_id = tracing.wrap(self.find_memory_id)
+            with ThreadPoolExecutor(max_workers=min(self.write_concurrency, len(unknown))) as executor:
+                lookups = [executor.submit(find_memory_id, user_id, metadata['content_hash'])
+                           for _, _, _, metadata, _ in unknown]
+            for (i, _, _, _, local_id), lookup in zip(unknown, lookups):
+                try:
+                    existing = lookup.result()
+                except Exception as e:
+                    results[i] = {'status': 'error', 'error': str(e), 'error_type': type(e).__name__}
+                    continue
+                if existing is not None:
+                    self.memory_ids[local_id] = existing
+        for candidate in candidates:
+            i, local_id = candidate[0], candidate[4]
+            if results[i] is not None:
+                continue
+            if local_id in self.memory_ids:
+                results[i] = self.duplicate_result(self.memory_ids[local_id])
+            else:
+                pending.append(candidate)
+        
+        if not pending:
+            return self.fill_batch_duplicates(results, batch_duplicates)
+        
+        # mem0 has no bulk add: still one add per item, the batch's adds just go out concurrently
+        add_memory = tracing.wrap(self.add_memory)
+        with ThreadPoolExecutor(max_workers=min(self.write_concurrency, len(pending))) as executor:
+            futures = [
+                executor.submit(
+                    add_memory,
+                    messages=[self.create_memory_message(content, metadata, metadata['content_type'])],
+                    user_id=user_id,
+                    metadata=metadata
+                )
+                for _, _, content, metadata, _ in pending
+            ]
+        
+        stored = []
+        for (i, extracted_data, content, metadata, local_id), future in zip(pending, futures):
+            try:
+                memory_ids = [item.get('id') for item in self.mem0_results(future.result()) if item.get('id')]
+                # Versions whose add() does not report the new ID are looked up by hash
+                memory_id = memory_ids[0] if memory_ids else self.find_memory_id(user_id, metadata['content_hash'])
+                if memory_id is None:
+                    raise RuntimeError('mem0 did not return an ID for the stored memory')
+                self.memory_ids[local_id] = memory_id
+                stored.append((i, extracted_data, content, metadata, local_id))
+            except Exception as e:
+                results[i] = {
+                    'status': 'error',
+                    'error': str(e),
+                    'error_type': type(e).__name__
                 }
-            
-            # Store main memory entry
-            memory_message = self.create_memory_message(content, metadata, content_type)
-            memory_result = self.memory.add(
-                messages=[memory_message],
-                user_id=user_id,
-                metadata=metadata
-            )
-            
-            # Process with content-specific handler
-            handler = self.content_handlers.get(content_type, self.handle_general_content)
-            handler_result = handler(extracted_data, metadata, user_id)
-            
-            # Determine routing
-            routes = self.determine_routes(content_type, metadata, handler_result)
-            
-            # Find related content
-            related_memories = self.find_related_content(extracted_data, user_id)
-            
-            return {
-                'status': 'success',
-                'memory_id': memory_result,
-                'content_type': content_type,
-                'metadata': metadata,
-                'handler_result': handler_result,
-                'routes': routes,
-                'related_memories': related_memories
-            }
-            
-        except Exception as e:
-            return {
-                'status': 'error',
-                'error': str(e),
-                'error_type': type(e).__name__
-            }
+        
+        if not stored:
+            return self.fill_batch_duplicates(results, batch_duplicates)
+        
+        # One embedding batch and one vector upsert for every stored item
+        self.retrieval.add_many(
+            [local_id for _, _, _, _, local_id in stored],
+            [f"{metadata.get('title', '')}\n{content}" for _, _, content, metadata, _ in stored],
+            owner=user_id,
+            metadatas=[metadata for _, _, _, metadata, _ in stored]
+        )
+        
+        for i, extracted_data, content, metadata, local_id in stored:
+            try:
+                content_type = metadata['content_type']
+                
+                # Process with content-specific handler
+                handler = self.content_handlers.get(content_type, self.handle_general_content)
+                handler_result = handler(extracted_data, metadata, user_id)
+                
+                # Determine routing
+                routes = self.determine_routes(content_type, metadata, handler_result)
+                
+                # Find related content
+                related_memories = self.find_related_content(extracted_data, user_id)
+                
+                results[i] = {
+                    'status': 'success',
+                    'memory_id': self.memory_ids[local_id],
+                    'content_type': content_type,
+                    'metadata': metadata,
+                    'handler_result': handler_result,
+                    'routes': routes,
+                    'related_memories': related_memories
+                }
+            except Exception as e:
+                results[i] = {
+                    'status': 'error',
+                    'error': str(e),
+                    'error_type': type(e).__name__
+                }
+        
+        return self.fill_batch_duplicates(results, batch_duplicates)
+    
+    @staticmethod
+    def duplicate_result(memory_id: str) -> Dict[str, Any]:
+        return {
+            'status': 'duplicate',
+            'existing_memory_id': memory_id,
+            'message': 'Content already processed'
+        }
+    
+    def fill_batch_duplicates(self, results: List[Dict[str, Any]], batch_duplicates: Dict[str, List[int]]) -> List[Dict[str, Any]]:
+        """Repeats within one batch point at the mem0 ID of the copy that was stored (or share its error)"""
+        for local_id, repeats in batch_duplicates.items():
+            for i in repeats:
+                if local_id in self.memory_ids:
+                    results[i] = self.duplicate_result(self.memory_ids[local_id])
+                else:
+                    results[i] = {
+                        'status': 'error',
+                        'error': 'Storing an identical item earlier in the batch failed',
+                        'error_type': 'DuplicateOfFailedItem'
+                    }
+        return results
+    
+    def add_memory(self, **kwargs):
+        """One mem0 write, traced as its own span"""
+        with tracing.span('mem0.add'):
+            return self.memory.add(**kwargs)
     
     def create_memory_message(self, content: str, metadata: Dict[str, Any], content_type: str) -> Dict[str, Any]:
         """Create a structured memory message"""
@@ -221,39 +336,24 @@ class WebsiteEaterAgent:
         
         return routes
     
-    def find_related_content(self, extracted_data: Dict[str, Any], user_id: str) -> List[Dict[str, Any]]:
-        """Find related content in memory"""
-        # Search by domain
-        domain_results = self.memory.search(
-            query=extracted_data.get('domain', ''),
-            user_id=user_id,
-            limit=3
-        )
-        
-        # Search by extracted keywords if available
-        keyword_results = []
+    def find_related_content(self, extracted_data: Dict[str, Any], user_id: str, limit: int = 5,
+                             **filters) -> List[Dict[str, Any]]:
+        """Find related content with one hybrid query; filters are domain, content_type, since, until"""
         content = extracted_data.get('content', '')
-        if content:
-            # Extract a meaningful phrase from content for search
-            words = content.split()[:10]  # First 10 words
-            search_phrase = ' '.join(words)
-            keyword_results = self.memory.search(
-                query=search_phrase,
-                user_id=user_id,
-                limit=3
-            )
-        
-        # Combine and deduplicate
-        all_results = domain_results + keyword_results
-        seen_ids = set()
-        unique_results = []
         
-        for result in all_results:
-            if result.get('id') not in seen_ids:
-                seen_ids.add(result.get('id'))
-                unique_results.append(result)
+        # Domain plus the opening of the page, scored by BM25 and vector similarity fused with RRF
+        query = ' '.join([extracted_data.get('domain') or ''] + content.split()[:50])
         
-        return unique_results[:5]  # Return top 5 related memories
+        results = self.retrieval.search(
+            query,
+            owner=user_id,
+            k=limit,
+            exclude_ids=[self.local_id(user_id, self.generate_content_hash(content))] if content else [],
+            **filters
+        )
+        for result in results:
+            result['memory_id'] = self.memory_ids.get(result['id'])
+        return results
     
     # Content-specific handlers
     def handle_research_content(self, extracted_data: Dict[str, Any], metadata: Dict[str, Any], user_id: str) -> Dict[str, Any]:
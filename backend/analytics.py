@@ -0,0 +1,215 @@
+"""
+Columnar analytics over memory metadata
+A background thread periodically copies the metadata columns into an Arrow table (saved as a
+Parquet snapshot when a directory is configured); aggregate queries run vectorized against the
+snapshot and never touch the live memory store
+"""
+import glob
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+DIMENSIONS = ('user_id', 'domain', 'content_type', 'extraction_method', 'url_accessed')
+BUCKETS = ('day', 'week', 'month')
+AGGREGATE_NAMES = {
+    'id_count': 'count',
+    'content_length_sum': 'total_content_length',
+    'content_length_mean': 'avg_content_length'
+}
+
+
+class AnalyticsUnavailable(Exception):
+    """Raised when pyarrow is not installed"""
+
+
+def _timestamps(values):
+    # Arrow parses ISO-8601 strings natively; fall back per value only when the batch has bad or mixed entries
+    try:
+        return pa.array(values, pa.string()).cast(pa.timestamp('us'))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        parsed = []
+        for value in values:
+            try:
+                dt = datetime.fromisoformat(value)
+                parsed.append(dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt)
+            except (TypeError, ValueError):
+                parsed.append(None)
+        return pa.array(parsed, pa.timestamp('us'))
+
+
+def build_table(memories):
+    """Arrow table of the metadata columns; low-cardinality strings are dictionary-encoded"""
+    rows = list(memories)
+    metadata = [m.get('metadata') or {} for m in rows]
+
+    def dictionary(values):
+        return pa.array(values, pa.string()).dictionary_encode()
+
+    return pa.table({
+        'id': pa.array([m['id'] for m in rows], pa.string()),
+        'user_id': dictionary([m.get('user_id') for m in rows]),
+        'url': pa.array([md.get('url') for md in metadata], pa.string()),
+        'domain': dictionary([md.get('domain') for md in metadata]),
+        'content_type': dictionary([md.get('content_type') for md in metadata]),
+        'timestamp': _timestamps([md.get('timestamp') for md in metadata]),
+        'content_length': pa.array([md.get('content_length') or len(m.get('content') or '')
+                                    for m, md in zip(rows, metadata)], pa.int64()),
+        'extraction_method': dictionary([md.get('extraction_method') for md in metadata]),
+        'url_accessed': pa.array([bool(md.get('url_accessed')) for md in metadata], pa.bool_())
+    })
+
+
+def query(table, group_by=(), bucket=None, since=None, until=None, limit=None, **filters):
+    """Filter, optionally bucket by time, group and aggregate (count, total and average content length)"""
+    if filters:
+        mask = None
+        for column, value in filters.items():
+            if value is None:
+                continue
+            if column not in DIMENSIONS:
+                raise ValueError(f'Cannot filter on {column}')
+            if column == 'url_accessed':
+                value = str(value).lower() in ('1', 'true', 'yes')
+            values = table[column]
+            if pa.types.is_dictionary(values.type):
+                values = values.cast(values.type.value_type)
+            condition = pc.equal(values, value)
+            mask = condition if mask is None else pc.and_(mask, condition)
+        if mask is not None:
+            table = table.filter(mask)
+    if since:
+        table = table.filter(pc.greater_equal(table['timestamp'], pa.scalar(datetime.fromisoformat(since), pa.timestamp('us'))))
+    if until:
+        table = table.filter(pc.less_equal(table['timestamp'], pa.scalar(datetime.fromisoformat(until), pa.timestamp('us'))))
+
+    keys = list(group_by)
+    for key in keys:
+        if key not in DIMENSIONS:
+            raise ValueError(f'Cannot group by {key}')
+    if bucket:
+        if bucket not in BUCKETS:
+            raise ValueError(f'bucket must be one of {", ".join(BUCKETS)}')
+        table = table.append_column('period', pc.floor_temporal(table['timestamp'], unit=bucket))
+        keys.append('period')
+
+    if not keys:
+        lengths = table['content_length']
+        return [{
+            'count': table.num_rows,
+            'total_content_length': pc.sum(lengths).as_py() or 0,
+            'avg_content_length': pc.mean(lengths).as_py()
+        }]
+
+    grouped = table.group_by(keys).aggregate([
+        ('id', 'count'), ('content_length', 'sum'), ('content_length', 'mean')
+    ])
+    grouped = grouped.rename_columns([AGGREGATE_NAMES.get(name, name) for name in grouped.column_names])
+    grouped = grouped.sort_by([('count', 'descending')])
+    if limit:
+        grouped = grouped.slice(0, limit)
+
+    results = grouped.to_pylist()
+    for row in results:
+        if row.get('period') is not None:
+            row['period'] = row['period'].date().isoformat()
+    return results
+
+
+class AnalyticsSnapshots:
+    def __init__(self, source, directory=None, interval_seconds=300, keep=3):
+        """source() returns the memories to snapshot; snapshots are refreshed every interval_seconds"""
+        self.source = source
+        self.directory = directory
+        self.interval_seconds = interval_seconds
+        self.keep = keep
+
+        self._table = None
+        self._info = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._worker = None
+
+    def table(self):
+        """Latest snapshot, built (or loaded from disk) on first use"""
+        if pa is None:
+            raise AnalyticsUnavailable('Analytics requires the pyarrow package')
+        self._ensure_worker()
+        with self._lock:
+            table = self._table
+        if table is None:
+            table = self._load_latest()
+        if table is None:
+            self.refresh()
+            with self._lock:
+                table = self._table
+        return table
+
+    def refresh(self):
+        """Build a new snapshot now; returns its info"""
+        if pa is None:
+            raise AnalyticsUnavailable('Analytics requires the pyarrow package')
+        with self._refresh_lock:
+            start = time.perf_counter()
+            table = build_table(self.source())
+            path = self._write(table) if self.directory else None
+            info = {
+                'rows': table.num_rows,
+                'built_at': datetime.now().isoformat(),
+                'build_seconds': round(time.perf_counter() - start, 3),
+                'path': path
+            }
+            with self._lock:
+                self._table = table
+                self._info = info
+            return info
+
+    def info(self):
+        with self._lock:
+            return dict(self._info) if self._info else None
+
+    def query(self, **kwargs):
+        return query(self.table(), **kwargs)
+
+    def _write(self, table):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"memories-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}.parquet")
+        pq.write_table(table, path + '.tmp', compression='zstd')
+        os.replace(path + '.tmp', path)
+        for old in sorted(glob.glob(os.path.join(self.directory, 'memories-*.parquet')))[:-self.keep]:
+            os.remove(old)
+        return path
+
+    def _load_latest(self):
+        if not self.directory:
+            return None
+        snapshots = sorted(glob.glob(os.path.join(self.directory, 'memories-*.parquet')))
+        if not snapshots:
+            return None
+        table = pq.read_table(snapshots[-1], memory_map=True)
+        with self._lock:
+            if self._table is None:
+                self._table = table
+                self._info = {'rows': table.num_rows, 'path': snapshots[-1], 'loaded_from_disk': True}
+            return self._table
+
+    def _ensure_worker(self):
+        # Started lazily so it runs in the serving process, not a pre-fork master
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='analytics-snapshots', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval_seconds)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Analytics snapshot error: {e}")
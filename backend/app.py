@@ -1,26 +1,22 @@
 import os
-from flask import Flask, request, jsonify, render_template_string
-from flask_cors import CORS
-from google import genai
-from google.genai.types import Tool, GenerateContentConfig, GoogleSearch
-from mem0 import Memory
-from dotenv import load_dotenv
+from flask import request, jsonify
+from app_factory import create_app, get_genai_client, genai_types, LazyClient, get_memory
+from static_assets import static_page, register_bundle
+import metrics
+import tracing
 import json
 from datetime import datetime
 from urllib.parse import urlparse
 import hashlib
 
-# Load environment variables
-load_dotenv()
+# Load environment variables and build the app
+app = create_app(__name__)
 
-app = Flask(__name__)
-CORS(app)
+# Google GenAI client - shared, and created on first use
+genai_client = LazyClient(get_genai_client)
 
-# Initialize Google GenAI client
-genai_client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
-
-# Initialize mem0
-memory = Memory()
+# mem0 - shared with the agent, and created on first use
+memory = LazyClient(get_memory)
 
 # Configuration
 class Config:
@@ -29,14 +25,30 @@ class Config:
     USER_ID = os.getenv('USER_ID', 'default_user')
     AGENT_ID = os.getenv('AGENT_ID', 'website_eater_agent')
     MODEL_ID = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash-preview-05-20')
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'hashing')
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-004')
+    VECTOR_INDEX_DIR = os.getenv('VECTOR_INDEX_DIR', '')
+    CLASSIFIER_MODEL_PATH = os.getenv('CLASSIFIER_MODEL_PATH', '')
+    FRONTEND_DIST = os.getenv('FRONTEND_DIST', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend', 'dist'))
+
+# Prebuilt React UI (python frontend/build.py); the built-in page below is the fallback
+frontend_index = register_bundle(app, Config.FRONTEND_DIST)
 
 # Import the agent
 from agent import WebsiteEaterAgent
+from retrieval import RetrievalEngine
+from vector_index import VectorIndex, create_embedder
 
 # Initialize agent
 agent_config = {
     'genai_client': genai_client,
-    'model_id': Config.MODEL_ID
+    'memory': memory,
+    'model_id': Config.MODEL_ID,
+    'classifier_model_path': Config.CLASSIFIER_MODEL_PATH or None,
+    'retrieval_engine': RetrievalEngine(VectorIndex(
+        create_embedder(Config.EMBEDDING_BACKEND, genai_client, Config.EMBEDDING_MODEL),
+        directory=Config.VECTOR_INDEX_DIR or None
+    ))
 }
 agent = WebsiteEaterAgent(agent_config)
 
@@ -44,11 +56,11 @@ def extract_content_with_gemini(url, options=None):
     """Use Google's URL Context tool to extract content from a URL"""
     try:
         # Create the URL context tool
-        tools = [Tool(url_context={})]
+        tools = [genai_types().Tool(url_context={})]
         
         # Add Google Search if deep analysis is requested
         if options and options.get('deep_analysis'):
-            tools.append(Tool(google_search={}))
+            tools.append(genai_types().Tool(google_search={}))
         
         # Build the prompt based on options
         prompt_parts = [f"Extract and analyze the content from this URL: {url}"]
@@ -63,14 +75,17 @@ def extract_content_with_gemini(url, options=None):
         prompt = " ".join(prompt_parts)
         
         # Generate content using Gemini
-        response = genai_client.models.generate_content(
-            model=Config.MODEL_ID,
-            contents=prompt,
-            config=GenerateContentConfig(
-                tools=tools,
-                response_modalities=["TEXT"],
+        metrics.label(model=Config.MODEL_ID)
+        with metrics.stage('llm', {'gen_ai.system': 'gemini', 'gen_ai.request.model': Config.MODEL_ID}):
+            response = genai_client.models.generate_content(
+                model=Config.MODEL_ID,
+                contents=prompt,
+                config=genai_types().GenerateContentConfig(
+                    tools=tools,
+                    response_modalities=["TEXT"],
+                )
             )
-        )
+            tracing.record_usage(response)
         
         # Extract the response
         content = ""
@@ -106,9 +121,10 @@ def extract_content_with_gemini(url, options=None):
 
 # API Routes
 @app.route('/')
+@static_page(override=frontend_index)
 def index():
     """Serve the frontend"""
-    return render_template_string('''
+    return '''
     <!DOCTYPE html>
     <html>
     <head>
@@ -306,7 +322,7 @@ def index():
         </script>
     </body>
     </html>
-    ''')
+    '''
 
 @app.route('/api/process', methods=['POST'])
 def process_url():
@@ -319,6 +335,7 @@ def process_url():
         
         if not url:
             return jsonify({'status': 'error', 'error': 'No URL provided'}), 400
+        tracing.set_attributes({'url.domain': urlparse(url).netloc})
         
         # Extract content using Gemini's URL Context tool
         extracted_data = extract_content_with_gemini(url, options)
@@ -331,6 +348,7 @@ def process_url():
         
         # Process with agent
         processing_result = agent.process(extracted_data, user_id)
+        metrics.label(content_type=processing_result.get('content_type'))
         
         # Extract title from content (Gemini should provide this in the response)
         title = "Untitled"
@@ -361,7 +379,8 @@ def process_url():
 def get_memories(user_id):
     """Get all memories for a user"""
     try:
-        memories = memory.get_all(user_id=user_id)
+        with tracing.span('mem0.get_all'):
+            memories = memory.get_all(user_id=user_id)
         return jsonify({
             'status': 'success',
             'memories': memories
@@ -371,13 +390,30 @@ def get_memories(user_id):
 
 @app.route('/api/search', methods=['POST'])
 def search_memories():
-    """Search memories"""
+    """Search memories - mem0 by default, or the local index with mode=semantic|keyword|hybrid"""
     try:
         data = request.json
         query = data.get('query')
         user_id = data.get('user_id', Config.USER_ID)
+        limit = int(data.get('limit', 10))
+        mode = data.get('mode') or request.args.get('mode')
         
-        results = memory.search(query=query, user_id=user_id, limit=10)
+        if mode is None:
+            with tracing.span('mem0.search', {'mem0.limit': limit}):
+                results = memory.search(query=query, user_id=user_id, limit=limit)
+        elif mode in RetrievalEngine.MODES:
+            results = agent.retrieval.search(
+                query,
+                owner=user_id,
+                k=limit,
+                mode=mode,
+                domain=data.get('domain'),
+                content_type=data.get('content_type'),
+                since=data.get('since'),
+                until=data.get('until')
+            )
+        else:
+            return jsonify({'status': 'error', 'error': 'mode must be semantic, keyword or hybrid'}), 400
         
         return jsonify({
             'status': 'success',
@@ -405,21 +441,23 @@ def batch_process():
                 'error': 'Maximum 20 URLs per batch (Gemini API limit)'
             }), 400
         
+        # Extract every URL first, then store the whole batch in one agent call
+        extracted_items = [extract_content_with_gemini(url, options) for url in urls]
+        processing_results = agent.process_batch(extracted_items, user_id)
+        
         results = []
-        for url in urls:
-            try:
-                extracted_data = extract_content_with_gemini(url, options)
-                processing_result = agent.process(extracted_data, user_id)
+        for url, processing_result in zip(urls, processing_results):
+            if processing_result.get('status') == 'error':
                 results.append({
                     'url': url,
-                    'status': 'success',
-                    'memory_id': processing_result.get('memory_id')
+                    'status': 'error',
+                    'error': processing_result.get('error')
                 })
-            except Exception as e:
+            else:
                 results.append({
                     'url': url,
-                    'status': 'error',
-                    'error': str(e)
+                    'status': processing_result.get('status'),
+                    'memory_id': processing_result.get('memory_id') or processing_result.get('existing_memory_id')
                 })
         
         return jsonify({
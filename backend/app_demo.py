@@ -1,17 +1,15 @@
 import os
-from flask import Flask, request, jsonify, render_template_string
-from flask_cors import CORS
-from dotenv import load_dotenv
+from flask import request, jsonify
+from app_factory import create_app
+from static_assets import static_page
+from responses import stream_json_array
 import json
 from datetime import datetime
 from urllib.parse import urlparse
 import hashlib
 
-# Load environment variables
-load_dotenv()
-
-app = Flask(__name__)
-CORS(app)
+# Load environment variables and build the app
+app = create_app(__name__)
 
 # Configuration
 class Config:
@@ -67,6 +65,7 @@ def process_with_agent_demo(extracted_data, user_id):
 
 # API Routes
 @app.route('/')
+@static_page
 def index():
     """Serve the frontend"""
     demo_banner = """
@@ -75,7 +74,7 @@ def index():
     </div>
     """ if DEMO_MODE else ""
     
-    return render_template_string('''
+    return '''
     <!DOCTYPE html>
     <html>
     <head>
@@ -564,7 +563,7 @@ def index():
         </script>
     </body>
     </html>
-    ''')
+    '''
 
 @app.route('/api/process', methods=['POST'])
 def process_url():
@@ -601,11 +600,8 @@ def process_url():
 @app.route('/api/memories/<user_id>', methods=['GET'])
 def get_memories(user_id):
     """Get all memories for a user"""
-    user_memories = [m for m in demo_memories if m['user_id'] == user_id]
-    return jsonify({
-        'status': 'success',
-        'memories': user_memories
-    })
+    user_memories = (m for m in demo_memories if m['user_id'] == user_id)
+    return stream_json_array(user_memories, 'memories', {'status': 'success'})
 
 @app.route('/api/search', methods=['POST'])
 def search_memories():
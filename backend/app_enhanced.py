@@ -1,25 +1,31 @@
 import os
-from flask import Flask, request, jsonify, render_template_string
-from flask_cors import CORS
-import google.genai as genai
-from google.genai.types import GenerateContentConfig, Tool, GoogleSearch
-from dotenv import load_dotenv
+from flask import request, jsonify
+from app_factory import create_app, get_genai_client, genai_types, LazyClient
+from static_assets import static_page
+from responses import stream_json_array
 import json
 from datetime import datetime
 from urllib.parse import urlparse
 import hashlib
-import requests
-from bs4 import BeautifulSoup
+import threading
+import uuid
+import time
+from collections import deque
+import metrics
+import textcodec
+import tracing
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from metadata_extractor import extract_metadata
+from records import PageRecord, compose_page_content
+from scraper import extract_content_from_url
+from vector_index import VectorIndex, create_embedder, memory_text
 
-# Load environment variables
-load_dotenv()
-
-app = Flask(__name__)
+# Load environment variables and build the app
 # More permissive CORS for development
-CORS(app, resources={r"/*": {"origins": "*"}})
+app = create_app(__name__, cors_resources={r"/*": {"origins": "*"}})
 
-# Initialize Google GenAI client
-genai_client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
+# Google GenAI client - shared, and created on first use
+genai_client = LazyClient(get_genai_client)
 
 # Configuration
 class Config:
@@ -27,228 +33,247 @@ class Config:
     USER_ID = os.getenv('USER_ID', 'default_user')
     AGENT_ID = os.getenv('AGENT_ID', 'website_eater_agent')
     MODEL_ID = os.getenv('GEMINI_MODEL', 'gemini-2.5-pro-exp-03-25')
+    CIRCUIT_FAILURE_RATE = float(os.getenv('GEMINI_CIRCUIT_FAILURE_RATE', '0.5'))
+    CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv('GEMINI_CIRCUIT_SLOW_CALL_SECONDS', '20'))
+    CIRCUIT_OPEN_SECONDS = float(os.getenv('GEMINI_CIRCUIT_OPEN_SECONDS', '30'))
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'hashing')
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-004')
+    VECTOR_INDEX_DIR = os.getenv('VECTOR_INDEX_DIR', '')
+    TEXT_ZSTD_LEVEL = int(os.getenv('TEXT_ZSTD_LEVEL', '3'))
+    TEXT_COMPRESS_MIN_BYTES = int(os.getenv('TEXT_COMPRESS_MIN_BYTES', '256'))
+    TEXT_ZSTD_DICT = os.getenv('TEXT_ZSTD_DICT', '')
+    TEXT_ZSTD_DICT_TRAIN_SAMPLES = int(os.getenv('TEXT_ZSTD_DICT_TRAIN_SAMPLES', '0'))
+
+# Stored text is zstd-compressed and decoded only when an endpoint returns it
+textcodec.configure(level=Config.TEXT_ZSTD_LEVEL, min_bytes=Config.TEXT_COMPRESS_MIN_BYTES,
+                    dictionary_path=Config.TEXT_ZSTD_DICT or None, train_samples=Config.TEXT_ZSTD_DICT_TRAIN_SAMPLES)
 
 # Simple in-memory storage
 memories = []
+memories_by_id = {}
 
-def extract_content_from_url(url):
-    """Simple web scraping as fallback"""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Extract title
-        title = soup.title.string if soup.title else "No title"
-        
-        # Extract meta description
-        meta_desc = ""
-        meta_tag = soup.find('meta', attrs={'name': 'description'})
-        if meta_tag:
-            meta_desc = meta_tag.get('content', '')
-        
-        # Extract main text
-        for script in soup(["script", "style"]):
-            script.decompose()
-        text = soup.get_text()
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
-        
-        # Extract headers
-        headers_found = []
-        for i in range(1, 4):  # h1, h2, h3
-            headers_found.extend([h.get_text().strip() for h in soup.find_all(f'h{i}')])
-        
-        return {
-            'title': title,
-            'content': text[:5000],  # Limit content
-            'meta_description': meta_desc,
-            'headers': headers_found[:10],  # First 10 headers
-            'url': url,
-            'success': True
-        }
-    except Exception as e:
-        return {
-            'title': 'Error',
-            'content': str(e),
-            'url': url,
-            'success': False
-        }
+# Semantic search index - memory-mapped under VECTOR_INDEX_DIR when set, in RAM otherwise
+vector_index = VectorIndex(
+    create_embedder(Config.EMBEDDING_BACKEND, genai_client, Config.EMBEDDING_MODEL),
+    directory=Config.VECTOR_INDEX_DIR or None
+)
+# Memories are not persisted, so vectors left by an earlier run have nothing to point to
+vector_index.retain(lambda memory_id: memory_id in memories_by_id)
 
-def analyze_content_with_gemini(url, scraped_data, options=None):
-    """Use Gemini to analyze scraped content - with fallback"""
-    try:
-        # Skip AI if explicitly disabled
-        if options and options.get('skip_ai', False):
-            return {
-                'url': url,
-                'timestamp': datetime.now().isoformat(),
-                'domain': urlparse(url).netloc,
-                'title': scraped_data['title'],
-                'raw_content': scraped_data['content'],
-                'meta_description': scraped_data.get('meta_description', ''),
-                'headers': scraped_data.get('headers', []),
-                'analysis': 'AI analysis skipped',
-                'extraction_status': 'success' if scraped_data['success'] else 'partial',
-            }
-        
-        # Try AI analysis
-        prompt_parts = [
-            f"Analyze this web content from {url}:",
-            f"Title: {scraped_data['title']}",
-            f"Meta Description: {scraped_data.get('meta_description', 'None')}",
-            f"Headers: {', '.join(scraped_data.get('headers', [])[:5])}",
-            f"Content preview: {scraped_data['content'][:1500]}",
-            "",
-            "Provide a comprehensive analysis including:",
-            "1. Summary of the main content (2-3 sentences)",
-            "2. Key topics or themes",
-            "3. Content type classification",
-            "4. Target audience",
-            "5. Key takeaways or insights"
-        ]
-        
-        prompt = "\n".join(prompt_parts)
-        
-        # Generate analysis using Gemini
-        config = GenerateContentConfig(
-            temperature=0.7,
-            top_k=40,
-            top_p=0.95,
-            max_output_tokens=1024,
-        )
-        
-        response = genai_client.models.generate_content(
+# Circuit breaker around Gemini - while open, requests skip straight to the local heuristic analysis
+gemini_breaker = CircuitBreaker(
+    name='gemini',
+    failure_rate_threshold=Config.CIRCUIT_FAILURE_RATE,
+    slow_call_seconds=Config.CIRCUIT_SLOW_CALL_SECONDS,
+    open_seconds=Config.CIRCUIT_OPEN_SECONDS
+)
+
+# IDs of memories stored with the basic analysis, waiting for Gemini once the circuit closes
+pending_enrichment = deque()
+enrichment_lock = threading.Lock()
+
+def build_analysis_prompt(url, scraped_data):
+    """Build the Gemini analysis prompt from scraped data"""
+    prompt_parts = [
+        f"Analyze this web content from {url}:",
+        f"Title: {scraped_data['title']}",
+        f"Meta Description: {scraped_data.get('meta_description', 'None')}",
+        f"Headers: {', '.join(scraped_data.get('headers', [])[:5])}",
+        f"Content preview: {scraped_data['content'][:1500]}",
+        "",
+        "Provide a comprehensive analysis including:",
+        "1. Summary of the main content (2-3 sentences)",
+        "2. Key topics or themes",
+        "3. Content type classification",
+        "4. Target audience",
+        "5. Key takeaways or insights"
+    ]
+    
+    return "\n".join(prompt_parts)
+
+def generate_analysis(prompt):
+    """Call Gemini through the circuit breaker and return the response text"""
+    config = genai_types().GenerateContentConfig(
+        temperature=0.7,
+        top_k=40,
+        top_p=0.95,
+        max_output_tokens=1024,
+    )
+    
+    metrics.label(model=Config.MODEL_ID)
+    with metrics.stage('llm', {'gen_ai.system': 'gemini', 'gen_ai.request.model': Config.MODEL_ID}):
+        response = gemini_breaker.call(
+            genai_client.models.generate_content,
             model=Config.MODEL_ID,
             contents=prompt,
             config=config
         )
+        tracing.record_usage(response)
+    
+    # Extract the response
+    analysis = ""
+    if hasattr(response, 'text'):
+        analysis = response.text
+    elif hasattr(response, 'candidates') and response.candidates:
+        for part in response.candidates[0].content.parts:
+            if hasattr(part, 'text'):
+                analysis += part.text
+    
+    return analysis
+
+def basic_content_analysis(scraped_data, reason):
+    """Keyword heuristics used when Gemini is unavailable"""
+    content_lower = scraped_data.get('content', '').lower()
+    basic_analysis = []
+    
+    # Detect content type
+    if any(word in content_lower for word in ['news', 'breaking', 'latest', 'update']):
+        basic_analysis.append("Content Type: News/Updates")
+    elif any(word in content_lower for word in ['tutorial', 'guide', 'how to', 'documentation']):
+        basic_analysis.append("Content Type: Educational/Documentation")
+    elif any(word in content_lower for word in ['product', 'pricing', 'buy', 'service']):
+        basic_analysis.append("Content Type: Commercial/Product")
+    elif any(word in content_lower for word in ['blog', 'opinion', 'thoughts', 'personal']):
+        basic_analysis.append("Content Type: Blog/Personal")
+    else:
+        basic_analysis.append("Content Type: General Information")
+    
+    # Add basic stats
+    word_count = len(scraped_data.get('content', '').split())
+    basic_analysis.append(f"Word Count: {word_count}")
+    basic_analysis.append(f"Headers Found: {len(scraped_data.get('headers', []))}")
+    
+    if scraped_data.get('meta_description'):
+        basic_analysis.append(f"Meta Description: {scraped_data['meta_description'][:100]}...")
+    
+    return f"Basic Analysis (AI unavailable due to {reason}):\n" + "\n".join(basic_analysis)
+
+def analyze_content_with_gemini(url, scraped_data, options=None):
+    """Use Gemini to analyze scraped content - with fallback"""
+    analyzed_data = {
+        'url': url,
+        'timestamp': datetime.now().isoformat(),
+        'domain': urlparse(url).netloc,
+        'title': scraped_data['title'],
+        'raw_content': scraped_data['content'],
+        'meta_description': scraped_data.get('meta_description', ''),
+        'headers': scraped_data.get('headers', []),
+        'extraction_status': 'success' if scraped_data['success'] else 'partial',
+        'structured_metadata': scraped_data.get('structured_metadata', {}),
+    }
+    
+    # Skip AI if explicitly disabled
+    if options and options.get('skip_ai', False):
+        analyzed_data['analysis'] = 'AI analysis skipped'
+        return analyzed_data
+    
+    try:
+        with metrics.stage('prompt'):
+            prompt = build_analysis_prompt(url, scraped_data)
+        analyzed_data['analysis'] = generate_analysis(prompt)
+        return analyzed_data
         
-        # Extract the response
-        analysis = ""
-        if hasattr(response, 'text'):
-            analysis = response.text
-        elif hasattr(response, 'candidates') and response.candidates:
-            for part in response.candidates[0].content.parts:
-                if hasattr(part, 'text'):
-                    analysis += part.text
-        
-        return {
-            'url': url,
-            'timestamp': datetime.now().isoformat(),
-            'domain': urlparse(url).netloc,
-            'title': scraped_data['title'],
-            'raw_content': scraped_data['content'],
-            'meta_description': scraped_data.get('meta_description', ''),
-            'headers': scraped_data.get('headers', []),
-            'analysis': analysis,
-            'extraction_status': 'success' if scraped_data['success'] else 'partial',
-        }
+    except CircuitOpenError as e:
+        # Gemini is known to be down - don't wait for another timeout
+        metrics.fallback('circuit_open')
+        analyzed_data['analysis'] = basic_content_analysis(scraped_data, 'provider outage')
+        analyzed_data['ai_error'] = str(e)
+        analyzed_data['enrichment_pending'] = True
+        return analyzed_data
         
     except Exception as e:
         # Fallback when AI fails
         print(f"Gemini analysis error: {e}")
-        
-        # Basic content analysis without AI
-        content_lower = scraped_data.get('content', '').lower()
-        basic_analysis = []
-        
-        # Detect content type
-        if any(word in content_lower for word in ['news', 'breaking', 'latest', 'update']):
-            basic_analysis.append("Content Type: News/Updates")
-        elif any(word in content_lower for word in ['tutorial', 'guide', 'how to', 'documentation']):
-            basic_analysis.append("Content Type: Educational/Documentation")
-        elif any(word in content_lower for word in ['product', 'pricing', 'buy', 'service']):
-            basic_analysis.append("Content Type: Commercial/Product")
-        elif any(word in content_lower for word in ['blog', 'opinion', 'thoughts', 'personal']):
-            basic_analysis.append("Content Type: Blog/Personal")
-        else:
-            basic_analysis.append("Content Type: General Information")
-        
-        # Add basic stats
-        word_count = len(scraped_data.get('content', '').split())
-        basic_analysis.append(f"Word Count: {word_count}")
-        basic_analysis.append(f"Headers Found: {len(scraped_data.get('headers', []))}")
-        
-        if scraped_data.get('meta_description'):
-            basic_analysis.append(f"Meta Description: {scraped_data['meta_description'][:100]}...")
-        
-        return {
-            'url': url,
-            'timestamp': datetime.now().isoformat(),
-            'domain': urlparse(url).netloc,
-            'title': scraped_data['title'],
-            'raw_content': scraped_data['content'],
-            'meta_description': scraped_data.get('meta_description', ''),
-            'headers': scraped_data.get('headers', []),
-            'analysis': f"Basic Analysis (AI unavailable due to quota):\n" + "\n".join(basic_analysis),
-            'extraction_status': 'success' if scraped_data['success'] else 'partial',
-            'ai_error': str(e)
-        }
+        if '429' in str(e) or 'quota' in str(e).lower():
+            metrics.quota_error(Config.MODEL_ID)
+        metrics.fallback('llm_error')
+        analyzed_data['analysis'] = basic_content_analysis(scraped_data, 'quota')
+        analyzed_data['ai_error'] = str(e)
+        # Only queue for enrichment if this failure tripped the circuit
+        analyzed_data['enrichment_pending'] = gemini_breaker.state != CircuitBreaker.CLOSED
+        return analyzed_data
+
+def build_full_content(extracted_data):
+    """Combine title, meta, headers, analysis and scraped text into the stored content"""
+    return compose_page_content(
+        extracted_data.get('title', ''),
+        extracted_data.get('url', ''),
+        extracted_data.get('meta_description', ''),
+        extracted_data.get('headers') or [],
+        extracted_data.get('analysis', ''),
+        extracted_data.get('raw_content', '')
+    )
+
+def detect_content_type(analysis, raw_content):
+    """Classify content from the analysis and scraped text"""
+    analysis_lower = analysis.lower()
+    content_lower = raw_content.lower()
+    
+    content_type = 'general'
+    if 'documentation' in analysis_lower or 'documentation' in content_lower:
+        content_type = 'documentation'
+    elif 'news' in analysis_lower or 'news' in content_lower:
+        content_type = 'news'
+    elif 'blog' in analysis_lower or 'blog' in content_lower:
+        content_type = 'blog'
+    elif 'research' in analysis_lower or 'research' in content_lower:
+        content_type = 'research'
+    elif 'product' in analysis_lower or 'product' in content_lower:
+        content_type = 'product'
+    return content_type
 
 def process_content(extracted_data, user_id):
     """Process extracted content and store in memory"""
     try:
         # Combine all content
-        full_content = f"{extracted_data.get('title', '')}\n\n"
-        full_content += f"URL: {extracted_data.get('url', '')}\n"
-        full_content += f"Meta: {extracted_data.get('meta_description', '')}\n\n"
-        
-        if extracted_data.get('headers'):
-            full_content += f"Headers: {', '.join(extracted_data['headers'][:5])}\n\n"
-        
-        full_content += f"Analysis:\n{extracted_data.get('analysis', '')}\n\n"
-        full_content += f"Content:\n{extracted_data.get('raw_content', '')[:1000]}"
+        with metrics.stage('postprocess'):
+            full_content = build_full_content(extracted_data)
         
         if not full_content.strip():
             return {'status': 'error', 'error': 'No content extracted'}
         
         # Generate memory ID
         content_hash = hashlib.sha256(full_content.encode()).hexdigest()[:8]
-        memory_id = f"mem_{content_hash}_{len(memories)}"
+        # Never reused across restarts, since persisted vector rows are keyed by it
+        memory_id = f"mem_{content_hash}_{uuid.uuid4().hex[:12]}"
         
         # Content type detection
-        analysis_lower = extracted_data.get('analysis', '').lower()
-        content_lower = extracted_data.get('raw_content', '').lower()
-        
-        content_type = 'general'
-        if 'documentation' in analysis_lower or 'documentation' in content_lower:
-            content_type = 'documentation'
-        elif 'news' in analysis_lower or 'news' in content_lower:
-            content_type = 'news'
-        elif 'blog' in analysis_lower or 'blog' in content_lower:
-            content_type = 'blog'
-        elif 'research' in analysis_lower or 'research' in content_lower:
-            content_type = 'research'
-        elif 'product' in analysis_lower or 'product' in content_lower:
-            content_type = 'product'
+        with metrics.stage('postprocess'):
+            content_type = detect_content_type(extracted_data.get('analysis', ''), extracted_data.get('raw_content', ''))
+            # Author, publish date and keywords from the analysis, else from the page's JSON-LD/OpenGraph tags
+            document_metadata = extract_metadata(extracted_data.get('analysis', ''),
+                                                 fallback=extracted_data.get('structured_metadata'))
+            document_metadata.pop('title', None)
+        metrics.label(content_type=content_type)
         
-        # Store in memory
-        memory_entry = {
-            'id': memory_id,
-            'user_id': user_id,
-            'title': extracted_data.get('title', 'Untitled'),
-            'content': full_content,
-            'analysis': extracted_data.get('analysis', ''),
-            'raw_content': extracted_data.get('raw_content', ''),
-            'headers': extracted_data.get('headers', []),
-            'metadata': {
+        # Store in memory - the combined content is rebuilt from these parts when read, not stored
+        memory_entry = PageRecord(
+            memory_id,
+            user_id,
+            extracted_data.get('title', 'Untitled'),
+            extracted_data.get('analysis', ''),
+            extracted_data.get('raw_content', ''),
+            extracted_data.get('headers', []),
+            {
                 'url': extracted_data['url'],
                 'domain': extracted_data['domain'],
                 'timestamp': extracted_data['timestamp'],
                 'content_type': content_type,
-                'content_length': len(full_content),
                 'extraction_status': extracted_data.get('extraction_status'),
                 'meta_description': extracted_data.get('meta_description', ''),
-                'ai_error': extracted_data.get('ai_error')
+                'ai_error': extracted_data.get('ai_error'),
+                **document_metadata
             }
-        }
-        memories.append(memory_entry)
+        )
+        if extracted_data.get('enrichment_pending'):
+            memory_entry.update_metadata({'enrichment_status': 'pending_enrichment'})
+        with metrics.stage('storage'):
+            memories.append(memory_entry)
+            memories_by_id[memory_id] = memory_entry
+            index_memory(memory_entry)
+        
+        if extracted_data.get('enrichment_pending'):
+            pending_enrichment.append(memory_id)
         
         # Determine routes
         routes = []
@@ -276,7 +301,8 @@ def process_content(extracted_data, user_id):
             'raw_content_preview': extracted_data.get('raw_content', '')[:500],
             'headers': extracted_data.get('headers', [])[:5],
             'meta_description': extracted_data.get('meta_description', ''),
-            'ai_available': 'ai_error' not in extracted_data
+            'ai_available': 'ai_error' not in extracted_data,
+            'enrichment_pending': extracted_data.get('enrichment_pending', False)
         }
         
     except Exception as e:
@@ -285,11 +311,64 @@ def process_content(extracted_data, user_id):
             'error': str(e)
         }
 
+def index_memory(memory_entry):
+    """Embed a memory into the semantic index"""
+    try:
+        vector_index.add_texts([memory_entry.id], [memory_text(memory_entry)], owner=memory_entry.user_id)
+    except Exception as e:
+        print(f"Semantic indexing error: {e}")
+
+def enrich_pending_memories():
+    """Run Gemini over memories stored with the basic analysis while the circuit was open"""
+    # Only one drain at a time - a second close event while draining is a no-op
+    if not enrichment_lock.acquire(blocking=False):
+        return
+    
+    try:
+        while pending_enrichment:
+            memory_id = pending_enrichment.popleft()
+            memory = memories_by_id.get(memory_id)
+            if memory is None:
+                continue
+            
+            scraped_data = {
+                'title': memory.title,
+                'content': memory.raw_content,
+                'meta_description': memory.get_meta('meta_description', ''),
+                'headers': list(memory.headers)
+            }
+            
+            try:
+                start = time.monotonic()
+                analysis = generate_analysis(build_analysis_prompt(memory.url, scraped_data))
+            except Exception as e:
+                # Circuit tripped again - keep the memory queued for the next close
+                print(f"Enrichment of {memory_id} deferred: {e}")
+                pending_enrichment.appendleft(memory_id)
+                break
+            
+            memory.analysis = analysis
+            memory.update_metadata({
+                'content_type': detect_content_type(analysis, memory.raw_content),
+                'ai_error': None,
+                'enrichment_status': 'enriched'
+            })
+            index_memory(memory)
+            print(f"Enriched {memory_id} in {time.monotonic() - start:.1f}s")
+    finally:
+        enrichment_lock.release()
+
+# Drain the enrichment queue off the request thread whenever Gemini recovers
+gemini_breaker.add_close_listener(
+    lambda: threading.Thread(target=enrich_pending_memories, daemon=True).start()
+)
+
 # API Routes
 @app.route('/')
+@static_page
 def index():
     """Serve the frontend"""
-    return render_template_string('''
+    return '''
     <!DOCTYPE html>
     <html>
     <head>
@@ -916,7 +995,7 @@ def index():
         </script>
     </body>
     </html>
-    ''')
+    '''
 
 @app.route('/api/process', methods=['POST'])
 def process_url():
@@ -929,6 +1008,7 @@ def process_url():
         
         if not url:
             return jsonify({'status': 'error', 'error': 'No URL provided'}), 400
+        tracing.set_attributes({'url.domain': urlparse(url).netloc})
         
         # First, scrape the content
         scraped_data = extract_content_from_url(url)
@@ -960,40 +1040,70 @@ def process_url():
             'raw_content_preview': processing_result.get('raw_content_preview', ''),
             'headers': processing_result.get('headers', []),
             'meta_description': processing_result.get('meta_description', ''),
-            'ai_available': processing_result.get('ai_available', True)
+            'ai_available': processing_result.get('ai_available', True),
+            'enrichment_pending': processing_result.get('enrichment_pending', False)
         })
         
     except Exception as e:
         return jsonify({'status': 'error', 'error': str(e)}), 500
 
-@app.route('/api/memories/<user_id>', methods=['GET'])
-def get_memories(user_id):
-    """Get all memories for a user"""
-    user_memories = [m for m in memories if m['user_id'] == user_id]
+@app.route('/api/circuit', methods=['GET'])
+def circuit_status():
+    """Report the Gemini circuit breaker state and enrichment backlog"""
     return jsonify({
         'status': 'success',
-        'memories': user_memories
+        'circuit': gemini_breaker.snapshot(),
+        'pending_enrichment': len(pending_enrichment)
     })
 
+@app.route('/api/memories/<user_id>', methods=['GET'])
+def get_memories(user_id):
+    """Get all memories for a user - ?text=0 lists metadata only, without decompressing any text"""
+    text = request.args.get('text', '1') not in ('0', 'false')
+    user_memories = (m.to_dict(text) for m in memories if m.user_id == user_id)
+    return stream_json_array(user_memories, 'memories', {'status': 'success'})
+
 @app.route('/api/search', methods=['POST'])
 def search_memories():
-    """Search memories"""
+    """Search memories - mode=keyword|semantic|hybrid (default keyword)"""
     try:
         data = request.json
         query = data.get('query', '').lower()
         user_id = data.get('user_id', Config.USER_ID)
+        limit = int(data.get('limit', 10))
+        mode = data.get('mode') or request.args.get('mode', 'keyword')
+        
+        if mode not in ('semantic', 'keyword', 'hybrid'):
+            return jsonify({'status': 'error', 'error': 'mode must be semantic, keyword or hybrid'}), 400
         
         results = []
-        for memory in memories:
-            if memory['user_id'] == user_id:
-                if (query in memory['content'].lower() or 
-                    query in memory.get('analysis', '').lower() or
-                    query in memory.get('raw_content', '').lower()):
-                    results.append(memory)
+        if mode in ('keyword', 'hybrid'):
+            for memory in memories:
+                if memory.user_id == user_id:
+                    # The combined content holds the analysis and the start of the page; check the rest of the page too
+                    if query in memory.content.lower() or query in memory.raw_content.lower():
+                        results.append(memory)
+        
+        if mode == 'keyword':
+            results = [m.to_dict() for m in results[:limit]]
+        elif mode == 'semantic':
+            results = [dict(memories_by_id[i].to_dict(), score=score)
+                       for i, score in vector_index.search(query, k=limit, owner=user_id) if i in memories_by_id]
+        else:
+            # Hybrid: keyword hits ranked by similarity first, then the remaining semantic hits
+            keyword_scores = vector_index.score(query, [m.id for m in results])
+            ranked = sorted(results, key=lambda m: keyword_scores.get(m.id, 0.0), reverse=True)
+            seen = {m.id for m in ranked}
+            results = [dict(m.to_dict(), score=1.0 + keyword_scores.get(m.id, 0.0)) for m in ranked]
+            results += [dict(memories_by_id[i].to_dict(), score=score)
+                        for i, score in vector_index.search(query, k=limit, owner=user_id)
+                        if i not in seen and i in memories_by_id]
+            results = results[:limit]
         
         return jsonify({
             'status': 'success',
-            'results': results[:10]
+            'mode': mode,
+            'results': results
         })
     except Exception as e:
         return jsonify({'status': 'error', 'error': str(e)}), 500
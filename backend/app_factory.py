@@ -0,0 +1,80 @@
+"""
+Shared application factory and lazily constructed clients
+Importing an app module only builds the Flask app; the Gemini SDK and mem0 are imported and
+their clients created on first use, and every module in the process shares the same instances
+"""
+import os
+import threading
+
+from dotenv import load_dotenv
+from flask import Flask
+from flask_cors import CORS
+
+import metrics
+import profiling
+import responses
+import tracing
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def create_app(import_name, cors_resources=None):
+    """Load .env and build a Flask app with CORS, fast JSON, response compression, /metrics, tracing and profiling"""
+    load_dotenv()
+    app = Flask(import_name)
+    if cors_resources:
+        CORS(app, resources=cors_resources)
+    else:
+        CORS(app)
+    responses.install(app)
+    metrics.install(app)
+    tracing.install(app)
+    profiling.install(app)
+    return app
+
+
+def shared_client(name, factory):
+    """Build a client once per process, on first use"""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def get_genai_client():
+    """The process-wide Gemini client (google.genai is imported here, not at startup)
+    GEMINI_BASE_URL points it at another endpoint, e.g. the offline stand-in in fake_gemini.py"""
+    def build():
+        import google.genai as genai
+        base_url = os.getenv('GEMINI_BASE_URL')
+        return genai.Client(api_key=os.getenv('GOOGLE_API_KEY'),
+                            http_options={'base_url': base_url} if base_url else None)
+    return shared_client('genai', build)
+
+
+def get_memory():
+    """The process-wide mem0 Memory instance"""
+    def build():
+        from mem0 import Memory
+        return Memory()
+    return shared_client('mem0', build)
+
+
+class LazyClient:
+    """Stands in for a client at module level and builds the real one on first attribute access"""
+
+    def __init__(self, factory):
+        self._factory = factory
+
+    def __getattr__(self, name):
+        return getattr(self._factory(), name)
+
+
+def genai_types():
+    """google.genai.types, imported on first use (it is the slowest part of the SDK to import)"""
+    from google.genai import types
+    return types
@@ -1,22 +1,18 @@
 import os
-from flask import Flask, request, jsonify, render_template_string
-from flask_cors import CORS
-from google import genai
-from google.genai.types import Tool, GenerateContentConfig
-from dotenv import load_dotenv
+from flask import request, jsonify
+from app_factory import create_app, get_genai_client, genai_types, LazyClient
+from static_assets import static_page
+from responses import stream_json_array
 import json
 from datetime import datetime
 from urllib.parse import urlparse
 import hashlib
 
-# Load environment variables
-load_dotenv()
+# Load environment variables and build the app
+app = create_app(__name__)
 
-app = Flask(__name__)
-CORS(app)
-
-# Initialize Google GenAI client
-genai_client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
+# Google GenAI client - shared, and created on first use
+genai_client = LazyClient(get_genai_client)
 
 # Configuration
 class Config:
@@ -32,11 +28,11 @@ def extract_content_with_gemini(url, options=None):
     """Use Google's URL Context tool to extract content from a URL"""
     try:
         # Create the URL context tool
-        tools = [Tool(url_context={})]
+        tools = [genai_types().Tool(url_context={})]
         
         # Add Google Search if deep analysis is requested
         if options and options.get('deep_analysis'):
-            tools.append(Tool(google_search={}))
+            tools.append(genai_types().Tool(google_search={}))
         
         # Build the prompt based on options
         prompt_parts = [f"Extract and analyze the content from this URL: {url}"]
@@ -61,7 +57,7 @@ def extract_content_with_gemini(url, options=None):
         response = genai_client.models.generate_content(
             model=Config.MODEL_ID,
             contents=prompt,
-            config=GenerateContentConfig(
+            config=genai_types().GenerateContentConfig(
                 tools=tools,
                 response_modalities=["TEXT"],
             )
@@ -193,9 +189,10 @@ def process_content(extracted_data, user_id):
 
 # API Routes
 @app.route('/')
+@static_page
 def index():
     """Serve the frontend"""
-    return render_template_string('''
+    return '''
     <!DOCTYPE html>
     <html>
     <head>
@@ -745,7 +742,7 @@ def index():
         </script>
     </body>
     </html>
-    ''')
+    '''
 
 @app.route('/api/process', methods=['POST'])
 def process_url():
@@ -795,11 +792,8 @@ def process_url():
 @app.route('/api/memories/<user_id>', methods=['GET'])
 def get_memories(user_id):
     """Get all memories for a user"""
-    user_memories = [m for m in memories if m['user_id'] == user_id]
-    return jsonify({
-        'status': 'success',
-        'memories': user_memories
-    })
+    user_memories = (m for m in memories if m['user_id'] == user_id)
+    return stream_json_array(user_memories, 'memories', {'status': 'success'})
 
 @app.route('/api/search', methods=['POST'])
 def search_memories():
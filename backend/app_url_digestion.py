@@ -1,22 +1,39 @@
 import os
-from flask import Flask, request, jsonify, render_template_string
-from flask_cors import CORS
-import google.genai as genai
-from google.genai.types import GenerateContentConfig
-from dotenv import load_dotenv
+from flask import request, jsonify
+from app_factory import create_app, get_genai_client, genai_types, LazyClient
+from static_assets import static_page
+from responses import stream_json_array
 import json
+import math
 from datetime import datetime
 from urllib.parse import urlparse
 import hashlib
+import threading
+import uuid
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Response, stream_with_context
+from analytics import AnalyticsSnapshots, AnalyticsUnavailable, BUCKETS
+import metrics
+import textcodec
+import tracing
+from archive import ArchiveError, check_compression, content_hash, export_chunks, iter_batches, iter_records
+from enrichment import EnrichmentQueue, QuotaExceededError, PENDING, ENRICHED
+from scraper import extract_content_from_url
+from memory_store import MemoryStore
+from records import MemoryRecord
+from reprocess import Reprocessor
+from retrieval import RetrievalEngine
+from stages import DERIVED_FIELDS, detect_content_type, determine_routes, extract_title, local_stages, reprocess_stage
+from usage import BudgetExceededError, UsageLedger, estimate_tokens, token_counts
+from vector_index import VectorIndex, create_embedder, memory_text
+from wal import WriteAheadLog
 
-# Load environment variables
-load_dotenv()
+# Load environment variables and build the app
+app = create_app(__name__, cors_resources={r"/*": {"origins": "*"}})
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}})
-
-# Initialize Google GenAI client
-genai_client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
+# Google GenAI client - shared, and created on first use
+genai_client = LazyClient(get_genai_client)
 
 # Configuration
 class Config:
@@ -24,16 +41,62 @@ class Config:
     USER_ID = os.getenv('USER_ID', 'default_user')
     AGENT_ID = os.getenv('AGENT_ID', 'website_eater_agent')
     MODEL_ID = os.getenv('GEMINI_MODEL', 'gemini-2.5-pro-exp-03-25')
+    ENRICHMENT_RPM = float(os.getenv('ENRICHMENT_REQUESTS_PER_MINUTE', '10'))
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'hashing')
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-004')
+    VECTOR_INDEX_DIR = os.getenv('VECTOR_INDEX_DIR', '')
+    REPROCESS_WORKERS = int(os.getenv('REPROCESS_WORKERS', '0')) or None
+    ANALYTICS_DIR = os.getenv('ANALYTICS_DIR', '')
+    ANALYTICS_SNAPSHOT_SECONDS = int(os.getenv('ANALYTICS_SNAPSHOT_SECONDS', '300'))
+    USAGE_PATH = os.getenv('USAGE_PATH', '')
+    USAGE_DAILY_TOKEN_BUDGET = int(os.getenv('USAGE_DAILY_TOKEN_BUDGET', '0'))
+    USAGE_MONTHLY_BUDGET_USD = float(os.getenv('USAGE_MONTHLY_BUDGET_USD', '0'))
+    TEXT_ZSTD_LEVEL = int(os.getenv('TEXT_ZSTD_LEVEL', '3'))
+    TEXT_COMPRESS_MIN_BYTES = int(os.getenv('TEXT_COMPRESS_MIN_BYTES', '256'))
+    TEXT_ZSTD_DICT = os.getenv('TEXT_ZSTD_DICT', '')
+    TEXT_ZSTD_DICT_TRAIN_SAMPLES = int(os.getenv('TEXT_ZSTD_DICT_TRAIN_SAMPLES', '0'))
+    ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', '')
+    ARCHIVE_AFTER_DAYS = float(os.getenv('ARCHIVE_AFTER_DAYS', '7'))
+    ARCHIVE_COMPACT_SECONDS = int(os.getenv('ARCHIVE_COMPACT_SECONDS', '600'))
+    ARCHIVE_MAX_SEGMENTS = int(os.getenv('ARCHIVE_MAX_SEGMENTS', '16'))
+    WAL_DIR = os.getenv('WAL_DIR', '')
+    WAL_COMMIT_DELAY_MS = float(os.getenv('WAL_COMMIT_DELAY_MS', '0'))
+    WAL_CHECKPOINT_SECONDS = int(os.getenv('WAL_CHECKPOINT_SECONDS', '300'))
 
-# Simple in-memory storage
-memories = []
+# Stored text is zstd-compressed and decoded only when an endpoint returns it
+textcodec.configure(level=Config.TEXT_ZSTD_LEVEL, min_bytes=Config.TEXT_COMPRESS_MIN_BYTES,
+                    dictionary_path=Config.TEXT_ZSTD_DICT or None, train_samples=Config.TEXT_ZSTD_DICT_TRAIN_SAMPLES)
 
-def extract_with_gemini_url_digestion(url, options=None):
-    """Use Gemini's native URL digestion capability"""
-    try:
-        # Build prompts based on URL type
-        if 'youtube.com' in url or 'youtu.be' in url:
-            prompt = f"""Analyze this YouTube video: {url}
+# Recent memories in process memory; older ones in memory-mapped archive segments under ARCHIVE_DIR when set.
+# With WAL_DIR set, writes are logged with group commit and the recent tier is recovered from the log in the
+# serving process (not a pre-fork master): gunicorn workers do it as they boot, anything else on its first request
+memories = MemoryStore(
+    Config.ARCHIVE_DIR or None,
+    archive_after_seconds=Config.ARCHIVE_AFTER_DAYS * 86400,
+    compact_interval_seconds=Config.ARCHIVE_COMPACT_SECONDS,
+    max_segments=Config.ARCHIVE_MAX_SEGMENTS,
+    wal=WriteAheadLog(Config.WAL_DIR, commit_delay_ms=Config.WAL_COMMIT_DELAY_MS) if Config.WAL_DIR else None,
+    checkpoint_interval_seconds=Config.WAL_CHECKPOINT_SECONDS
+)
+import_lock = threading.Lock()
+
+# Search index: BM25 + vectors (memory-mapped under VECTOR_INDEX_DIR when set, in RAM otherwise)
+retrieval = RetrievalEngine(VectorIndex(
+    create_embedder(Config.EMBEDDING_BACKEND, genai_client, Config.EMBEDDING_MODEL),
+    directory=Config.VECTOR_INDEX_DIR or None
+))
+
+# Token/cost accounting per user, model and content type, with optional per-user budgets
+usage_ledger = UsageLedger(
+    path=Config.USAGE_PATH or None,
+    default_budget={'daily_tokens': Config.USAGE_DAILY_TOKEN_BUDGET, 'monthly_cost_usd': Config.USAGE_MONTHLY_BUDGET_USD}
+)
+
+def build_digest_prompt(url, options=None):
+    """Build the URL digestion prompt for a URL type and the submission options"""
+    # Build prompts based on URL type
+    if 'youtube.com' in url or 'youtu.be' in url:
+        prompt = f"""Analyze this YouTube video: {url}
 
 Please provide:
 1. Video title and channel
@@ -42,9 +105,9 @@ Please provide:
 4. Video duration and upload date if available
 5. Summary of the content"""
 
-        elif 'loom.com' in url:
-            # Special handling for Loom videos
-            prompt = f"""Analyze this Loom video recording: {url}
+    elif 'loom.com' in url:
+        # Special handling for Loom videos
+        prompt = f"""Analyze this Loom video recording: {url}
 
 Please provide:
 1. Video title and creator
@@ -54,8 +117,8 @@ Please provide:
 5. Summary of the content
 6. If this appears to be a bug report, extract the specific issue"""
 
-        elif any(domain in url for domain in ['github.com', 'gitlab.com']):
-            prompt = f"""Analyze this code repository: {url}
+    elif any(domain in url for domain in ['github.com', 'gitlab.com']):
+        prompt = f"""Analyze this code repository: {url}
 
 Please provide:
 1. Repository name and description
@@ -64,8 +127,8 @@ Please provide:
 4. Key features or functionality
 5. README summary if available"""
 
-        else:
-            prompt = f"""Analyze this webpage: {url}
+    else:
+        prompt = f"""Analyze this webpage: {url}
 
 Please provide:
 1. Page title and main topic
@@ -74,30 +137,45 @@ Please provide:
 4. Target audience
 5. Summary of the content"""
 
-        # Add additional instructions based on options
-        if options:
-            if options.get('extract_metadata'):
-                prompt += "\n6. Extract any metadata (author, date, tags)"
-            if options.get('deep_analysis'):
-                prompt += "\n7. Provide deeper insights and related topics"
+    # Add additional instructions based on options
+    if options:
+        if options.get('extract_metadata'):
+            prompt += "\n6. Extract any metadata (author, date, tags)"
+        if options.get('deep_analysis'):
+            prompt += "\n7. Provide deeper insights and related topics"
+
+    # Include additional context if provided
+    if options and options.get('additional_context'):
+        prompt += f"\n\nAdditional context provided by user:\n{options['additional_context']}"
+    return prompt
+
+def extract_with_gemini_url_digestion(url, options=None, user_id=None):
+    """Use Gemini's native URL digestion capability; the call is refused up front if user_id is over budget"""
+    metrics.label(model=Config.MODEL_ID)
+    started = usage = None
+    try:
+        with metrics.stage('prompt'):
+            prompt = build_digest_prompt(url, options)
+        if user_id:
+            usage_ledger.check_budget(user_id, estimate_tokens(prompt))
 
         # Generate content using Gemini - URLs are processed natively
-        config = GenerateContentConfig(
+        config = genai_types().GenerateContentConfig(
             temperature=0.7,
             top_k=40,
             top_p=0.95,
             max_output_tokens=2048,
         )
         
-        # Include additional context if provided
-        if options and options.get('additional_context'):
-            prompt += f"\n\nAdditional context provided by user:\n{options['additional_context']}"
-        
-        response = genai_client.models.generate_content(
-            model=Config.MODEL_ID,
-            contents=prompt,
-            config=config
-        )
+        started = time.perf_counter()
+        with metrics.stage('llm', {'gen_ai.system': 'gemini', 'gen_ai.request.model': Config.MODEL_ID}):
+            response = genai_client.models.generate_content(
+                model=Config.MODEL_ID,
+                contents=prompt,
+                config=config
+            )
+            tracing.record_usage(response)
+        usage = {'tokens': token_counts(response), 'latency_seconds': time.perf_counter() - started}
         
         # Extract the response
         analysis = ""
@@ -127,15 +205,30 @@ Please provide:
             'url_accessed': url_accessed,
             'extraction_status': 'success',
             'method': 'gemini_url_digestion',
-            'options': options  # Pass options through
+            'options': options,  # Pass options through
+            'usage': usage
+        }
+        
+    except BudgetExceededError as e:
+        return {
+            'url': url,
+            'timestamp': datetime.now().isoformat(),
+            'domain': urlparse(url).netloc,
+            'analysis': '',
+            'extraction_status': 'budget_exceeded',
+            'error': str(e),
+            'method': 'gemini_url_digestion'
         }
         
     except Exception as e:
         print(f"Gemini URL digestion error: {e}")
         error_msg = str(e)
+        if usage is None and started is not None:
+            usage = {'tokens': None, 'latency_seconds': time.perf_counter() - started}
         
         # Check for quota errors
         if '429' in error_msg or 'quota' in error_msg.lower():
+            metrics.quota_error(Config.MODEL_ID)
             return {
                 'url': url,
                 'timestamp': datetime.now().isoformat(),
@@ -143,7 +236,8 @@ Please provide:
                 'analysis': 'Quota exceeded - Gemini API limit reached',
                 'extraction_status': 'quota_error',
                 'error': error_msg,
-                'method': 'gemini_url_digestion'
+                'method': 'gemini_url_digestion',
+                'usage': usage
             }
         
         return {
@@ -153,9 +247,48 @@ Please provide:
             'analysis': '',
             'extraction_status': 'error',
             'error': error_msg,
-            'method': 'gemini_url_digestion'
+            'method': 'gemini_url_digestion',
+            'usage': usage
         }
 
+def record_llm_usage(user_id, extracted_data, content_type=None):
+    """Account the Gemini call behind an extraction, if one was made"""
+    usage = extracted_data.get('usage')
+    if usage:
+        usage_ledger.record(user_id, Config.MODEL_ID, content_type, usage['tokens'], usage['latency_seconds'],
+                            error=extracted_data['extraction_status'] != 'success')
+
+def new_memory_id(prefix, digest):
+    """A memory ID that is never reused, even across restarts (persisted search-index rows are keyed by it)"""
+    return f"{prefix}_{digest[:8]}_{uuid.uuid4().hex[:12]}"
+
+def find_memory(memory_id):
+    """Look up a stored memory by ID (archived ones come back as read-only views)"""
+    return memories.get(memory_id)
+
+def index_memories(entries, reuse_vectors=False):
+    """Embed memories in batches and add them to the semantic index"""
+    try:
+        by_user = {}
+        for entry in entries:
+            by_user.setdefault(entry.user_id, []).append(entry)
+        for user_id, group in by_user.items():
+            retrieval.add_many(
+                [m.id for m in group],
+                [memory_text(m) for m in group],
+                owner=user_id,
+                metadatas=[dict(m.metadata, title=m.title) for m in group],
+                reuse_vectors=reuse_vectors
+            )
+    except Exception as e:
+        print(f"Semantic indexing error: {e}")
+
+def store_memory(memory_entry, index=True):
+    """Append a memory; callers storing many at once pass index=False and batch index_memories"""
+    memories.append(memory_entry)
+    if index:
+        index_memories([memory_entry])
+
 def process_content(extracted_data, user_id):
     """Process extracted content and store in memory"""
     try:
@@ -169,74 +302,27 @@ def process_content(extracted_data, user_id):
         
         # Generate memory ID
         content_hash = hashlib.sha256(analysis.encode()).hexdigest()[:8]
-        memory_id = f"mem_{content_hash}_{len(memories)}"
-        
-        # Detect content type from analysis
-        analysis_lower = analysis.lower()
-        content_type = 'general'
-        
-        # Check if it's from feedback/context submission
-        if extracted_data.get('options', {}).get('context_type'):
-            content_type = extracted_data['options']['context_type']
-        elif 'loom' in analysis_lower or 'loom.com' in extracted_data['url']:
-            content_type = 'bug_report' if 'bug' in analysis_lower else 'video_feedback'
-        elif 'youtube' in analysis_lower or 'video' in analysis_lower:
-            content_type = 'video'
-        elif 'repository' in analysis_lower or 'github' in analysis_lower:
-            content_type = 'code'
-        elif 'documentation' in analysis_lower or 'docs' in analysis_lower:
-            content_type = 'documentation'
-        elif 'article' in analysis_lower or 'blog' in analysis_lower:
-            content_type = 'article'
-        elif 'product' in analysis_lower or 'service' in analysis_lower:
-            content_type = 'product'
+        memory_id = new_memory_id('mem', content_hash)
         
-        # Extract title from analysis (first line or first sentence)
-        title = "Untitled"
-        lines = analysis.split('\n')
-        for line in lines:
-            if line.strip() and len(line.strip()) > 5:
-                title = line.strip()
-                if title.endswith(':'):
-                    title = title[:-1]
-                break
+        # Detect content type, document metadata and routes from analysis
+        with metrics.stage('postprocess'):
+            fields = local_stages(extracted_data, analysis)
+            title = extract_title(analysis)
+        content_type = fields['content_type']
+        metrics.label(content_type=content_type)
         
         # Store in memory
-        memory_entry = {
-            'id': memory_id,
-            'user_id': user_id,
-            'title': title,
-            'content': analysis,
-            'metadata': {
-                'url': extracted_data['url'],
-                'domain': extracted_data['domain'],
-                'timestamp': extracted_data['timestamp'],
-                'content_type': content_type,
-                'content_length': len(analysis),
-                'extraction_method': extracted_data.get('method'),
-                'url_accessed': extracted_data.get('url_accessed', False)
-            }
-        }
-        memories.append(memory_entry)
-        
-        # Determine routes
-        routes = []
-        if content_type == 'bug_report':
-            routes = [{'destination': 'bug_tracker'}, {'destination': 'development_backlog'}, {'destination': 'knowledge_base'}]
-        elif content_type == 'video_feedback':
-            routes = [{'destination': 'feedback_library'}, {'destination': 'knowledge_base'}]
-        elif content_type == 'video':
-            routes = [{'destination': 'video_library'}, {'destination': 'knowledge_base'}]
-        elif content_type == 'code':
-            routes = [{'destination': 'code_repository'}, {'destination': 'knowledge_base'}]
-        elif content_type == 'documentation':
-            routes = [{'destination': 'docs_repository'}, {'destination': 'knowledge_base'}]
-        elif content_type == 'article':
-            routes = [{'destination': 'article_archive'}, {'destination': 'knowledge_base'}]
-        elif content_type == 'product':
-            routes = [{'destination': 'product_database'}, {'destination': 'knowledge_base'}]
-        else:
-            routes = [{'destination': 'knowledge_base'}]
+        memory_entry = MemoryRecord(memory_id, user_id, title, analysis, {
+            'url': extracted_data['url'],
+            'domain': extracted_data['domain'],
+            'timestamp': extracted_data['timestamp'],
+            'extraction_method': extracted_data.get('method'),
+            'url_accessed': extracted_data.get('url_accessed', False),
+            **fields
+        })
+        with metrics.stage('storage'):
+            store_memory(memory_entry)
+        routes = fields['routes']
         
         return {
             'status': 'success',
@@ -256,11 +342,190 @@ def process_content(extracted_data, user_id):
             'error': str(e)
         }
 
+def store_pending_memory(url, scraped_data, user_id, options=None):
+    """Store a memory from the local scrape right away, marked for later Gemini enrichment"""
+    content = scraped_data['content'] if scraped_data['success'] else ''
+    if scraped_data.get('meta_description'):
+        content = f"{scraped_data['meta_description']}\n\n{content}"
+    
+    content_hash = hashlib.sha256(f"{url}\n{content}".encode()).hexdigest()[:8]
+    memory_id = new_memory_id('mem', content_hash)
+    page_metadata = scraped_data.get('structured_metadata') or {}
+    extracted_data = {'url': url, 'options': options, 'structured_metadata': page_metadata}
+    with metrics.stage('postprocess'):
+        fields = local_stages(extracted_data, content)
+    content_type = fields['content_type']
+    if page_metadata:
+        # Kept so enrichment and reprocessing, which no longer have the page, can fall back to it too
+        fields['structured_metadata'] = page_metadata
+    
+    memory_entry = MemoryRecord(memory_id, user_id, scraped_data['title'] if scraped_data['success'] else url, content, {
+        'url': url,
+        'domain': urlparse(url).netloc,
+        'timestamp': datetime.now().isoformat(),
+        'extraction_method': 'local_scrape',
+        'url_accessed': scraped_data['success'],
+        'enrichment_status': PENDING,
+        **fields
+    })
+    with metrics.stage('storage'):
+        store_memory(memory_entry, index=False)
+    enrichment_queue.submit(memory_id, {'kind': 'url', 'url': url, 'options': options or {}})
+    
+    return {
+        'status': 'success',
+        'memory_id': memory_id,
+        'url': url,
+        'title': memory_entry.title,
+        'content_type': content_type,
+        'content_length': len(content),
+        'enrichment_status': PENDING
+    }
+
+def analyze_feedback_with_gemini(content, feedback_type, user_id):
+    """Ask Gemini to summarize and categorize a feedback note"""
+    prompt = f"""Analyze this user feedback ({feedback_type}):
+
+{content}
+
+Please provide:
+1. A short title
+2. Summary of the feedback
+3. Any bugs, feature requests or action items
+4. Suggested priority"""
+    
+    usage_ledger.check_budget(user_id, estimate_tokens(prompt))
+    started = time.perf_counter()
+    try:
+        response = genai_client.models.generate_content(
+            model=Config.MODEL_ID,
+            contents=prompt,
+            config=genai_types().GenerateContentConfig(temperature=0.3, max_output_tokens=1024)
+        )
+    except Exception:
+        usage_ledger.record(user_id, Config.MODEL_ID, feedback_type, None, time.perf_counter() - started, error=True)
+        raise
+    usage_ledger.record(user_id, Config.MODEL_ID, feedback_type, token_counts(response), time.perf_counter() - started)
+    return response.text or ''
+
+def enrich_memory(memory_id, payload):
+    """Enrichment handler: run Gemini for a stored memory and update it in place"""
+    memory = memories.mutable(memory_id)
+    if memory is None:
+        return
+    
+    if payload['kind'] == 'feedback':
+        try:
+            analysis = analyze_feedback_with_gemini(memory.content, memory.content_type, memory.user_id)
+        except Exception as e:
+            if '429' in str(e) or 'quota' in str(e).lower():
+                raise QuotaExceededError(str(e))
+            raise
+        memory.update_metadata({'analysis': analysis, 'enrichment_status': ENRICHED})
+        memories.persist([memory])
+        return
+    
+    extracted_data = extract_with_gemini_url_digestion(payload['url'], payload['options'], memory.user_id)
+    if extracted_data['extraction_status'] != 'success':
+        record_llm_usage(memory.user_id, extracted_data, memory.get_meta('content_type'))
+    if extracted_data['extraction_status'] == 'quota_error':
+        raise QuotaExceededError(extracted_data.get('error', 'quota exceeded'))
+    if extracted_data['extraction_status'] != 'success' or not extracted_data['analysis']:
+        raise RuntimeError(extracted_data.get('error', 'No content extracted'))
+    extracted_data['structured_metadata'] = memory.get_meta('structured_metadata')
+    
+    analysis = extracted_data['analysis']
+    memory.title = extract_title(analysis)
+    memory.content = analysis
+    memories.note_content(memory.user_id, content_hash(analysis), memory_id)
+    memory.update_metadata(local_stages(extracted_data, analysis))
+    record_llm_usage(memory.user_id, extracted_data, memory.content_type)
+    memory.update_metadata({
+        'extraction_method': extracted_data.get('method'),
+        'url_accessed': extracted_data.get('url_accessed', False),
+        'enrichment_status': ENRICHED
+    })
+    memories.persist([memory])
+    index_memories([memory])
+
+# Background enricher - paced below the Gemini quota so interactive digests keep headroom
+enrichment_queue = EnrichmentQueue(enrich_memory, requests_per_minute=Config.ENRICHMENT_RPM)
+
+def restore_search_index(recovered):
+    """Once per serving process, on first use of the store: drop vectors left by memories that are gone, index
+    every stored memory (archived ones included, reusing vectors persisted under VECTOR_INDEX_DIR) and queue
+    memories recovered from the write-ahead log that are still waiting for enrichment again"""
+    retrieval.retain(lambda memory_id: memory_id in memories)
+    batch = []
+    for memory in memories:
+        batch.append(memory)
+        if len(batch) == 1000:
+            index_memories(batch, reuse_vectors=True)
+            batch = []
+    index_memories(batch, reuse_vectors=True)
+    for memory in recovered:
+        if memory.get_meta('enrichment_status') != PENDING:
+            continue
+        if memory.get_meta('source') == 'user_feedback':
+            enrichment_queue.submit(memory.id, {'kind': 'feedback'})
+        elif memory.get_meta('url'):
+            enrichment_queue.submit(memory.id, {'kind': 'url', 'url': memory.url, 'options': {}})
+
+memories.on_recover = restore_search_index
+
+@app.before_request
+def recover_memories():
+    """Recover the store and rebuild the search index when the serving process takes its first request"""
+    memories.recover()
+
+def apply_reprocessed(batch):
+    """Write a batch of re-processed fields back to memories and re-index the ones that changed"""
+    changed = []
+    for memory_id, fields in batch:
+        memory = find_memory(memory_id)
+        if memory is None:
+            continue
+        fields = dict(fields)
+        title = fields.pop('title', memory.title)
+        # Derived fields are replaced, not merged: one the stages no longer produce is removed
+        stale = [k for k in DERIVED_FIELDS if k not in fields and memory.get_meta(k) is not None]
+        if title != memory.title or stale or any(memory.get_meta(k) != v for k, v in fields.items()):
+            memory = memories.mutable(memory_id)
+            memory.title = title
+            memory.remove_metadata(stale)
+            memory.update_metadata(fields)
+            changed.append(memory)
+    if changed:
+        memories.persist(changed)
+        index_memories(changed)
+    return len(changed)
+
+reprocessor = Reprocessor(reprocess_stage, apply_reprocessed, workers=Config.REPROCESS_WORKERS)
+
+def reprocessable(user_id=None):
+    """Memories the local stages apply to - feedback notes are typed by the submitter, not classified"""
+    for memory in memories if user_id is None else memories.for_user(user_id):
+        if memory.get_meta('source') != 'user_feedback':
+            yield memory
+
+def reprocess_records(user_id=None):
+    """Stream the fields the local stages need, without copying the whole archive first"""
+    for memory in reprocessable(user_id):
+        yield {'id': memory.id, 'content': memory.content, 'metadata': memory.metadata}
+
+# Columnar metadata snapshot for analytics (Parquet files under ANALYTICS_DIR when set)
+analytics = AnalyticsSnapshots(
+    lambda: list(memories),
+    directory=Config.ANALYTICS_DIR or None,
+    interval_seconds=Config.ANALYTICS_SNAPSHOT_SECONDS
+)
+
 # API Routes
 @app.route('/')
+@static_page
 def index():
     """Serve the frontend"""
-    return render_template_string('''
+    return '''
     <!DOCTYPE html>
     <html>
     <head>
@@ -1136,7 +1401,7 @@ Example:
         </script>
     </body>
     </html>
-    ''')
+    '''
 
 @app.route('/api/digest', methods=['POST'])
 def digest_url():
@@ -1149,11 +1414,20 @@ def digest_url():
         
         if not url:
             return jsonify({'status': 'error', 'error': 'No URL provided'}), 400
+        tracing.set_attributes({'url.domain': urlparse(url).netloc})
         
         # Use Gemini's URL digestion
-        extracted_data = extract_with_gemini_url_digestion(url, options)
+        extracted_data = extract_with_gemini_url_digestion(url, options, user_id)
+        
+        if extracted_data['extraction_status'] == 'budget_exceeded':
+            return jsonify({
+                'status': 'error',
+                'error': extracted_data['error'],
+                'budget': usage_ledger.budget_status(user_id)
+            }), 429
         
         if extracted_data['extraction_status'] == 'error':
+            record_llm_usage(user_id, extracted_data)
             return jsonify({
                 'status': 'error', 
                 'error': extracted_data.get('error', 'Failed to digest URL')
@@ -1161,6 +1435,7 @@ def digest_url():
         
         # Process and store
         processing_result = process_content(extracted_data, user_id)
+        record_llm_usage(user_id, extracted_data, processing_result.get('content_type'))
         
         if processing_result['status'] == 'error':
             return jsonify(processing_result), 400
@@ -1181,15 +1456,264 @@ def digest_url():
     except Exception as e:
         return jsonify({'status': 'error', 'error': str(e)}), 500
 
-@app.route('/api/memories/<user_id>', methods=['GET'])
-def get_memories(user_id):
-    """Get all memories for a user"""
-    user_memories = [m for m in memories if m['user_id'] == user_id]
+@app.route('/api/ingest', methods=['POST'])
+def ingest_urls():
+    """Store URLs immediately from a local scrape and queue them for Gemini enrichment"""
+    try:
+        data = request.json
+        urls = data.get('urls') or ([data['url']] if data.get('url') else [])
+        user_id = data.get('user_id', Config.USER_ID)
+        options = data.get('options', {})
+        
+        if not urls:
+            return jsonify({'status': 'error', 'error': 'No URL provided'}), 400
+        
+        # Scraping is I/O bound - fetch bulk imports concurrently
+        with ThreadPoolExecutor(max_workers=min(8, len(urls))) as executor:
+            scraped = list(executor.map(tracing.wrap(extract_content_from_url), urls))
+        
+        results = [store_pending_memory(url, scraped_data, user_id, options)
+                   for url, scraped_data in zip(urls, scraped)]
+        with metrics.stage('storage'):
+            index_memories([find_memory(r['memory_id']) for r in results])
+        
+        return jsonify({
+            'status': 'success',
+            'results': results
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+@app.route('/api/enrichment', methods=['GET'])
+def enrichment_stats():
+    """Report the enrichment queue depth and status counts"""
     return jsonify({
         'status': 'success',
-        'memories': user_memories
+        'enrichment': enrichment_queue.stats()
     })
 
+@app.route('/api/enrichment/<memory_id>', methods=['GET'])
+def enrichment_status(memory_id):
+    """Poll enrichment status; pass ?wait=N to long-poll up to N seconds for completion"""
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        wait = math.nan
+    if not 0 <= wait < math.inf:
+        return jsonify({'status': 'error', 'error': 'wait must be a number of seconds'}), 400
+    wait = min(wait, 60.0)
+    status = enrichment_queue.wait(memory_id, wait) if wait > 0 else enrichment_queue.status(memory_id)
+    
+    if status is None:
+        return jsonify({'status': 'error', 'error': 'Memory was not queued for enrichment'}), 404
+    
+    response = {
+        'status': 'success',
+        'memory_id': memory_id,
+        'enrichment': status
+    }
+    if status['status'] == ENRICHED:
+        response['memory'] = find_memory(memory_id).to_dict()
+    return jsonify(response)
+
+@app.route('/api/search', methods=['POST'])
+def search_memories():
+    """Search memories - mode=semantic|keyword|hybrid (default hybrid), optional domain/content_type/since/until filters"""
+    try:
+        data = request.json
+        query = data.get('query', '')
+        user_id = data.get('user_id', Config.USER_ID)
+        limit = int(data.get('limit', 10))
+        mode = data.get('mode') or request.args.get('mode', 'hybrid')
+        
+        if mode not in RetrievalEngine.MODES:
+            return jsonify({'status': 'error', 'error': 'mode must be semantic, keyword or hybrid'}), 400
+        
+        hits = retrieval.search(
+            query,
+            owner=user_id,
+            k=limit,
+            mode=mode,
+            domain=data.get('domain'),
+            content_type=data.get('content_type'),
+            since=data.get('since'),
+            until=data.get('until')
+        )
+        
+        return jsonify({
+            'status': 'success',
+            'mode': mode,
+            'results': [dict(memory.to_dict(), score=hit['score'])
+                        for hit in hits for memory in [memories.get(hit['id'])] if memory is not None]
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+@app.route('/api/reprocess', methods=['POST'])
+def start_reprocess():
+    """Re-run classification, metadata extraction, routing and indexing over stored memories"""
+    try:
+        data = request.json or {}
+        user_id = data.get('user_id')
+        total = sum(1 for _ in reprocessable(user_id))
+        job = reprocessor.start(reprocess_records(user_id), total)
+        return jsonify({'status': 'success', 'job': job}), 202
+    except RuntimeError as e:
+        return jsonify({'status': 'error', 'error': str(e), 'job': reprocessor.status()}), 409
+    except Exception as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+@app.route('/api/reprocess', methods=['GET'])
+def reprocess_status():
+    """Progress of the current or last reprocessing job"""
+    return jsonify({'status': 'success', 'job': reprocessor.status()})
+
+def import_batch(batch):
+    """Insert one validated batch as a unit, skipping content the user already has; returns (added, skipped)"""
+    entries = []
+    keys = {}
+    batch_ids = set()
+    for record in batch:
+        key = (record['user_id'], content_hash(record['content']))
+        if key in keys or memories.content_id(*key) is not None:
+            continue
+        memory_id = record['id']
+        if not memory_id or memory_id in batch_ids or memory_id in memories:
+            memory_id = new_memory_id('mem', key[1])
+        entries.append(MemoryRecord.from_dict(dict(record, id=memory_id)))
+        keys[key] = memory_id
+        batch_ids.add(memory_id)
+    
+    # Commit: the whole batch becomes visible together
+    memories.extend(entries)
+    index_memories(entries)
+    
+    # Archives taken mid-enrichment resume where they left off
+    for entry in entries:
+        if entry.get_meta('enrichment_status') == PENDING and entry.get_meta('url'):
+            enrichment_queue.submit(entry.id, {'kind': 'url', 'url': entry.url, 'options': {}})
+    return len(entries), len(batch) - len(entries)
+
+@app.route('/api/export', methods=['GET'])
+def export_memories():
+    """Stream memories as NDJSON - ?user_id= limits to one user, ?compression=zstd compresses"""
+    user_id = request.args.get('user_id')
+    compression = request.args.get('compression')
+    try:
+        check_compression(compression)
+    except ArchiveError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    
+    selected = (m.to_dict() for m in (memories if user_id is None else memories.for_user(user_id)))
+    filename = f"memories-{user_id or 'all'}.ndjson" + ('.zst' if compression == 'zstd' else '')
+    return Response(
+        stream_with_context(export_chunks(selected, compression)),
+        mimetype='application/zstd' if compression == 'zstd' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@app.route('/api/import', methods=['POST'])
+def import_memories():
+    """Load an NDJSON archive (plain or zstd) from the request body in all-or-nothing batches"""
+    user_id = request.args.get('user_id')
+    imported = skipped = batches = 0
+    try:
+        with import_lock:
+            for batch in iter_batches(iter_records(request.stream, user_id)):
+                added, duplicates = import_batch(batch)
+                imported += added
+                skipped += duplicates
+                batches += 1
+    except ArchiveError as e:
+        # Earlier batches stay committed; the failing batch was not applied
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+            'imported': imported,
+            'skipped_duplicates': skipped
+        }), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'error': str(e), 'imported': imported}), 500
+    
+    return jsonify({
+        'status': 'success',
+        'imported': imported,
+        'skipped_duplicates': skipped,
+        'batches': batches
+    })
+
+@app.route('/api/analytics', methods=['GET'])
+def analytics_query():
+    """Aggregate memory metadata from the latest snapshot
+    ?group_by=domain,content_type&bucket=week&user_id=&domain=&content_type=&since=&until=&limit="""
+    args = request.args
+    try:
+        group_by = [key for key in args.get('group_by', '').split(',') if key]
+        filters = {key: args[key] for key in ('user_id', 'domain', 'content_type', 'extraction_method', 'url_accessed')
+                   if args.get(key)}
+        results = analytics.query(
+            group_by=group_by,
+            bucket=args.get('bucket'),
+            since=args.get('since'),
+            until=args.get('until'),
+            limit=args.get('limit', type=int),
+            **filters
+        )
+        return jsonify({'status': 'success', 'results': results, 'snapshot': analytics.info()})
+    except AnalyticsUnavailable as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 501
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e), 'buckets': list(BUCKETS)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+@app.route('/api/analytics/snapshot', methods=['POST'])
+def analytics_snapshot():
+    """Rebuild the analytics snapshot now instead of waiting for the next interval"""
+    try:
+        return jsonify({'status': 'success', 'snapshot': analytics.refresh()})
+    except AnalyticsUnavailable as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 501
+    except Exception as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+@app.route('/api/usage', methods=['GET'])
+def usage_summary():
+    """Token, latency and cost totals - ?group_by=day,user_id,model,content_type&user_id=&model=&content_type=&since=&until="""
+    args = request.args
+    try:
+        group_by = [key for key in args.get('group_by', 'user_id,model,content_type').split(',') if key]
+        filters = {key: args[key] for key in ('user_id', 'model', 'content_type') if args.get(key)}
+        results = usage_ledger.summary(group_by, since=args.get('since'), until=args.get('until'), **filters)
+        return jsonify({'status': 'success', 'results': results})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+
+@app.route('/api/usage/budget/<user_id>', methods=['GET'])
+def get_budget(user_id):
+    """A user's caps and spend against them"""
+    return jsonify({'status': 'success', 'budget': usage_ledger.budget_status(user_id)})
+
+@app.route('/api/usage/budget/<user_id>', methods=['PUT'])
+def set_budget(user_id):
+    """Set a user's daily_tokens and/or monthly_cost_usd caps (0 removes a cap)"""
+    data = request.json or {}
+    try:
+        daily_tokens = int(data['daily_tokens']) if data.get('daily_tokens') is not None else None
+        monthly_cost_usd = float(data['monthly_cost_usd']) if data.get('monthly_cost_usd') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'error': 'daily_tokens and monthly_cost_usd must be numbers'}), 400
+    budget = usage_ledger.set_budget(user_id, daily_tokens=daily_tokens, monthly_cost_usd=monthly_cost_usd)
+    return jsonify({'status': 'success', 'budget': budget})
+
+@app.route('/api/memories/<user_id>', methods=['GET'])
+def get_memories(user_id):
+    """Get all memories for a user - ?text=0 lists metadata only, without decompressing any text"""
+    text = request.args.get('text', '1') not in ('0', 'false')
+    user_memories = (m.to_dict(text) for m in memories.for_user(user_id))
+    return stream_json_array(user_memories, 'memories', {'status': 'success'})
+
 @app.route('/api/feedback', methods=['POST'])
 def submit_feedback():
     """API endpoint for general feedback and context"""
@@ -1204,27 +1728,28 @@ def submit_feedback():
         
         # Generate feedback ID
         content_hash = hashlib.sha256(content.encode()).hexdigest()[:8]
-        feedback_id = f"feedback_{content_hash}_{len(memories)}"
+        feedback_id = new_memory_id('feedback', content_hash)
         
         # Store as a special type of memory
-        memory_entry = {
-            'id': feedback_id,
-            'user_id': user_id,
-            'title': f'Feedback: {content[:50]}...' if len(content) > 50 else f'Feedback: {content}',
-            'content': content,
-            'metadata': {
-                'timestamp': datetime.now().isoformat(),
-                'content_type': feedback_type,
-                'content_length': len(content),
-                'source': 'user_feedback'
-            }
-        }
-        memories.append(memory_entry)
+        title = f'Feedback: {content[:50]}...' if len(content) > 50 else f'Feedback: {content}'
+        memory_entry = MemoryRecord(feedback_id, user_id, title, content, {
+            'timestamp': datetime.now().isoformat(),
+            'content_type': feedback_type,
+            'source': 'user_feedback'
+        })
+        if data.get('enrich'):
+            memory_entry.update_metadata({'enrichment_status': PENDING})
+        store_memory(memory_entry)
+        
+        # Optional Gemini analysis happens in the background, after the note is stored
+        if data.get('enrich'):
+            enrichment_queue.submit(feedback_id, {'kind': 'feedback'})
         
         return jsonify({
             'status': 'success',
             'feedback_id': feedback_id,
-            'message': 'Feedback successfully stored'
+            'message': 'Feedback successfully stored',
+            'enrichment_status': memory_entry.get_meta('enrichment_status')
         })
         
     except Exception as e:
@@ -1241,5 +1766,10 @@ if __name__ == '__main__':
     print("📹 Supports YouTube videos, GitHub repos, and any webpage")
     print("\n⚠️  Security Note: Never share your API key publicly!\n")
     
+    # Take over the write-ahead log before serving, so a second instance fails here rather than on requests
+    # (the reloader's parent process only watches files, so it is left to the child that serves)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        memories.recover()
+    
     # Run on all interfaces
     app.run(host='0.0.0.0', debug=True, port=5003)
@@ -1,9 +1,8 @@
 import os
-from flask import Flask, request, jsonify, render_template_string
-from flask_cors import CORS
-import google.genai as genai
-from google.genai.types import GenerateContentConfig, Tool, GoogleSearch
-from dotenv import load_dotenv
+from flask import request, jsonify
+from app_factory import create_app, get_genai_client, genai_types, LazyClient
+from static_assets import static_page
+from responses import stream_json_array
 import json
 from datetime import datetime
 from urllib.parse import urlparse
@@ -11,15 +10,12 @@ import hashlib
 import requests
 from bs4 import BeautifulSoup
 
-# Load environment variables
-load_dotenv()
-
-app = Flask(__name__)
+# Load environment variables and build the app
 # More permissive CORS for development
-CORS(app, resources={r"/*": {"origins": "*"}})
+app = create_app(__name__, cors_resources={r"/*": {"origins": "*"}})
 
-# Initialize Google GenAI client
-genai_client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
+# Google GenAI client - shared, and created on first use
+genai_client = LazyClient(get_genai_client)
 
 # Configuration
 class Config:
@@ -89,7 +85,7 @@ def analyze_content_with_gemini(url, scraped_data, options=None):
         prompt = "\n".join(prompt_parts)
         
         # Generate analysis using Gemini
-        config = GenerateContentConfig(
+        config = genai_types().GenerateContentConfig(
             temperature=0.7,
             top_k=40,
             top_p=0.95,
@@ -98,7 +94,7 @@ def analyze_content_with_gemini(url, scraped_data, options=None):
         
         # Add Google Search tool if deep analysis requested
         if options and options.get('deep_analysis'):
-            config.tools = [Tool(google_search=GoogleSearch())]
+            config.tools = [genai_types().Tool(google_search=genai_types().GoogleSearch())]
         
         response = genai_client.models.generate_content(
             model=Config.MODEL_ID,
@@ -219,9 +215,10 @@ def process_content(extracted_data, user_id):
 
 # API Routes
 @app.route('/')
+@static_page
 def index():
     """Serve the frontend"""
-    return render_template_string('''
+    return '''
     <!DOCTYPE html>
     <html>
     <head>
@@ -765,7 +762,7 @@ def index():
         </script>
     </body>
     </html>
-    ''')
+    '''
 
 @app.route('/api/process', methods=['POST'])
 def process_url():
@@ -814,11 +811,8 @@ def process_url():
 @app.route('/api/memories/<user_id>', methods=['GET'])
 def get_memories(user_id):
     """Get all memories for a user"""
-    user_memories = [m for m in memories if m['user_id'] == user_id]
-    return jsonify({
-        'status': 'success',
-        'memories': user_memories
-    })
+    user_memories = (m for m in memories if m['user_id'] == user_id)
+    return stream_json_array(user_memories, 'memories', {'status': 'success'})
 
 @app.route('/api/search', methods=['POST'])
 def search_memories():
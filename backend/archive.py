@@ -0,0 +1,145 @@
+"""
+Memory archive export/import as newline-delimited JSON (one memory per line)
+Both directions stream in fixed-size chunks, optionally through zstd, so memory use stays
+constant regardless of archive size; imports are applied in validated all-or-nothing batches
+"""
+import hashlib
+
+from responses import dumps_bytes
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    import json
+    _loads = json.loads
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+CHUNK_SIZE = 1024 * 1024
+IMPORT_BATCH_SIZE = 1000
+
+
+class ArchiveError(Exception):
+    """Raised for an unreadable archive or a record that fails validation"""
+
+
+def content_hash(content):
+    """Full SHA-256 of a memory's content, the dedup key for imports"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def check_compression(compression):
+    """Reject unknown compression names, or zstd without the zstandard package"""
+    if compression not in (None, '', 'none', 'zstd'):
+        raise ArchiveError(f'Unsupported compression: {compression}')
+    if compression == 'zstd' and zstandard is None:
+        raise ArchiveError('zstd compression requires the zstandard package')
+
+
+def export_chunks(memories, compression=None):
+    """NDJSON bytes for an iterable of memories, batched into ~1 MB chunks (zstd-compressed if asked)"""
+    check_compression(compression)
+
+    def lines():
+        buffer = []
+        size = 0
+        for memory in memories:
+            line = dumps_bytes(memory) + b'\n'
+            buffer.append(line)
+            size += len(line)
+            if size >= CHUNK_SIZE:
+                yield b''.join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield b''.join(buffer)
+
+    def compressed():
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        for chunk in lines():
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    return compressed() if compression == 'zstd' else lines()
+
+
+def iter_lines(stream):
+    """Lines of an NDJSON body read in fixed-size chunks; zstd input is detected by its magic bytes"""
+    head = stream.read(4)
+    if head == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ArchiveError('Archive is zstd-compressed but the zstandard package is not installed')
+        reader = zstandard.ZstdDecompressor().stream_reader(_Prepended(head, stream))
+        read = reader.read
+    else:
+        pending = [head]
+        read = lambda size: pending.pop() if pending else stream.read(size)
+
+    remainder = b''
+    while True:
+        chunk = read(CHUNK_SIZE)
+        if not chunk:
+            break
+        lines = (remainder + chunk).split(b'\n')
+        remainder = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if remainder.strip():
+        yield remainder
+
+
+def iter_records(stream, default_user_id=None):
+    """Parsed and validated memory records, with the line number of each"""
+    for line_number, line in enumerate(iter_lines(stream), 1):
+        try:
+            record = _loads(line)
+        except ValueError as e:
+            raise ArchiveError(f'Line {line_number}: invalid JSON ({e})')
+        if not isinstance(record, dict) or not isinstance(record.get('content'), str):
+            raise ArchiveError(f'Line {line_number}: a memory needs a "content" string')
+        user_id = default_user_id or record.get('user_id')
+        if not user_id:
+            raise ArchiveError(f'Line {line_number}: no user_id')
+        metadata = record.get('metadata') or {}
+        if not isinstance(metadata, dict):
+            raise ArchiveError(f'Line {line_number}: "metadata" must be an object')
+        yield line_number, {
+            'id': record.get('id'),
+            'user_id': user_id,
+            'title': record.get('title') or 'Untitled',
+            'content': record['content'],
+            'metadata': metadata
+        }
+
+
+def iter_batches(records, batch_size=IMPORT_BATCH_SIZE):
+    """Group records into batches; a validation error surfaces before any record of its batch is yielded"""
+    batch = []
+    for _, record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _Prepended:
+    """File-like wrapper that replays already-consumed bytes before the rest of the stream"""
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size=-1):
+        if self.head:
+            data, self.head = self.head, b''
+            return data
+        return self.stream.read(size)
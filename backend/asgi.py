@@ -0,0 +1,17 @@
+"""
+ASGI entry point: uvicorn asgi:app --port 5003
+Wraps the WSGI app named by APP_MODULE (default app_url_digestion:app), the same variable gunicorn.conf.py
+reads; Flask views run on a thread pool sized like the gthread profile so slow Gemini calls do not block each other
+"""
+import importlib
+import os
+
+from a2wsgi import WSGIMiddleware
+
+module_name, _, attribute = os.getenv('APP_MODULE', 'app_url_digestion:app').partition(':')
+# APP_MODULE=asgi:app, as older setups pointed gunicorn at this wrapper, means the default app
+if module_name == __name__:
+    module_name, attribute = 'app_url_digestion', 'app'
+wsgi_app = getattr(importlib.import_module(module_name), attribute or 'app')
+
+app = WSGIMiddleware(wsgi_app, workers=int(os.getenv('GUNICORN_THREADS', '32')))
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Offline API benchmark: throughput, latency percentiles and memory per scenario
+Starts fake_gemini.py (recorded responses, configurable latency and errors, saved HTML corpus) and the
+app under gunicorn pointed at it, so runs are repeatable and spend no quota. Results go to a JSON
+file; --compare prints the change against an earlier run
+
+    python bench_api.py                                   # every scenario
+    python bench_api.py digest search -n 500 -c 32 --output after.json --compare before.json
+    python bench_api.py process --latency-ms 2000 --errors 429:0.05
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from fake_gemini import FakeGemini, parse_errors
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGES = ['article.html', 'docs.html', 'product.html', 'repository.html', 'news.html']
+QUERIES = ['connection pooling latency', 'configuration reference', 'noise cancelling headphones',
+           'cache library', 'fiber network rollout', 'python', 'pricing']
+USER_ID = 'bench'
+
+# app: module:callable served by gunicorn; seed: corpus digests stored before the timed run
+SCENARIOS = {
+    'digest': {'app': 'app_url_digestion:app', 'path': '/api/digest',
+               'body': lambda i, base: {'url': page_url(base, i), 'user_id': USER_ID}},
+    # /api/batch lives on the mem0 variant, so it needs mem0 and its own stores configured
+    'batch': {'app': 'app:app', 'path': '/api/batch',
+              'body': lambda i, base: {'urls': [page_url(base, i + j) for j in range(len(PAGES))], 'user_id': USER_ID}},
+    'ingest': {'app': 'app_url_digestion:app', 'path': '/api/ingest',
+               'body': lambda i, base: {'urls': [page_url(base, i + j) for j in range(len(PAGES))], 'user_id': USER_ID}},
+    'search': {'app': 'app_url_digestion:app', 'path': '/api/search', 'seed': 20,
+               'body': lambda i, base: {'query': QUERIES[i % len(QUERIES)], 'user_id': USER_ID}},
+    'process': {'app': 'app_enhanced:app', 'path': '/api/process',
+                'body': lambda i, base: {'url': page_url(base, i), 'user_id': USER_ID}}
+}
+
+
+def page_url(base, i):
+    # The query string makes each URL distinct so nothing is answered from a duplicate check
+    return f"{base}/pages/{PAGES[i % len(PAGES)]}?v={i}"
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def rss_mb(pid):
+    """Resident memory of a process and its children (gunicorn master plus workers), from /proc"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (OSError, StopIteration):
+            continue
+    return total / 1024
+
+
+class MemorySampler:
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, rss_mb(self.pid))
+            self._stop.wait(self.interval)
+
+
+def start_server(app_module, port, gemini_url):
+    env = dict(os.environ, APP_MODULE=app_module, PORT=str(port), GEMINI_BASE_URL=gemini_url,
+               GOOGLE_API_KEY='bench', GUNICORN_LOG_LEVEL='warning')
+    for name in ('USAGE_PATH', 'ANALYTICS_DIR', 'OTEL_EXPORTER_OTLP_ENDPOINT'):
+        env.pop(name, None)
+    return subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+
+def wait_ready(base_url, process=None, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError((process.stderr.read().strip().splitlines() or ['server exited'])[-1])
+        try:
+            requests.get(base_url + '/', timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f'server did not start within {timeout}s')
+
+
+def error_kind(response):
+    """Bucket a failed request by HTTP status, except quota failures the app reports as a 400/500"""
+    if response is None:
+        return 'connection'
+    try:
+        message = str(response.json().get('error', ''))
+    except ValueError:
+        message = ''
+    if response.status_code == 429 or 'RESOURCE_EXHAUSTED' in message or 'quota' in message.lower():
+        return 'quota'
+    return str(response.status_code)
+
+
+def drive(base_url, path, bodies, concurrency, timeout):
+    """Send every body at the given concurrency; returns (latencies in ms of successes, error counts, seconds)"""
+    local = threading.local()
+
+    def send(body):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = local.session.post(base_url + path, json=body, timeout=timeout)
+        except requests.Timeout:
+            return None, 'timeout'
+        except requests.RequestException:
+            return None, 'connection'
+        elapsed = (time.perf_counter() - start) * 1000
+        if not response.ok:
+            return None, error_kind(response)
+        # Bulk endpoints answer 200/202 and report failed URLs per item
+        if any(item.get('status') == 'error' for item in response.json().get('results', []) if isinstance(item, dict)):
+            return None, 'item_error'
+        return elapsed, None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(send, bodies))
+    duration = time.perf_counter() - start
+    latencies = [elapsed for elapsed, error in outcomes if error is None]
+    return latencies, Counter(error for _, error in outcomes if error), duration
+
+
+def run_scenario(name, args, gemini_url):
+    scenario = SCENARIOS[name]
+    process = None
+    base_url = args.server
+    if not base_url:
+        process = start_server(scenario['app'], args.port, gemini_url)
+        base_url = f'http://127.0.0.1:{args.port}'
+    try:
+        wait_ready(base_url, process)
+        body = scenario['body']
+        if scenario.get('seed'):
+            _, seed_errors, _ = drive(base_url, '/api/digest', [SCENARIOS['digest']['body'](i, gemini_url) for i in range(scenario['seed'])],
+                                      args.concurrency, args.timeout)
+            if seed_errors:
+                print(f"  seeding: {dict(seed_errors)}")
+        drive(base_url, scenario['path'], [body(i, gemini_url) for i in range(args.warmup)], args.concurrency, args.timeout)
+
+        bodies = [body(args.warmup + i, gemini_url) for i in range(args.requests)]
+        with (MemorySampler(process.pid) if process else _NoSampler()) as memory:
+            latencies, errors, duration = drive(base_url, scenario['path'], bodies, args.concurrency, args.timeout)
+        result = {
+            'app': scenario['app'],
+            'path': scenario['path'],
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'duration_seconds': round(duration, 3),
+            'throughput_rps': round(args.requests / duration, 2),
+            'succeeded': len(latencies),
+            'errors': dict(errors),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 0.50), 1),
+                'p95': round(percentile(latencies, 0.95), 1),
+                'p99': round(percentile(latencies, 0.99), 1),
+                'mean': round(statistics.mean(latencies), 1),
+                'max': round(max(latencies), 1)
+            } if latencies else None
+        }
+        if process:
+            result['peak_rss_mb'] = round(memory.peak, 1)
+            result['final_rss_mb'] = round(rss_mb(process.pid), 1)
+        return result
+    except RuntimeError as e:
+        return {'app': scenario['app'], 'path': scenario['path'], 'error': str(e)}
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+class _NoSampler:
+    peak = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_results(results, previous=None):
+    print(f"\n{'scenario':<10} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak MB':>8}  errors")
+    for name, r in results.items():
+        if 'error' in r:
+            print(f"{name:<10} {r['error']}")
+            continue
+        latency = r['latency_ms'] or {}
+        print(f"{name:<10} {r['throughput_rps']:>8} {latency.get('p50', '-'):>9} {latency.get('p95', '-'):>9} "
+              f"{latency.get('p99', '-'):>9} {r.get('peak_rss_mb', '-'):>8}  {r['errors'] or ''}")
+
+        before = (previous or {}).get(name)
+        if before and 'error' not in before and before.get('latency_ms') and latency:
+            changes = [('req/s', before['throughput_rps'], r['throughput_rps'])]
+            changes += [(q, before['latency_ms'][q], latency[q]) for q in ('p50', 'p95', 'p99')]
+            if before.get('peak_rss_mb') and r.get('peak_rss_mb'):
+                changes.append(('peak MB', before['peak_rss_mb'], r['peak_rss_mb']))
+            print(' ' * 11 + '  '.join(f"{label} {(new - old) / old * 100:+.1f}%" for label, old, new in changes if old))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', default=list(SCENARIOS), help=f"Any of: {', '.join(SCENARIOS)}")
+    parser.add_argument('-n', '--requests', type=int, default=200)
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--timeout', type=float, default=120.0, help='Per-request timeout in seconds')
+    parser.add_argument('--latency-ms', type=float, default=800.0, help='Median fake Gemini latency')
+    parser.add_argument('--jitter', type=float, default=0.4, help='Log-normal sigma of the fake latency')
+    parser.add_argument('--errors', default='', help='Fake Gemini error rates, e.g. 429:0.02,500:0.01')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for fake latency and errors')
+    parser.add_argument('--port', type=int, default=5099, help='Port for the app under test')
+    parser.add_argument('--gemini-port', type=int, default=8765)
+    parser.add_argument('--server', help='Benchmark an already running server instead of starting one '
+                                         '(it must use GEMINI_BASE_URL=http://127.0.0.1:<gemini-port>)')
+    parser.add_argument('--output', default='bench_results.json', help='Where to write the JSON results')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    fake = FakeGemini(args.latency_ms, args.jitter, parse_errors(args.errors), args.seed)
+    gemini = fake.serve(args.gemini_port)
+    gemini_url = f'http://127.0.0.1:{args.gemini_port}'
+
+    results = {}
+    try:
+        for name in args.scenarios:
+            print(f"Running {name} ({args.requests} requests, concurrency {args.concurrency})...")
+            results[name] = run_scenario(name, args, gemini_url)
+    finally:
+        gemini.shutdown()
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'git_commit': git_commit(),
+        'config': {key: getattr(args, key) for key in ('requests', 'concurrency', 'warmup', 'latency_ms', 'jitter', 'errors', 'seed')},
+        'fake_gemini': fake.stats,
+        'scenarios': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)['scenarios']
+    print_results(results, previous)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
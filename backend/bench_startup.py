@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: cold import time, time to first request and peak RSS for each app variant
+Each measurement runs in a fresh interpreter so nothing is cached between runs
+
+    python bench_startup.py                      # all variants, 5 runs each
+    python bench_startup.py app_url_digestion -n 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_MODULES = ['app_url_digestion', 'app_enhanced', 'app', 'app_working', 'app_real', 'app_demo']
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+module.app.test_client().get('/')
+first_request = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - start,
+    'first_request_seconds': first_request - start,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+}))
+"""
+
+
+def measure(module, runs):
+    samples = []
+    env = dict(os.environ, GOOGLE_API_KEY=os.getenv('GOOGLE_API_KEY') or 'benchmark')
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', PROBE, module], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+        if result.returncode != 0:
+            return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'}
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {key: round(statistics.median(s[key] for s in samples), 3) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold start of the backend app variants')
+    parser.add_argument('modules', nargs='*', default=APP_MODULES)
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='Output raw JSON')
+    args = parser.parse_args()
+
+    results = {module: measure(module, args.runs) for module in args.modules}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'module':<20} {'import s':>9} {'1st req s':>10} {'RSS MB':>8}")
+    for module, r in results.items():
+        if 'error' in r:
+            print(f"{module:<20} {r['error']}")
+        else:
+            print(f"{module:<20} {r['import_seconds']:>9} {r['first_request_seconds']:>10} {r['max_rss_mb']:>8}")
+
+
+if __name__ == '__main__':
+    main()
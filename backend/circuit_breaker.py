@@ -0,0 +1,141 @@
+"""
+Circuit breaker for outbound Gemini calls
+Trips on error rate or slow calls so requests can go straight to local fallbacks
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is attempted while the circuit is open"""
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str = 'gemini', window_size: int = 20, min_calls: int = 5,
+                 failure_rate_threshold: float = 0.5, slow_call_seconds: float = 20.0,
+                 open_seconds: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        # Sliding window of recent outcomes: True means the call failed or was too slow
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._close_listeners: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def add_close_listener(self, listener: Callable[[], None]):
+        """Register a callback fired whenever the circuit returns to closed"""
+        self._close_listeners.append(listener)
+
+    def allow_request(self) -> bool:
+        """Return True if a call may go through right now"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+            return False
+
+    def record_success(self, latency: float):
+        """Record a completed call; calls slower than the threshold count as failures"""
+        if latency >= self.slow_call_seconds:
+            self.record_failure()
+            return
+
+        closed = False
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                self._state = self.CLOSED
+                self._outcomes.clear()
+                closed = True
+            self._outcomes.append(False)
+
+        if closed:
+            self._notify_closed()
+
+    def record_failure(self):
+        """Record a failed (or too slow) call"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                self._trip()
+                return
+
+            self._outcomes.append(True)
+            if self._state == self.CLOSED and len(self._outcomes) >= self.min_calls:
+                failure_rate = sum(self._outcomes) / len(self._outcomes)
+                if failure_rate >= self.failure_rate_threshold:
+                    self._trip()
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run func through the breaker, raising CircuitOpenError instead of calling it when open"""
+        if not self.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+
+        self.record_success(time.monotonic() - start)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current breaker state for status endpoints"""
+        with self._lock:
+            self._maybe_half_open()
+            failures = sum(self._outcomes)
+            return {
+                'name': self.name,
+                'state': self._state,
+                'recent_calls': len(self._outcomes),
+                'recent_failures': failures,
+                'failure_rate': failures / len(self._outcomes) if self._outcomes else 0.0,
+                'retry_in_seconds': max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+                if self._state == self.OPEN else 0.0
+            }
+
+    def _trip(self):
+        # Caller holds the lock
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_in_flight = 0
+        print(f"Circuit '{self.name}' opened")
+
+    def _maybe_half_open(self):
+        # Caller holds the lock
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._half_open_in_flight = 0
+
+    def _notify_closed(self):
+        print(f"Circuit '{self.name}' closed")
+        for listener in self._close_listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"Circuit close listener error: {e}")
@@ -0,0 +1,139 @@
+"""
+Content-type classification
+All routing keywords compile into one alternation regex so a document is scanned once;
+an optional TF-IDF + linear model (plain NumPy arrays in an .npz file) can replace the keywords
+"""
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from vector_index import TOKEN_PATTERN
+
+# Joins documents for batch scanning; no keyword can contain it
+DOCUMENT_SEPARATOR = '\x00'
+
+
+class KeywordClassifier:
+    def __init__(self, routing_rules: Dict[str, Dict[str, Any]], default: str = 'general'):
+        self.default = default
+        self.types = list(routing_rules)
+        self._type_of: Dict[str, int] = {}
+        for type_index, rules in enumerate(routing_rules.values()):
+            for keyword in rules['keywords']:
+                self._type_of.setdefault(keyword.lower(), type_index)
+
+        # Longest keywords first so 'documentation' wins over any shorter keyword at the same position
+        keywords = sorted(self._type_of, key=len, reverse=True)
+        self._pattern = re.compile('|'.join(re.escape(k) for k in keywords)) if keywords else None
+
+    def scores(self, text: str) -> Dict[str, int]:
+        """Keyword hit counts per content type from a single scan"""
+        counts = dict.fromkeys(self.types, 0)
+        if self._pattern is None:
+            return counts
+        for keyword, hits in Counter(self._pattern.findall(text.lower())).items():
+            counts[self.types[self._type_of[keyword]]] += hits
+        return counts
+
+    def classify(self, text: str) -> str:
+        """Content type with the most keyword hits, or the default when nothing matches"""
+        scores = self.scores(text)
+        if scores and max(scores.values()) > 0:
+            return max(scores, key=scores.get)
+        return self.default
+
+    def classify_batch(self, texts: Sequence[str]) -> List[str]:
+        """Classify many documents with one scan over their concatenation"""
+        if not texts:
+            return []
+        if self._pattern is None:
+            return [self.default] * len(texts)
+
+        lowered = [t.lower() for t in texts]
+        joined = DOCUMENT_SEPARATOR.join(lowered)
+        starts = np.cumsum([0] + [len(t) + 1 for t in lowered[:-1]])
+        positions, type_codes = [], []
+        for match in self._pattern.finditer(joined):
+            positions.append(match.start())
+            type_codes.append(self._type_of[match.group()])
+
+        counts = np.zeros((len(texts), len(self.types)), dtype=np.int64)
+        if positions:
+            docs = np.searchsorted(starts, positions, side='right') - 1
+            np.add.at(counts, (docs, type_codes), 1)
+
+        # argmax keeps the first type on ties, matching classify()
+        best = counts.argmax(axis=1)
+        has_hits = counts.max(axis=1) > 0
+        return [self.types[b] if hit else self.default for b, hit in zip(best, has_hits)]
+
+
+class LinearClassifier:
+    """TF-IDF features with one weight row per label; trained as normalized class centroids"""
+
+    def __init__(self, vocabulary: Sequence[str], idf: np.ndarray, weights: np.ndarray,
+                 bias: np.ndarray, labels: Sequence[str]):
+        self.vocabulary = {term: i for i, term in enumerate(vocabulary)}
+        self.idf = idf.astype(np.float32)
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.labels = list(labels)
+
+    @classmethod
+    def fit(cls, texts: Sequence[str], labels: Sequence[str], max_features: int = 20000) -> 'LinearClassifier':
+        document_terms = [Counter(TOKEN_PATTERN.findall(t.lower())) for t in texts]
+        document_frequency = Counter(term for terms in document_terms for term in terms)
+        vocabulary = [term for term, _ in document_frequency.most_common(max_features)]
+        index = {term: i for i, term in enumerate(vocabulary)}
+        idf = np.log((1 + len(texts)) / (1 + np.array([document_frequency[t] for t in vocabulary], dtype=np.float32))) + 1
+
+        label_names = sorted(set(labels))
+        centroids = np.zeros((len(label_names), len(vocabulary)), dtype=np.float32)
+        for terms, label in zip(document_terms, labels):
+            centroids[label_names.index(label)] += cls._tfidf(terms, index, idf, len(vocabulary))
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return cls(vocabulary, idf, centroids / norms, np.zeros(len(label_names), dtype=np.float32), label_names)
+
+    @classmethod
+    def load(cls, path: str) -> 'LinearClassifier':
+        data = np.load(path, allow_pickle=False)
+        return cls(data['vocabulary'].tolist(), data['idf'], data['weights'], data['bias'], data['labels'].tolist())
+
+    def save(self, path: str):
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+        np.savez_compressed(path, vocabulary=np.array(vocabulary), idf=self.idf, weights=self.weights,
+                            bias=self.bias, labels=np.array(self.labels))
+
+    def classify(self, text: str) -> str:
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts: Sequence[str]) -> List[str]:
+        features = np.stack([
+            self._tfidf(Counter(TOKEN_PATTERN.findall(t.lower())), self.vocabulary, self.idf, len(self.vocabulary))
+            for t in texts
+        ]) if texts else np.zeros((0, len(self.vocabulary)), dtype=np.float32)
+        scores = features @ self.weights.T + self.bias
+        return [self.labels[i] for i in scores.argmax(axis=1)]
+
+    @staticmethod
+    def _tfidf(terms: Counter, index: Dict[str, int], idf: np.ndarray, size: int) -> np.ndarray:
+        vector = np.zeros(size, dtype=np.float32)
+        for term, count in terms.items():
+            i = index.get(term)
+            if i is not None:
+                vector[i] = (1 + np.log(count)) * idf[i]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def create_classifier(routing_rules: Dict[str, Dict[str, Any]], model_path: Optional[str] = None):
+    """Use the trained model when one is configured and present, keyword rules otherwise"""
+    if model_path:
+        try:
+            return LinearClassifier.load(model_path)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Could not load classifier model {model_path}: {e} - using keyword rules")
+    return KeywordClassifier(routing_rules)
@@ -0,0 +1,155 @@
+"""
+Deferred LLM enrichment ("store now, analyze later")
+Memories are stored immediately from a cheap local scrape and a background worker
+drains the queue through Gemini at a quota-aware pace, updating them in place
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import tracing
+
+PENDING = 'pending_enrichment'
+ENRICHING = 'enriching'
+ENRICHED = 'enriched'
+FAILED = 'enrichment_failed'
+
+
+class QuotaExceededError(Exception):
+    """Raised by an enrichment handler when the provider reports a quota/rate limit"""
+
+
+class EnrichmentQueue:
+    def __init__(self, handler: Callable[[str, Dict[str, Any]], None], requests_per_minute: float = 10,
+                 max_attempts: int = 3, quota_backoff_seconds: float = 60.0, max_backoff_seconds: float = 900.0,
+                 finished_ttl_seconds: float = 3600.0):
+        """handler(memory_id, payload) performs the LLM call and updates the memory in place;
+        statuses of finished jobs are kept for finished_ttl_seconds for polling, then dropped"""
+        self.handler = handler
+        self.min_interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self.max_attempts = max_attempts
+        self.quota_backoff_seconds = quota_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.finished_ttl_seconds = finished_ttl_seconds
+
+        self._jobs: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, threading.Event] = {}
+        # Trace context of each submission, so enrichment spans join the request that queued them
+        self._trace_contexts: Dict[str, Any] = {}
+        # (completed_at, memory_id) of finished jobs, oldest first, for evicting their status
+        self._finished: Deque[Tuple[float, str]] = deque()
+        self._cond = threading.Condition()
+        self._next_call_at = 0.0
+        self._backoff = 0.0
+        self._worker: Optional[threading.Thread] = None
+
+    def submit(self, memory_id: str, payload: Dict[str, Any]):
+        """Queue a stored memory for enrichment"""
+        with self._cond:
+            self._evict_finished()
+            self._jobs.append((memory_id, payload))
+            self._status[memory_id] = {'status': PENDING, 'attempts': 0, 'error': None, 'completed_at': None}
+            self._events[memory_id] = threading.Event()
+            self._trace_contexts[memory_id] = tracing.capture()
+            self._ensure_worker()
+            self._cond.notify()
+
+    def status(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        """Current enrichment status for a memory, or None if it was never queued"""
+        with self._cond:
+            status = self._status.get(memory_id)
+            return dict(status) if status else None
+
+    def wait(self, memory_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Block until the memory is enriched (or failed) or the timeout elapses, then return its status"""
+        event = self._events.get(memory_id)
+        if event is not None:
+            event.wait(timeout)
+        return self.status(memory_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and per-status counts"""
+        with self._cond:
+            counts: Dict[str, int] = {}
+            for status in self._status.values():
+                counts[status['status']] = counts.get(status['status'], 0) + 1
+            return {
+                'queued': len(self._jobs),
+                'counts': counts,
+                'backoff_seconds': self._backoff,
+                'requests_per_minute': 60.0 / self.min_interval if self.min_interval else None
+            }
+
+    def _finish(self, memory_id: str, status: str, error: Optional[str]):
+        # Caller holds the lock
+        completed_at = time.time()
+        self._status[memory_id].update(status=status, error=error, completed_at=completed_at)
+        self._trace_contexts.pop(memory_id, None)
+        self._finished.append((completed_at, memory_id))
+        self._evict_finished()
+
+    def _evict_finished(self):
+        # Caller holds the lock; a memory queued again since it finished keeps its new status
+        cutoff = time.time() - self.finished_ttl_seconds
+        while self._finished and self._finished[0][0] < cutoff:
+            completed_at, memory_id = self._finished.popleft()
+            status = self._status.get(memory_id)
+            if status is not None and status['completed_at'] == completed_at:
+                del self._status[memory_id]
+                self._events.pop(memory_id, None)
+
+    def _ensure_worker(self):
+        # Caller holds the lock; the worker is started lazily so importing the app stays cheap
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='enrichment-worker', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs:
+                    self._cond.wait()
+                # Pace calls so background enrichment never exceeds its share of the quota
+                delay = self._next_call_at - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                memory_id, payload = self._jobs.popleft()
+                self._status[memory_id]['status'] = ENRICHING
+                self._status[memory_id]['attempts'] += 1
+                attempts = self._status[memory_id]['attempts']
+                self._next_call_at = time.monotonic() + self.min_interval
+
+            try:
+                with tracing.resume(self._trace_contexts.get(memory_id)), \
+                        tracing.span('enrichment', {'website_eater.memory_id': memory_id, 'enrichment.attempt': attempts}):
+                    self.handler(memory_id, payload)
+            except QuotaExceededError as e:
+                # Put the job back at the front and slow down until quota recovers
+                with self._cond:
+                    self._backoff = min(self.max_backoff_seconds, (self._backoff * 2) or self.quota_backoff_seconds)
+                    self._next_call_at = time.monotonic() + self._backoff
+                    self._jobs.appendleft((memory_id, payload))
+                    self._status[memory_id].update(status=PENDING, error=str(e))
+                    self._status[memory_id]['attempts'] -= 1
+                print(f"Enrichment quota hit, backing off {self._backoff:.0f}s")
+                continue
+            except Exception as e:
+                with self._cond:
+                    if attempts < self.max_attempts:
+                        self._jobs.append((memory_id, payload))
+                        self._status[memory_id].update(status=PENDING, error=str(e))
+                        continue
+                    self._finish(memory_id, FAILED, str(e))
+                    event = self._events[memory_id]
+                print(f"Enrichment of {memory_id} failed: {e}")
+                event.set()
+                continue
+
+            with self._cond:
+                self._backoff = 0.0
+                self._finish(memory_id, ENRICHED, None)
+                event = self._events[memory_id]
+            event.set()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Offline Gemini stand-in for benchmarks
+Answers generateContent from recorded responses (bench_data/recordings) after a latency drawn from a
+log-normal distribution, injects errors at configured rates, returns hash-derived embeddings, and
+serves the saved HTML corpus (bench_data/pages) for the scraping path. --record proxies to the real
+API instead and saves each response as a new recording
+
+    python fake_gemini.py --latency-ms 800 --jitter 0.4 --errors 429:0.02,500:0.01
+    GEMINI_BASE_URL=http://127.0.0.1:8765 gunicorn -c gunicorn.conf.py
+"""
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_data')
+UPSTREAM = 'https://generativelanguage.googleapis.com'
+EMBEDDING_DIMENSIONS = 768
+ERROR_BODIES = {
+    429: ('RESOURCE_EXHAUSTED', 'Resource has been exhausted (e.g. check quota).'),
+    500: ('INTERNAL', 'An internal error has occurred.'),
+    503: ('UNAVAILABLE', 'The model is overloaded. Please try again later.')
+}
+
+
+def parse_errors(spec):
+    """'429:0.02,500:0.01' -> {429: 0.02, 500: 0.01}"""
+    errors = {}
+    for item in filter(None, (spec or '').split(',')):
+        code, rate = item.split(':')
+        errors[int(code)] = float(rate)
+    return errors
+
+
+def load_recordings(directory):
+    recordings = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path) as f:
+            recording = json.load(f)
+        recording['name'] = os.path.splitext(os.path.basename(path))[0]
+        recordings.append(recording)
+    return recordings
+
+
+class FakeGemini:
+    def __init__(self, latency_ms=800.0, jitter=0.4, errors=None, seed=0, record=False, upstream=UPSTREAM,
+                 data_dir=DATA_DIR):
+        """latency_ms is the median; jitter is the log-normal sigma (0 = constant latency)"""
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.errors = errors or {}
+        self.record = record
+        self.upstream = upstream
+        self.recordings_dir = os.path.join(data_dir, 'recordings')
+        self.pages_dir = os.path.join(data_dir, 'pages')
+        self.recordings = load_recordings(self.recordings_dir)
+        self.random = random.Random(seed)
+        self.stats = {'generate': 0, 'embed': 0, 'pages': 0, 'errors': {}}
+        self._lock = threading.Lock()
+
+    def latency(self):
+        if self.latency_ms <= 0:
+            return 0.0
+        with self._lock:
+            if not self.jitter:
+                return self.latency_ms / 1000
+            return self.random.lognormvariate(math.log(self.latency_ms), self.jitter) / 1000
+
+    def injected_error(self):
+        with self._lock:
+            roll = self.random.random()
+        for code, rate in self.errors.items():
+            if roll < rate:
+                return code
+            roll -= rate
+        return None
+
+    def recording_for(self, prompt):
+        default = None
+        for recording in self.recordings:
+            if any(match in prompt for match in recording.get('match', [])):
+                return recording
+            if recording['name'] == 'default':
+                default = recording
+        return default or self.recordings[0]
+
+    def embedding(self, text):
+        # Deterministic unit vector per text, so the same page always lands in the same place
+        rng = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+        values = [rng.gauss(0, 1) for _ in range(EMBEDDING_DIMENSIONS)]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def count(self, key, code=None):
+        with self._lock:
+            if code is None:
+                self.stats[key] += 1
+            else:
+                self.stats['errors'][str(code)] = self.stats['errors'].get(str(code), 0) + 1
+
+    def serve(self, port=8765):
+        """Start serving on a background thread; returns the server (call shutdown() to stop)"""
+        fake = self
+
+        class Handler(_Handler):
+            gemini = fake
+
+        server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='fake-gemini', daemon=True).start()
+        return server
+
+
+def _prompt_text(body):
+    return '\n'.join(part.get('text', '') for content in body.get('contents', []) for part in content.get('parts', []))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    gemini = None
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/stats':
+            return self._json(200, self.gemini.stats)
+        match = re.fullmatch(r'/pages/([\w.-]+)', self.path.split('?')[0])
+        path = os.path.join(self.gemini.pages_dir, match.group(1)) if match else None
+        if not path or not os.path.isfile(path):
+            return self._json(404, {'error': 'not found'})
+        self.gemini.count('pages')
+        with open(path, 'rb') as f:
+            self._send(200, f.read(), 'text/html; charset=utf-8')
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        action = self.path.split('?')[0].rsplit(':', 1)[-1]
+
+        if action in ('embedContent', 'batchEmbedContents'):
+            self.gemini.count('embed')
+            requests_ = body.get('requests') or [body]
+            embeddings = [{'values': self.gemini.embedding(_prompt_text({'contents': [r.get('content', {})]}))}
+                          for r in requests_]
+            return self._json(200, {'embeddings': embeddings} if action == 'batchEmbedContents' else {'embedding': embeddings[0]})
+
+        if action != 'generateContent':
+            return self._json(404, {'error': {'code': 404, 'message': f'Unsupported method {action}', 'status': 'NOT_FOUND'}})
+        if self.gemini.record:
+            return self._record(body)
+
+        self.gemini.count('generate')
+        time.sleep(self.gemini.latency())
+        code = self.gemini.injected_error()
+        if code:
+            self.gemini.count('errors', code)
+            status, message = ERROR_BODIES.get(code, ('UNKNOWN', 'Injected error'))
+            return self._json(code, {'error': {'code': code, 'message': message, 'status': status}})
+        self._json(200, self.gemini.recording_for(_prompt_text(body))['response'])
+
+    def _record(self, body):
+        upstream = requests.post(self.gemini.upstream + self.path, json=body, timeout=300,
+                                 headers={'x-goog-api-key': self.headers.get('x-goog-api-key') or os.getenv('GOOGLE_API_KEY', '')})
+        if upstream.ok:
+            prompt = _prompt_text(body)
+            urls = re.findall(r'https?://\S+', prompt)
+            name = 'recorded-' + hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8]
+            with open(os.path.join(self.gemini.recordings_dir, name + '.json'), 'w') as f:
+                json.dump({'match': urls[:1], 'response': upstream.json()}, f, indent=2)
+                f.write('\n')
+            print(f"Recorded {name} ({urls[0] if urls else 'no URL'})")
+        self._send(upstream.status_code, upstream.content, upstream.headers.get('Content-Type', 'application/json'))
+
+    def _json(self, status, payload):
+        self._send(status, json.dumps(payload).encode('utf-8'), 'application/json')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=800.0, help='Median generateContent latency')
+    parser.add_argument('--jitter', type=float, default=0.4, help='Log-normal sigma of the latency (0 = constant)')
+    parser.add_argument('--errors', default='', help='Injected error rates, e.g. 429:0.02,500:0.01')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--record', action='store_true', help='Proxy to the real API and save responses as recordings')
+    args = parser.parse_args()
+
+    fake = FakeGemini(args.latency_ms, args.jitter, parse_errors(args.errors), args.seed, record=args.record)
+    server = fake.serve(args.port)
+    print(f"Fake Gemini on http://127.0.0.1:{args.port} ({len(fake.recordings)} recordings, "
+          f"{'recording' if args.record else 'replaying'})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
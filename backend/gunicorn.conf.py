@@ -0,0 +1,70 @@
+"""
+Production server profile: gunicorn -c gunicorn.conf.py
+Requests spend almost all their time waiting on Gemini, so each worker runs many threads
+(or gevent greenlets) instead of handling one request at a time
+"""
+import os
+import sys
+
+# Which app variant to serve (module:callable)
+wsgi_app = os.getenv('APP_MODULE', 'app_url_digestion:app')
+bind = f"0.0.0.0:{os.getenv('PORT', '5003')}"
+
+# gthread by default; GUNICORN_WORKER_CLASS=gevent (pip install gevent) for thousands of idle connections,
+# or uvicorn.workers.UvicornWorker to serve APP_MODULE through the ASGI wrapper (asgi.py reads it too)
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class.startswith('uvicorn.'):
+    wsgi_app = 'asgi:app'
+# Memories are kept in process memory, so one worker keeps every request on the same store;
+# raise WEB_CONCURRENCY only for app variants whose state lives outside the process
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+# Only one process can own the write-ahead log; more workers would each fail to take it over
+if os.getenv('WAL_DIR') and workers > 1:
+    raise SystemExit('WAL_DIR needs WEB_CONCURRENCY=1: only one process can own the write-ahead log')
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+
+# Import the app once in the master so workers fork with clients and indexes already loaded.
+# The catch: a HUP then restarts workers from that same import, so code changes need a full restart.
+# GUNICORN_PRELOAD=0 makes each worker import the app itself, which lets HUP pick up new code
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') != '0'
+
+# Gemini URL digestion can take a minute or more; stay well above that before killing a worker
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '180'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '120'))
+keepalive = 5
+
+# Worker recycling bounds slow memory growth. It is off by default because a recycled worker
+# loses the in-process memory store; enable it for variants with external storage
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges from the shared Prometheus directory"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    """With a write-ahead log, take it over and recover before serving. A worker that cannot own the log exits
+    as failed to boot, which stops gunicorn, instead of failing its requests"""
+    app_module = sys.modules.get('app_url_digestion')
+    if app_module is None or app_module.memories.wal is None:
+        return
+    from wal import WALError
+    # A worker replacing another (HUP, max_requests) waits for it to exit, but not past the boot timeout
+    app_module.memories.wal.lock_timeout = float(os.getenv(
+        'WAL_LOCK_TIMEOUT_SECONDS', min(worker.cfg.graceful_timeout + 30, worker.cfg.timeout - 30)
+    ))
+    try:
+        app_module.memories.recover()
+    except WALError as e:
+        worker.log.error(f"Cannot take over the write-ahead log: {e}")
+        # gunicorn's worker boot error code: the arbiter shuts down instead of respawning the worker
+        sys.exit(3)
@@ -0,0 +1,554 @@
+"""
+Tiered memory store: recent memories in a small mutable tier, older ones in read-only archive segments
+A background compactor moves memories older than the archive age out of process memory into
+immutable segment files that are memory-mapped read-only. Each segment carries sorted id and
+content-hash indexes, so finding a record is a binary search over the mapping and its text is
+decoded straight from the mapped pages; opening the store reads only segment headers. Changing an
+archived memory copies it back into the recent tier, where it shadows the archived copy.
+With a write-ahead log, every write to the recent tier is logged (and fsynced) before it returns, and
+a periodic checkpoint snapshots the recent tier so older log files can be dropped. The recent tier is
+recovered from the log on first use in each process, so a pre-fork master never holds (or checkpoints) it
+"""
+import fcntl
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+import textcodec
+from archive import content_hash
+from enrichment import PENDING
+from records import ArchivedRecord, MemoryRecord
+from responses import dumps_bytes
+from retrieval import parse_timestamp
+from wal import fsync_directory
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MAGIC = b'WESEG001'
+# magic, record count, records that shadow a copy in an older segment, id index offset, content index offset
+HEADER = struct.Struct('<8sIIQQ')
+# JSON header length, text length, text is a zstd frame
+RECORD_HEADER = struct.Struct('<IIB')
+ID_INDEX = np.dtype([('key', '<u8'), ('user', '<u8'), ('offset', '<u8')])
+CONTENT_INDEX = np.dtype([('key', '<u8'), ('offset', '<u8')])
+# Checkpoint of the recent tier, kept next to the write-ahead log
+SNAPSHOT = 'snapshot.seg'
+
+
+def key_of(value):
+    """64-bit hash used as the sort key of segment indexes"""
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def content_key(user_id, digest):
+    return key_of(f"{user_id}\0{digest}")
+
+
+def _loads(buffer):
+    return orjson.loads(buffer) if orjson is not None else json.loads(bytes(buffer))
+
+
+class Segment:
+    """One immutable segment file, memory-mapped read-only"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.superseded, id_offset, content_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an archive segment')
+        self._view = memoryview(self._map)
+        self._records_end = id_offset
+        self._ids = np.frombuffer(self._map, dtype=ID_INDEX, count=self.count, offset=id_offset)
+        self._contents = np.frombuffer(self._map, dtype=CONTENT_INDEX, count=self.count, offset=content_offset)
+
+    def _offset(self, index, key):
+        keys = index['key']
+        i = int(np.searchsorted(keys, np.uint64(key)))
+        if i < keys.shape[0] and int(keys[i]) == key:
+            return int(index['offset'][i])
+        return None
+
+    def _read(self, offset):
+        """The record at an offset and the offset of the next one"""
+        header_length, text_length, compressed = RECORD_HEADER.unpack_from(self._map, offset)
+        start = offset + RECORD_HEADER.size
+        header = _loads(self._view[start:start + header_length])
+        end = start + header_length + text_length
+        record = ArchivedRecord(header['id'], header['user_id'], header['title'], header['metadata'],
+                                self._view[start + header_length:end], bool(compressed))
+        return record, end
+
+    def contains(self, memory_id):
+        return self._offset(self._ids, key_of(memory_id)) is not None
+
+    def get(self, memory_id):
+        offset = self._offset(self._ids, key_of(memory_id))
+        if offset is None:
+            return None
+        record = self._read(offset)[0]
+        return record if record.id == memory_id else None
+
+    def content_id(self, user_id, digest):
+        offset = self._offset(self._contents, content_key(user_id, digest))
+        return self._read(offset)[0].id if offset is not None else None
+
+    def __iter__(self):
+        offset = HEADER.size
+        # The alignment padding before the indexes is shorter than a record header
+        while self._records_end - offset >= RECORD_HEADER.size:
+            record, offset = self._read(offset)
+            yield record
+
+    def for_user(self, user_id):
+        offsets = np.sort(self._ids['offset'][self._ids['user'] == np.uint64(key_of(user_id))])
+        for offset in offsets.tolist():
+            record = self._read(offset)[0]
+            if record.user_id == user_id:
+                yield record
+
+
+def write_segment(path, records, superseded=0):
+    """Write records (oldest first) to a new segment file, atomically; returns the record count"""
+    ids, contents = [], []
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(bytes(HEADER.size))
+        offset = HEADER.size
+        for record in records:
+            compressed, text = record.stored_text()
+            header = dumps_bytes({'id': record.id, 'user_id': record.user_id, 'title': record.title,
+                                  'metadata': record.metadata})
+            f.write(RECORD_HEADER.pack(len(header), len(text), compressed))
+            f.write(header)
+            f.write(text)
+            ids.append((key_of(record.id), key_of(record.user_id), offset))
+            contents.append((content_key(record.user_id, content_hash(record.content)), offset))
+            offset += RECORD_HEADER.size + len(header) + len(text)
+
+        # Indexes start 8-byte aligned so they map straight into numpy arrays
+        padding = -offset % 8
+        f.write(bytes(padding))
+        id_offset = offset + padding
+        f.write(np.sort(np.array(ids, dtype=ID_INDEX), order='key').tobytes())
+        content_offset = id_offset + len(ids) * ID_INDEX.itemsize
+        f.write(np.sort(np.array(contents, dtype=CONTENT_INDEX), order='key').tobytes())
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(ids), superseded, id_offset, content_offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(ids)
+
+
+class MemoryStore:
+    def __init__(self, directory=None, archive_after_seconds=7 * 86400, compact_interval_seconds=600, max_segments=16,
+                 wal=None, checkpoint_interval_seconds=300, on_recover=None):
+        """Without a directory everything stays in the recent tier, as a plain in-process list;
+        wal: a WriteAheadLog that makes recent-tier writes durable (recovered from here on first use);
+        on_recover(memories) is called once per process on first use, with the memories recovered from the log
+        (none without a log), so callers can rebuild in-process state such as a search index"""
+        self.directory = directory
+        self.archive_after_seconds = archive_after_seconds
+        self.compact_interval_seconds = compact_interval_seconds
+        self.max_segments = max_segments
+        self.wal = wal
+        self.checkpoint_interval_seconds = checkpoint_interval_seconds
+        self.on_recover = on_recover
+
+        self._recent = []
+        self._by_id = {}
+        # (user_id, content hash) -> memory ID for the recent tier; segments index their own
+        self._content_ids = {}
+        # Recent memories that shadow an archived copy
+        self._promoted = set()
+        # Times each recent memory was changed through persist(), so compaction can tell it changed meanwhile
+        self._versions = {}
+        self._segments = []
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        self._worker = None
+        self._checked_at = 0.0
+        self._recover_lock = threading.Lock()
+        self._recovered_pid = None
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._refresh(force=True)
+
+    def __len__(self):
+        self._ensure_recovered()
+        with self._lock:
+            archived = sum(s.count - s.superseded for s in self._segments)
+            return archived + len(self._recent) - len(self._promoted)
+
+    def __contains__(self, memory_id):
+        return self.get(memory_id) is not None
+
+    def append(self, memory):
+        self.extend([memory])
+
+    def extend(self, entries):
+        """Add memories; with a write-ahead log this returns once they are on disk"""
+        self._ensure_recovered()
+        encoded = self._encode(entries)
+        with self._lock:
+            for memory in entries:
+                self._add(memory)
+            ticket = self.wal.enqueue(encoded) if encoded else None
+        self._ensure_worker()
+        if ticket is not None:
+            self.wal.wait(ticket)
+
+    def persist(self, entries):
+        """Record changes made to live memories (from mutable()); with a write-ahead log they survive a restart"""
+        self._ensure_recovered()
+        encoded = self._encode(entries)
+        segments = self._current_segments()
+        with self._lock:
+            for memory in entries:
+                self._versions[memory.id] = self._versions.get(memory.id, 0) + 1
+                if memory.id not in self._by_id:
+                    # Archived by a compaction while it was being changed: the changed record shadows that copy
+                    self._add(memory)
+                    if any(s.contains(memory.id) for s in segments):
+                        self._promoted.add(memory.id)
+            ticket = self.wal.enqueue(encoded) if encoded else None
+        if ticket is not None:
+            self.wal.wait(ticket)
+
+    def _encode(self, entries):
+        if self.wal is None:
+            return None
+        return self.wal.encode([{'op': 'put', 'memory': memory.to_dict()} for memory in entries])
+
+    def _add(self, memory):
+        # Caller holds the lock
+        self._recent.append(memory)
+        self._by_id[memory.id] = memory
+        self._content_ids[(memory.user_id, content_hash(memory.content))] = memory.id
+
+    def note_content(self, user_id, digest, memory_id):
+        """Record another content hash for a memory (after its content changed)"""
+        self._ensure_recovered()
+        with self._lock:
+            self._content_ids[(user_id, digest)] = memory_id
+
+    def get(self, memory_id):
+        """A memory by ID: the live record if it is recent, a read-only view if archived"""
+        self._ensure_recovered()
+        memory = self._by_id.get(memory_id)
+        if memory is not None:
+            return memory
+        for segment in reversed(self._current_segments()):
+            memory = segment.get(memory_id)
+            if memory is not None:
+                return memory
+        return None
+
+    def content_id(self, user_id, digest):
+        """ID of the user's memory with this content hash, if any"""
+        self._ensure_recovered()
+        memory_id = self._content_ids.get((user_id, digest))
+        if memory_id is not None:
+            return memory_id
+        for segment in reversed(self._current_segments()):
+            memory_id = segment.content_id(user_id, digest)
+            if memory_id is not None:
+                return memory_id
+        return None
+
+    def mutable(self, memory_id):
+        """The memory as a live record that can be changed, copying it out of the archive if needed"""
+        self._ensure_recovered()
+        with self._lock:
+            memory = self.get(memory_id)
+            if memory is None or not isinstance(memory, ArchivedRecord):
+                return memory
+            memory = memory.to_record()
+            self._recent.append(memory)
+            self._by_id[memory_id] = memory
+            self._promoted.add(memory_id)
+            return memory
+
+    def __iter__(self):
+        """Every memory, archived ones first; views and records are created as the caller goes"""
+        return self._iterate(lambda segment: iter(segment), None)
+
+    def for_user(self, user_id):
+        return self._iterate(lambda segment: segment.for_user(user_id), user_id)
+
+    def _iterate(self, records_of, user_id):
+        self._ensure_recovered()
+        segments = self._current_segments()
+        with self._lock:
+            recent = list(self._recent)
+            recent_ids = set(self._by_id)
+        for i, segment in enumerate(segments):
+            newer = segments[i + 1:]
+            for memory in records_of(segment):
+                if memory.id in recent_ids or any(s.contains(memory.id) for s in newer):
+                    continue
+                yield memory
+        for memory in recent:
+            if user_id is None or memory.user_id == user_id:
+                yield memory
+
+    def stats(self):
+        self._ensure_recovered()
+        segments = self._current_segments()
+        with self._lock:
+            recent = len(self._recent)
+        return {
+            'recent': recent,
+            'archived': sum(s.count - s.superseded for s in segments),
+            'segments': len(segments),
+            'segment_bytes': sum(s.size for s in segments)
+        }
+
+    def compact(self):
+        """Move recent memories past the archive age into a new segment; returns how many moved"""
+        if not self.directory:
+            return 0
+        self._ensure_recovered()
+        cutoff = time.time() - self.archive_after_seconds
+        with self._compact_lock:
+            with self._lock:
+                old = [m for m in self._recent if self._archivable(m, cutoff)]
+                superseded = sum(1 for m in old if m.id in self._promoted)
+                versions = {m.id: self._versions.get(m.id, 0) for m in old}
+            moved = set()
+            if old:
+                with self._directory_lock():
+                    self._save_dictionaries(old, self.directory)
+                    path = os.path.join(self.directory, f"seg-{time.time_ns():020d}-{os.getpid()}-0.seg")
+                    write_segment(path, old, superseded)
+                    segment = Segment(path)
+                with self._lock:
+                    self._segments.append(segment)
+                    # Records are written without the lock held; one changed since it was picked may have been
+                    # written half-updated, so it stays in the recent tier and shadows the archived copy
+                    moved = {m.id for m in old if self._versions.get(m.id, 0) == versions[m.id]}
+                    self._promoted.update(versions.keys() - moved)
+                    self._recent = [m for m in self._recent if m.id not in moved]
+                    for memory_id in moved:
+                        self._by_id.pop(memory_id, None)
+                        self._promoted.discard(memory_id)
+                        self._versions.pop(memory_id, None)
+                    self._content_ids = {k: v for k, v in self._content_ids.items() if v not in moved}
+                print(f"Archived {len(moved)} memories to {segment.name}")
+                # The log still holds the archived memories; replaying it would pull them back into the recent tier
+                self.checkpoint()
+            if len(self._current_segments()) > self.max_segments:
+                self._merge()
+            return len(moved)
+
+    def checkpoint(self):
+        """Snapshot the recent tier next to the write-ahead log and drop the log files it covers"""
+        if self.wal is None:
+            return
+        # Only a process that recovered the log may replace its snapshot and delete its files
+        self._ensure_recovered()
+        with self._checkpoint_lock:
+            with self._lock:
+                recent = list(self._recent)
+                closed = self.wal.rotate()
+            self._save_dictionaries(recent, self.wal.directory)
+            write_segment(os.path.join(self.wal.directory, SNAPSHOT), recent)
+            fsync_directory(self.wal.directory)
+            self.wal.remove_through(closed)
+
+    def pending_enrichment(self):
+        """Recent memories still waiting for enrichment (after a restart, these need queueing again)"""
+        self._ensure_recovered()
+        with self._lock:
+            return [m for m in self._recent if m.get_meta('enrichment_status') == PENDING]
+
+    def recover(self):
+        """Recover the recent tier in this process now, instead of on first use"""
+        self._ensure_recovered()
+
+    def _ensure_recovered(self):
+        # Caller must not hold the lock: recovery takes it, and so may on_recover
+        if self._recovered_pid == os.getpid():
+            return
+        with self._recover_lock:
+            if self._recovered_pid == os.getpid():
+                return
+            recovered = self._recover() if self.wal is not None else []
+            self._recovered_pid = os.getpid()
+        if self.on_recover is not None:
+            self.on_recover(recovered)
+
+    def _recover(self):
+        """Rebuild the recent tier from the last checkpoint plus the write-ahead log; returns the memories"""
+        started = time.perf_counter()
+        # Takes the log's lock in this process first, so no other process is still writing to it
+        self.wal.open()
+        self._load_dictionaries(self.wal.directory)
+        restored = {}
+        snapshot = os.path.join(self.wal.directory, SNAPSHOT)
+        if os.path.exists(snapshot):
+            for memory in Segment(snapshot):
+                restored[memory.id] = memory.to_record()
+        logged = 0
+        for entry in self.wal.replay():
+            memory = MemoryRecord.from_dict(entry['memory'])
+            restored[memory.id] = memory
+            logged += 1
+        archived = self._current_segments()
+        with self._lock:
+            # Whatever this process holds was copied from the process it forked from; the log is what counts
+            self._recent = []
+            self._by_id = {}
+            self._content_ids = {}
+            self._promoted = set()
+            self._versions = {}
+            for memory in restored.values():
+                self._add(memory)
+                # Also archived if the process stopped between a compaction and its checkpoint
+                if any(s.contains(memory.id) for s in archived):
+                    self._promoted.add(memory.id)
+        if restored:
+            print(f"Recovered {len(restored)} recent memories ({logged} logged writes) "
+                  f"in {time.perf_counter() - started:.2f}s")
+        return list(restored.values())
+
+    def _archivable(self, memory, cutoff):
+        # Memories still waiting for enrichment are about to change; unparseable timestamps count as old
+        if memory.get_meta('enrichment_status') == PENDING:
+            return False
+        return not parse_timestamp(memory.get_meta('timestamp')) > cutoff
+
+    def _merge(self):
+        """Fold the smallest run of adjacent segments into one, keeping the newest copy of each memory"""
+        with self._directory_lock():
+            self._refresh(force=True)
+            segments = self._current_segments()
+            width = len(segments) - self.max_segments + 1
+            if width < 2:
+                return
+            start = min(range(len(segments) - width + 1), key=lambda i: sum(s.size for s in segments[i:i + width]))
+            run, older = segments[start:start + width], segments[:start]
+
+            def live():
+                for i, segment in enumerate(run):
+                    for memory in segment:
+                        if not any(s.contains(memory.id) for s in run[i + 1:]):
+                            yield memory
+
+            superseded = sum(1 for m in live() if any(s.contains(m.id) for s in older))
+            # Named right after the newest segment in the run, so the merged one keeps the run's place in the order
+            stamp, pid, generation = run[-1].name[len('seg-'):-len('.seg')].split('-')
+            path = os.path.join(self.directory, f"seg-{stamp}-{pid}-{int(generation) + 1}.seg")
+            write_segment(path, live(), superseded)
+            merged = Segment(path)
+            for segment in run:
+                os.remove(segment.path)
+            with self._lock:
+                self._segments = older + [merged] + segments[start + width:]
+        print(f"Merged {width} archive segments into {merged.name}")
+
+    def _current_segments(self):
+        if self.directory:
+            self._refresh()
+        with self._lock:
+            return list(self._segments)
+
+    def _refresh(self, force=False):
+        """Pick up segments written or merged by other workers sharing the directory (checked once a second)"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < 1.0:
+            return
+        self._checked_at = now
+        self._load_dictionaries(self.directory)
+        names = sorted(os.path.basename(p) for p in glob.glob(os.path.join(self.directory, 'seg-*.seg')))
+        with self._lock:
+            if names == [s.name for s in self._segments]:
+                return
+            current = {s.name: s for s in self._segments}
+            segments = []
+            for name in names:
+                try:
+                    segments.append(current.get(name) or Segment(os.path.join(self.directory, name)))
+                except (OSError, ValueError) as e:
+                    # Removed by a merge in another worker since the listing
+                    print(f"Skipping archive segment {name}: {e}")
+            self._segments = segments
+
+    def _load_dictionaries(self, directory):
+        for path in glob.glob(os.path.join(directory, 'zstd-*.dict')):
+            with open(path, 'rb') as f:
+                textcodec.codec.add_dictionary(f.read())
+
+    def _save_dictionaries(self, memories, directory):
+        """Keep every zstd dictionary the stored text needs next to the files holding it"""
+        dict_ids = set()
+        for memory in memories:
+            compressed, text = memory.stored_text()
+            if compressed:
+                dict_ids.add(textcodec.zstandard.get_frame_parameters(text).dict_id)
+        for dict_id in dict_ids - {0}:
+            path = os.path.join(directory, f'zstd-{dict_id}.dict')
+            if not os.path.exists(path):
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(textcodec.codec.dictionary_data(dict_id))
+                os.replace(path + '.tmp', path)
+
+    def _directory_lock(self):
+        return _FileLock(os.path.join(self.directory, '.lock'))
+
+    def _ensure_worker(self):
+        # Started lazily so it runs in the serving process, not a pre-fork master
+        if not self.directory and self.wal is None:
+            return
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='archive-compactor', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        next_compaction = time.monotonic() + self.compact_interval_seconds
+        next_checkpoint = time.monotonic() + self.checkpoint_interval_seconds
+        while True:
+            time.sleep(max(0.0, min(next_compaction, next_checkpoint) - time.monotonic()))
+            now = time.monotonic()
+            try:
+                if self.directory and now >= next_compaction:
+                    next_compaction = now + self.compact_interval_seconds
+                    self.compact()
+                if self.wal is not None and now >= next_checkpoint:
+                    next_checkpoint = now + self.checkpoint_interval_seconds
+                    self.checkpoint()
+            except Exception as e:
+                print(f"Archive compaction or checkpoint error: {e}")
+
+
+class _FileLock:
+    """Exclusive lock on a file, so only one worker writes or merges segments at a time"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
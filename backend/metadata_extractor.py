@@ -0,0 +1,117 @@
+"""
+Single-pass metadata extraction from Gemini responses
+One precompiled pattern finds labelled fields (plain or **bold**) and Markdown headings;
+JSON-LD / OpenGraph data from the fetched HTML fills whatever the text does not provide
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+LABEL_FIELDS = {
+    'title': 'title', 'título': 'title', 'heading': 'title',
+    'author': 'author', 'autor': 'author', 'by': 'author',
+    'date': 'publish_date', 'published': 'publish_date', 'fecha': 'publish_date',
+    'keywords': 'keywords', 'tags': 'keywords'
+}
+
+BOLD = r'(?:\*\*|__)?'
+
+# The heading branch is a zero-width lookahead so "## Title: X" still reaches the label branch
+METADATA_PATTERN = re.compile(
+    r'(?P<label_match>\b(?P<label>' + '|'.join(LABEL_FIELDS) + r')' + BOLD + r'[ \t]*:' + BOLD + r'\s*(?P<value>.+))'
+    r'|(?m:^[ \t]{0,3}#{1,6}[ \t]+(?=(?P<heading>[^\n]+)))',
+    re.IGNORECASE
+)
+
+
+def _clean(value: str) -> str:
+    return value.strip().strip('*_').strip().rstrip('#').strip()
+
+
+def _keyword_list(value) -> List[str]:
+    if isinstance(value, list):
+        return [str(k).strip() for k in value if str(k).strip()]
+    return [k.strip() for k in str(value).split(',') if k.strip()]
+
+
+def extract_metadata(content: str, fallback: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Title, author, publish_date and keywords from one scan; the first occurrence of each wins"""
+    metadata: Dict[str, Any] = {}
+    first_heading = None
+
+    for match in METADATA_PATTERN.finditer(content):
+        if match.group('label_match'):
+            field = LABEL_FIELDS[match.group('label').lower()]
+            if field not in metadata:
+                value = _clean(match.group('value'))
+                metadata[field] = _keyword_list(value) if field == 'keywords' else value
+                if len(metadata) == 4:
+                    break
+        elif first_heading is None:
+            first_heading = _clean(match.group('heading'))
+
+    # An explicit Title: label beats the first Markdown heading
+    if 'title' not in metadata and first_heading:
+        metadata['title'] = first_heading
+
+    for field, value in (fallback or {}).items():
+        if field not in metadata and value:
+            metadata[field] = value
+    return metadata
+
+
+def _json_ld_objects(data) -> List[Dict[str, Any]]:
+    if isinstance(data, list):
+        return [obj for item in data for obj in _json_ld_objects(item)]
+    if isinstance(data, dict):
+        return [data] + _json_ld_objects(data.get('@graph', []))
+    return []
+
+
+def structured_metadata(soup) -> Dict[str, Any]:
+    """Title, author, publish_date and keywords from JSON-LD and OpenGraph/meta tags in parsed HTML"""
+    metadata: Dict[str, Any] = {}
+
+    for script in soup.find_all('script', attrs={'type': 'application/ld+json'}):
+        try:
+            objects = _json_ld_objects(json.loads(script.string or ''))
+        except ValueError:
+            continue
+        for obj in objects:
+            title = obj.get('headline') or obj.get('name')
+            if title and 'title' not in metadata:
+                metadata['title'] = str(title).strip()
+            author = obj.get('author')
+            if isinstance(author, list) and author:
+                author = author[0]
+            if isinstance(author, dict):
+                author = author.get('name')
+            if author and 'author' not in metadata:
+                metadata['author'] = str(author).strip()
+            if obj.get('datePublished') and 'publish_date' not in metadata:
+                metadata['publish_date'] = str(obj['datePublished'])
+            if obj.get('keywords') and 'keywords' not in metadata:
+                metadata['keywords'] = _keyword_list(obj['keywords'])
+
+    meta_fields = {
+        'og:title': 'title',
+        'article:author': 'author',
+        'author': 'author',
+        'article:published_time': 'publish_date',
+        'keywords': 'keywords'
+    }
+    tags = []
+    for tag in soup.find_all('meta'):
+        key = (tag.get('property') or tag.get('name') or '').lower()
+        value = tag.get('content')
+        if not value:
+            continue
+        if key == 'article:tag':
+            tags.append(value.strip())
+        elif key in meta_fields and meta_fields[key] not in metadata:
+            field = meta_fields[key]
+            metadata[field] = _keyword_list(value) if field == 'keywords' else value.strip()
+    if tags and 'keywords' not in metadata:
+        metadata['keywords'] = tags
+
+    return metadata
@@ -0,0 +1,138 @@
+"""
+Per-stage latency instrumentation and the Prometheus /metrics endpoint
+Stage timings taken during a request are held until it finishes, then observed with the
+content_type and model the handler labelled and the response status; timings outside a
+request (background workers) are observed right away. Each stage is also a tracing span
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_app_context, request
+
+from tracing import set_attributes, span
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Histogram
+except ImportError:
+    prometheus_client = None
+
+UNKNOWN = 'unknown'
+# LLM calls dominate the upper buckets; local stages land in the first few
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+if prometheus_client is not None:
+    STAGE_SECONDS = Histogram(
+        'website_eater_stage_seconds', 'Time spent in each digestion stage',
+        ['stage', 'content_type', 'model', 'status'], buckets=LATENCY_BUCKETS
+    )
+    REQUEST_SECONDS = Histogram(
+        'website_eater_request_seconds', 'End-to-end API request time',
+        ['endpoint', 'content_type', 'model', 'status'], buckets=LATENCY_BUCKETS
+    )
+    CACHE_HITS = Counter('website_eater_cache_hits_total', 'Requests answered from a cache', ['cache'])
+    CACHE_MISSES = Counter('website_eater_cache_misses_total', 'Cache lookups that missed', ['cache'])
+    QUOTA_ERRORS = Counter('website_eater_quota_errors_total', 'LLM calls rejected for quota (429)', ['model'])
+    FALLBACKS = Counter('website_eater_fallbacks_total', 'Requests served by a local fallback instead of the LLM', ['reason'])
+
+
+# Span attribute for each metrics label
+LABEL_ATTRIBUTES = {'content_type': 'website_eater.content_type', 'model': 'gen_ai.request.model'}
+
+# Content types the apps classify into (and the feedback types the UIs send). Clients can supply their
+# own type, so anything else is reported as 'other' to keep the number of time series bounded
+CONTENT_TYPES = frozenset((
+    'general', 'article', 'blog', 'news', 'research', 'documentation', 'product', 'code', 'video',
+    'video_feedback', 'bug_report', 'general_feedback', 'feature_request'
+))
+OTHER = 'other'
+
+
+@contextmanager
+def stage(name, attributes=None):
+    """Time a block as one stage of the current request"""
+    start = time.perf_counter()
+    try:
+        with span(name, attributes):
+            yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_stage(name, seconds):
+    if prometheus_client is None:
+        return
+    if has_app_context() and 'metric_stages' in g:
+        g.metric_stages.append((name, seconds))
+    else:
+        STAGE_SECONDS.labels(name, UNKNOWN, UNKNOWN, 'background').observe(seconds)
+
+
+def label(**labels):
+    """Attach content_type/model labels to the current request's timings (and its span)"""
+    if labels.get('content_type') and labels['content_type'] not in CONTENT_TYPES:
+        labels['content_type'] = OTHER
+    set_attributes({LABEL_ATTRIBUTES[key]: value for key, value in labels.items()})
+    if has_app_context() and 'metric_labels' in g:
+        g.metric_labels.update((key, value) for key, value in labels.items() if value)
+
+
+def cache_hit(cache):
+    set_attributes({'cache.name': cache, 'cache.hit': True})
+    if prometheus_client is not None:
+        CACHE_HITS.labels(cache).inc()
+
+
+def cache_miss(cache):
+    set_attributes({'cache.name': cache, 'cache.hit': False})
+    if prometheus_client is not None:
+        CACHE_MISSES.labels(cache).inc()
+
+
+def quota_error(model):
+    if prometheus_client is not None:
+        QUOTA_ERRORS.labels(model or UNKNOWN).inc()
+
+
+def fallback(reason):
+    if prometheus_client is not None:
+        FALLBACKS.labels(reason).inc()
+
+
+def _start_request():
+    g.metric_start = time.perf_counter()
+    g.metric_stages = []
+    g.metric_labels = {}
+
+
+def _finish_request(response):
+    if 'metric_start' not in g or request.endpoint in (None, 'static', 'metrics'):
+        return response
+    content_type = g.metric_labels.get('content_type', UNKNOWN)
+    model = g.metric_labels.get('model', UNKNOWN)
+    status = str(response.status_code)
+    for name, seconds in g.metric_stages:
+        STAGE_SECONDS.labels(name, content_type, model, status).observe(seconds)
+    REQUEST_SECONDS.labels(request.endpoint, content_type, model, status).observe(time.perf_counter() - g.metric_start)
+    return response
+
+
+def metrics_view():
+    """Prometheus text exposition (aggregated across workers when PROMETHEUS_MULTIPROC_DIR is set)"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(prometheus_client.generate_latest(registry), content_type=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+def install(app):
+    """Time every request and serve /metrics (a no-op without prometheus_client)"""
+    if prometheus_client is None:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Local OTLP/HTTP stand-in collector for checking traces without a tracing backend
+Prints each span as it arrives, optionally appends them to a JSONL file, and on exit shows
+per-span latency percentiles so the hop that dominates p99 stands out
+
+    python otlp_sink.py                        # listens on :4318
+    OTEL_EXPORTER_OTLP_ENDPOINT=http://localhost:4318 gunicorn -c gunicorn.conf.py
+"""
+import argparse
+import gzip
+import json
+import statistics
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import (
+    ExportTraceServiceRequest, ExportTraceServiceResponse
+)
+
+spans_by_name = defaultdict(list)
+lock = threading.Lock()
+
+
+def attribute_value(value):
+    kind = value.WhichOneof('value')
+    return getattr(value, kind) if kind in ('string_value', 'bool_value', 'int_value', 'double_value') else str(value)
+
+
+def decode(body):
+    """Flatten an ExportTraceServiceRequest into span dicts"""
+    export = ExportTraceServiceRequest()
+    export.ParseFromString(body)
+    for resource_spans in export.resource_spans:
+        service = {a.key: attribute_value(a.value) for a in resource_spans.resource.attributes}.get('service.name')
+        for scope_spans in resource_spans.scope_spans:
+            for span in scope_spans.spans:
+                yield {
+                    'service': service,
+                    'trace_id': span.trace_id.hex(),
+                    'span_id': span.span_id.hex(),
+                    'parent_id': span.parent_span_id.hex() or None,
+                    'name': span.name,
+                    'duration_ms': (span.end_time_unix_nano - span.start_time_unix_nano) / 1e6,
+                    'status': span.status.code,
+                    'attributes': {a.key: attribute_value(a.value) for a in span.attributes}
+                }
+
+
+class Handler(BaseHTTPRequestHandler):
+    output = None
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        spans = list(decode(body))
+        with lock:
+            for span in spans:
+                spans_by_name[span['name']].append(span['duration_ms'])
+                print(f"{span['trace_id'][:8]} {span['name']:<32} {span['duration_ms']:>9.1f} ms  {span['attributes']}")
+                if self.output:
+                    self.output.write(json.dumps(span) + '\n')
+            if self.output:
+                self.output.flush()
+
+        reply = ExportTraceServiceResponse().SerializeToString()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-protobuf')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summary():
+    print(f"\n{'span':<32} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, durations in sorted(spans_by_name.items(), key=lambda item: -percentile(item[1], 0.99)):
+        print(f"{name:<32} {len(durations):>6} {statistics.median(durations):>9.1f} "
+              f"{percentile(durations, 0.95):>9.1f} {percentile(durations, 0.99):>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=4318)
+    parser.add_argument('--output', help='Append received spans to this JSONL file')
+    args = parser.parse_args()
+
+    Handler.output = open(args.output, 'a') if args.output else None
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), Handler)
+    print(f"OTLP sink listening on http://127.0.0.1:{args.port}/v1/traces")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        summary()
+
+
+if __name__ == '__main__':
+    main()
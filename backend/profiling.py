@@ -0,0 +1,250 @@
+"""
+Opt-in request profiling for catching slow-request hotspots in production
+With PROFILE_DIR set, a request is profiled when it carries an X-Profile header or is picked at
+PROFILE_SAMPLE_RATE. The default profiler samples the handler thread's stack from a background
+thread every PROFILE_INTERVAL_MS, so the handler itself runs at full speed; PROFILE_MODE=cprofile
+traces every call instead. Profiles of requests slower than PROFILE_SLOW_SECONDS (and every
+header-triggered one) are saved as speedscope JSON or pstats, named by request id
+"""
+import cProfile
+import glob
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from flask import g, jsonify, request, send_file
+
+REQUEST_ID_PATTERN = re.compile(r'^[\w.-]{1,64}$')
+EXTENSIONS = {'sample': '.speedscope.json', 'cprofile': '.pstats'}
+
+
+class StackSampler:
+    """One background thread that samples the stacks of every thread currently being profiled"""
+
+    def __init__(self, interval_seconds):
+        self.interval = interval_seconds
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._sessions[thread_id] = []
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id):
+        """Samples taken for the thread: a list of (timestamp, stack) with the stack root first"""
+        with self._lock:
+            return self._sessions.pop(thread_id, [])
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                thread_ids = list(self._sessions)
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                with self._lock:
+                    samples = self._sessions.get(thread_id)
+                    if samples is not None and stack:
+                        samples.append((now, stack[::-1]))
+            time.sleep(self.interval)
+
+
+def speedscope(name, samples, started, finished):
+    """Sampled profile in speedscope's file format (https://www.speedscope.app)"""
+    frames, frame_index, stacks, weights = [], {}, [], []
+    previous = started
+    for timestamp, stack in samples:
+        indexes = []
+        for key in stack:
+            if key not in frame_index:
+                frame_index[key] = len(frames)
+                frames.append({'name': key[0], 'file': key[1], 'line': key[2]})
+            indexes.append(frame_index[key])
+        stacks.append(indexes)
+        weights.append(round((timestamp - previous) * 1000, 3))
+        previous = timestamp
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'website-eater',
+        'activeProfileIndex': 0,
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': round((finished - started) * 1000, 3),
+            'samples': stacks,
+            'weights': weights
+        }]
+    }
+
+
+class RequestProfiler:
+    def __init__(self, directory, mode='sample', sample_rate=0.0, slow_seconds=5.0, interval_ms=5.0, keep=200, token=None):
+        """token: if set, X-Profile must carry it and /api/profiles needs it as a bearer token"""
+        if mode not in EXTENSIONS:
+            raise ValueError(f"PROFILE_MODE must be one of {', '.join(EXTENSIONS)}")
+        self.directory = directory
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.keep = keep
+        self.token = token
+        self.sampler = StackSampler(interval_ms / 1000)
+        # cProfile can only trace one thread per process at a time; concurrent requests use the sampler
+        self._cprofile_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _start_request(self):
+        if request.endpoint in (None, 'static', 'metrics', 'profiles', 'profile_download'):
+            return
+        header = request.headers.get('X-Profile')
+        forced = header is not None and (not self.token or header == self.token)
+        if not forced and not (self.sample_rate and random.random() < self.sample_rate):
+            return
+        request_id = request.headers.get('X-Request-Id', '')
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        mode = self.mode
+        profiler = None
+        if mode == 'cprofile' and self._cprofile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            mode = 'sample'
+            self.sampler.start(threading.get_ident())
+        g.profile = {'request_id': request_id, 'forced': forced, 'mode': mode, 'profiler': profiler,
+                     'started': time.perf_counter(), 'status': None}
+
+    def _record_status(self, response):
+        if 'profile' in g:
+            g.profile['status'] = response.status_code
+            response.headers['X-Request-Id'] = g.profile['request_id']
+        return response
+
+    def _finish_request(self, exc):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        finished = time.perf_counter()
+        if profile['profiler'] is not None:
+            profile['profiler'].disable()
+            self._cprofile_lock.release()
+        else:
+            profile['samples'] = self.sampler.stop(threading.get_ident())
+
+        duration = finished - profile['started']
+        if profile['forced'] or duration >= self.slow_seconds:
+            try:
+                self.save(profile, duration, finished, status=500 if exc is not None else profile['status'])
+            except OSError as e:
+                print(f"Could not save profile {profile['request_id']}: {e}")
+
+    def save(self, profile, duration, finished, status):
+        request_id = profile['request_id']
+        name = f"{request.method} {request.path}"
+        path = os.path.join(self.directory, request_id + EXTENSIONS[profile['mode']])
+        if profile['profiler'] is not None:
+            profile['profiler'].dump_stats(path)
+        else:
+            with open(path, 'w') as f:
+                json.dump(speedscope(name, profile['samples'], profile['started'], finished), f, separators=(',', ':'))
+
+        meta = {
+            'request_id': request_id,
+            'name': name,
+            'status': status,
+            'duration_seconds': round(duration, 3),
+            'mode': profile['mode'],
+            'trigger': 'header' if profile['forced'] else 'sampled',
+            'samples': len(profile.get('samples', [])) if profile['profiler'] is None else None,
+            'file': os.path.basename(path),
+            'created_at': datetime.now().isoformat()
+        }
+        with open(os.path.join(self.directory, request_id + '.meta.json'), 'w') as f:
+            json.dump(meta, f)
+        self._prune()
+
+    def _prune(self):
+        metas = sorted(glob.glob(os.path.join(self.directory, '*.meta.json')), key=os.path.getmtime, reverse=True)
+        for meta_path in metas[self.keep:]:
+            request_id = os.path.basename(meta_path)[:-len('.meta.json')]
+            for path in [meta_path] + [os.path.join(self.directory, request_id + ext) for ext in EXTENSIONS.values()]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def list(self, limit=50):
+        """Saved profiles, newest first (from every worker sharing the directory)"""
+        profiles = []
+        for meta_path in glob.glob(os.path.join(self.directory, '*.meta.json')):
+            try:
+                with open(meta_path) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        profiles.sort(key=lambda p: p['created_at'], reverse=True)
+        return profiles[:limit]
+
+    def _authorized(self):
+        return not self.token or request.headers.get('Authorization') == f'Bearer {self.token}'
+
+    def list_view(self):
+        if not self._authorized():
+            return jsonify({'status': 'error', 'error': 'Profile token required'}), 403
+        return jsonify({'status': 'success', 'profiles': self.list(int(request.args.get('limit', 50)))})
+
+    def download_view(self, request_id):
+        if not self._authorized():
+            return jsonify({'status': 'error', 'error': 'Profile token required'}), 403
+        if REQUEST_ID_PATTERN.match(request_id):
+            for extension in EXTENSIONS.values():
+                path = os.path.join(self.directory, request_id + extension)
+                if os.path.exists(path):
+                    return send_file(os.path.abspath(path), as_attachment=True, download_name=request_id + extension)
+        return jsonify({'status': 'error', 'error': 'Profile not found'}), 404
+
+
+def install(app):
+    """Profile requests on demand and serve /api/profiles (a no-op unless PROFILE_DIR is set)"""
+    directory = os.getenv('PROFILE_DIR')
+    if not directory:
+        return None
+    profiler = RequestProfiler(
+        directory,
+        mode=os.getenv('PROFILE_MODE', 'sample'),
+        sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+        slow_seconds=float(os.getenv('PROFILE_SLOW_SECONDS', '5')),
+        interval_ms=float(os.getenv('PROFILE_INTERVAL_MS', '5')),
+        keep=int(os.getenv('PROFILE_KEEP', '200')),
+        token=os.getenv('PROFILE_TOKEN')
+    )
+    app.before_request(profiler._start_request)
+    app.after_request(profiler._record_status)
+    app.teardown_request(profiler._finish_request)
+    app.add_url_rule('/api/profiles', 'profiles', profiler.list_view)
+    app.add_url_rule('/api/profiles/<request_id>', 'profile_download', profiler.download_view)
+    return profiler
@@ -0,0 +1,232 @@
+"""
+Compact in-process memory records
+A stored memory is one slotted object rather than a dict holding a metadata dict. Common metadata
+fields are attributes, low-cardinality strings (user, domain, content type, method, status) are
+interned so every record shares one copy, routes are one shared tuple per destination set, and
+any other metadata lands in a small extras dict. Long text is held compressed (textcodec) and
+decoded only when read; content_length is stored, so metadata never touches the text. to_dict()
+gives the usual {'id', 'user_id', 'title', 'content', 'metadata'} shape for API responses and exports
+"""
+import sys
+
+import textcodec
+
+INTERNED = frozenset(('domain', 'extraction_method', 'enrichment_status', 'content_type', 'extraction_status'))
+
+_MISSING = object()
+_routes = {}
+
+
+def intern(value):
+    """The shared copy of a low-cardinality string (anything else passes through)"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def shared_routes(routes):
+    """Routes as a tuple of destinations, one tuple object per distinct list"""
+    if routes is None:
+        return None
+    key = tuple(sys.intern(r['destination'] if isinstance(r, dict) else r) for r in routes)
+    return _routes.setdefault(key, key)
+
+
+def compose_page_content(title, url, meta_description, headers, analysis, raw_content):
+    """The combined text stored for a scraped page: title, URL, meta, headers, analysis and the start of the page"""
+    content = f"{title}\n\n"
+    content += f"URL: {url}\n"
+    content += f"Meta: {meta_description}\n\n"
+    if headers:
+        content += f"Headers: {', '.join(headers[:5])}\n\n"
+    content += f"Analysis:\n{analysis}\n\n"
+    content += f"Content:\n{raw_content[:1000]}"
+    return content
+
+
+class _RecordBase:
+    __slots__ = ('id', 'user_id', 'title', 'content_length', 'url', 'domain', 'timestamp', 'extraction_method',
+                 'url_accessed', 'enrichment_status', 'content_type', 'routes', 'extras')
+
+    # Metadata keys held as attributes, in to_dict() order; content_length follows the content
+    META_ATTRIBUTES = ('url', 'domain', 'timestamp', 'extraction_method', 'url_accessed', 'enrichment_status',
+                       'content_type', 'routes')
+    FIELDS = ('id', 'user_id', 'title', 'content')
+    TEXT_FIELDS = ('content',)
+
+    def __init__(self, id, user_id, title, metadata=None):
+        self.id = id
+        self.user_id = intern(user_id)
+        self.title = title
+        self.extras = None
+        if metadata:
+            self.update_metadata(metadata)
+
+    def update_metadata(self, fields):
+        """Set metadata keys (unset ones are left out of the metadata dict entirely)"""
+        for key, value in fields.items():
+            if key == 'content_length':
+                continue
+            if key in self.META_ATTRIBUTES:
+                if key == 'routes':
+                    value = shared_routes(value)
+                elif key in INTERNED:
+                    value = intern(value)
+                setattr(self, key, value)
+            else:
+                if self.extras is None:
+                    self.extras = {}
+                self.extras[key] = value
+
+    def remove_metadata(self, keys):
+        """Unset metadata keys"""
+        for key in keys:
+            if key in self.META_ATTRIBUTES:
+                if hasattr(self, key):
+                    delattr(self, key)
+            elif self.extras:
+                self.extras.pop(key, None)
+
+    def get_meta(self, key, default=None):
+        if key == 'content_length':
+            return self.content_length
+        if key in self.META_ATTRIBUTES:
+            value = getattr(self, key, default)
+            return [{'destination': d} for d in value] if key == 'routes' and value else value
+        return (self.extras or {}).get(key, default)
+
+    @property
+    def metadata(self):
+        """A fresh metadata dict (changes go through update_metadata)"""
+        metadata = {}
+        for key in self.META_ATTRIBUTES:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                metadata[key] = [{'destination': d} for d in value] if key == 'routes' and value is not None else value
+            if key == 'timestamp':
+                metadata['content_length'] = self.content_length
+        if self.extras:
+            metadata.update(self.extras)
+        return metadata
+
+    def to_dict(self, text=True):
+        """text=False leaves out the text fields, so nothing is decompressed"""
+        record = {key: getattr(self, key) for key in self.FIELDS if text or key not in self.TEXT_FIELDS}
+        record['metadata'] = self.metadata
+        return record
+
+    def get(self, key, default=None):
+        """Read-only dict-style access to the to_dict() keys, for code written against plain dicts"""
+        if key == 'metadata':
+            return self.metadata
+        if key in self.FIELDS:
+            return getattr(self, key, default)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.id} {self.title!r}>"
+
+
+class MemoryRecord(_RecordBase):
+    """A memory whose content is a single text (a Gemini digest, a scrape or a feedback note)"""
+    __slots__ = ('_content',)
+
+    def __init__(self, id, user_id, title, content, metadata=None):
+        self.content = content
+        super().__init__(id, user_id, title, metadata)
+
+    @property
+    def content(self):
+        return textcodec.codec.decode(self._content)
+
+    @content.setter
+    def content(self, value):
+        self._content = textcodec.codec.encode(value)
+        self.content_length = len(value)
+
+    def stored_text(self):
+        """(compressed, bytes) as held in memory, for writing to an archive segment without re-encoding"""
+        if isinstance(self._content, bytes):
+            return True, self._content
+        return False, (self._content or '').encode('utf-8')
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data['user_id'], data.get('title') or 'Untitled', data['content'], data.get('metadata'))
+
+
+class ArchivedRecord(_RecordBase):
+    """A read-only memory in an archive segment; its text is a slice of the mapped file, decoded when read"""
+    __slots__ = ('_text', '_compressed')
+
+    def __init__(self, id, user_id, title, metadata, text, compressed):
+        _RecordBase.__init__(self, id, user_id, title)
+        _RecordBase.update_metadata(self, metadata)
+        self.content_length = metadata.get('content_length', len(text))
+        self._text = text
+        self._compressed = compressed
+
+    @property
+    def content(self):
+        return textcodec.codec.decode(self._text) if self._compressed else str(self._text, 'utf-8')
+
+    def stored_text(self):
+        return self._compressed, self._text
+
+    def update_metadata(self, fields):
+        raise TypeError('Archived memories are read-only; change them through MemoryStore.mutable()')
+
+    def remove_metadata(self, keys):
+        raise TypeError('Archived memories are read-only; change them through MemoryStore.mutable()')
+
+    def to_record(self):
+        """A mutable MemoryRecord copy"""
+        return MemoryRecord(self.id, self.user_id, self.title, self.content, self.metadata)
+
+
+class PageRecord(_RecordBase):
+    """A scraped page plus its analysis; the combined content is composed from the parts when read"""
+    __slots__ = ('_analysis', '_raw_content', 'headers', 'meta_description', 'extraction_status', 'ai_error')
+
+    META_ATTRIBUTES = _RecordBase.META_ATTRIBUTES + ('extraction_status', 'meta_description', 'ai_error')
+    FIELDS = _RecordBase.FIELDS + ('analysis', 'raw_content', 'headers')
+    TEXT_FIELDS = ('content', 'analysis', 'raw_content')
+
+    def __init__(self, id, user_id, title, analysis, raw_content, headers=(), metadata=None):
+        self._analysis = textcodec.codec.encode(analysis)
+        self._raw_content = textcodec.codec.encode(raw_content)
+        self.headers = tuple(headers)
+        super().__init__(id, user_id, title, metadata)
+        self.content_length = len(self.content)
+
+    @property
+    def analysis(self):
+        return textcodec.codec.decode(self._analysis)
+
+    @analysis.setter
+    def analysis(self, value):
+        self._analysis = textcodec.codec.encode(value)
+        self.content_length = len(self.content)
+
+    @property
+    def raw_content(self):
+        return textcodec.codec.decode(self._raw_content)
+
+    @property
+    def content(self):
+        return compose_page_content(self.title, getattr(self, 'url', ''), getattr(self, 'meta_description', ''),
+                                    self.headers, self.analysis, self.raw_content)
+
+    def to_dict(self, text=True):
+        record = super().to_dict(text)
+        record['headers'] = list(self.headers)
+        return record
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data['user_id'], data.get('title') or 'Untitled', data.get('analysis', ''),
+                   data.get('raw_content', ''), data.get('headers') or (), data.get('metadata'))
@@ -0,0 +1,188 @@
+"""
+Bulk re-processing of stored memories
+Re-runs the local (no-LLM) stages over the whole archive on a process pool, applies the
+results in batches on the caller's side and tracks progress for polling
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from workers import Worker
+
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+def _run_chunk(stage: Callable[[Dict[str, Any]], Dict[str, Any]],
+               chunk: List[Dict[str, Any]]) -> List[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+    """Worker side: apply the stage to each record, returning (id, updates, error)"""
+    results = []
+    for record in chunk:
+        try:
+            results.append((record['id'], stage(record), None))
+        except Exception as e:
+            results.append((record['id'], None, str(e)))
+    return results
+
+
+def _serve_chunks(conn, stage: Callable[[Dict[str, Any]], Dict[str, Any]]):
+    """Worker process loop: run chunks sent over the connection until it is closed"""
+    while True:
+        try:
+            chunk = conn.recv()
+        except EOFError:
+            return
+        conn.send(_run_chunk(stage, chunk))
+
+
+def _chunks(records: Iterable[Dict[str, Any]], size: int) -> Iterable[List[Dict[str, Any]]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Reprocessor:
+    def __init__(self, stage: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 apply_batch: Callable[[List[Tuple[str, Dict[str, Any]]]], int],
+                 workers: Optional[int] = None, chunk_size: int = 500, batch_size: int = 5000):
+        """stage(record) -> updates runs in worker processes and must be a module-level function in a
+        module that is cheap and side-effect free to import (workers import only that module);
+        apply_batch([(id, updates), ...]) runs in this process and returns how many memories changed"""
+        self.stage = stage
+        self.apply_batch = apply_batch
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+
+        self._job: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def start(self, records: Iterable[Dict[str, Any]], total: int) -> Dict[str, Any]:
+        """Start a background job over the records; only one job runs at a time"""
+        with self._lock:
+            if self._job and self._job['status'] == RUNNING:
+                raise RuntimeError('A reprocessing job is already running')
+            self._job = {
+                'status': RUNNING,
+                'total': total,
+                'processed': 0,
+                'changed': 0,
+                'failed': 0,
+                'errors': [],
+                'started_at': datetime.now().isoformat(),
+                'finished_at': None,
+                '_started': time.monotonic()
+            }
+        threading.Thread(target=self._run, args=(records,), name='reprocess', daemon=True).start()
+        return self.status()
+
+    def run(self, records: Iterable[Dict[str, Any]], total: int) -> Dict[str, Any]:
+        """Run a job in the calling thread (for scripts and the CLI)"""
+        self.start(records, total)
+        while self.status()['status'] == RUNNING:
+            time.sleep(0.2)
+        return self.status()
+
+    def status(self) -> Optional[Dict[str, Any]]:
+        """Progress of the current or last job, with throughput and an ETA"""
+        with self._lock:
+            if self._job is None:
+                return None
+            job = {k: v for k, v in self._job.items() if not k.startswith('_')}
+            job['errors'] = list(job['errors'])
+            elapsed = (self._job.get('_finished') or time.monotonic()) - self._job['_started']
+        job['elapsed_seconds'] = round(elapsed, 2)
+        job['per_second'] = round(job['processed'] / elapsed, 1) if elapsed > 0 else None
+        remaining = job['total'] - job['processed']
+        job['eta_seconds'] = round(remaining / job['per_second'], 1) \
+            if job['status'] == RUNNING and job['per_second'] else None
+        return job
+
+    def _run(self, records: Iterable[Dict[str, Any]]):
+        try:
+            pending: List[Tuple[str, Dict[str, Any]]] = []
+            for results in self._stage_results(records):
+                failed = 0
+                errors = []
+                for memory_id, updates, error in results:
+                    if error is None:
+                        pending.append((memory_id, updates))
+                    else:
+                        failed += 1
+                        errors.append({'id': memory_id, 'error': error})
+                changed = 0
+                if len(pending) >= self.batch_size:
+                    changed = self.apply_batch(pending)
+                    pending = []
+                self._progress(len(results), changed, failed, errors)
+            if pending:
+                self._progress(0, self.apply_batch(pending), 0, [])
+            self._finish(COMPLETED)
+        except Exception as e:
+            print(f"Reprocessing error: {e}")
+            self._finish(FAILED, {'id': None, 'error': str(e)})
+
+    def _stage_results(self, records: Iterable[Dict[str, Any]]):
+        chunks = _chunks(records, self.chunk_size)
+        if self.workers <= 1:
+            for chunk in chunks:
+                yield _run_chunk(self.stage, chunk)
+            return
+
+        # Not fork: the caller is usually a threaded server, and a forked child can inherit locks held by
+        # other threads
+        workers = []
+        try:
+            for _ in range(self.workers):
+                workers.append(Worker(_serve_chunks, self.stage))
+            idle = list(workers)
+            busy = {}
+            # One chunk in flight per worker, so a huge archive is streamed, not copied at once
+            for chunk in chunks:
+                if not idle:
+                    yield self._collect(busy, idle)
+                worker = idle.pop()
+                worker.conn.send(chunk)
+                busy[worker.conn] = worker
+            while busy:
+                yield self._collect(busy, idle)
+        finally:
+            for worker in workers:
+                worker.stop()
+
+    def _collect(self, busy: Dict[Any, Worker],
+                 idle: List[Worker]) -> List[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+        """Results of the next chunk a worker finishes; that worker becomes idle again"""
+        conn = wait(list(busy))[0]
+        worker = busy.pop(conn)
+        try:
+            results = conn.recv()
+        except EOFError:
+            raise RuntimeError('A reprocessing worker exited') from None
+        idle.append(worker)
+        return results
+
+    def _progress(self, processed: int, changed: int, failed: int, errors: List[Dict[str, Any]]):
+        with self._lock:
+            self._job['processed'] += processed
+            self._job['changed'] += changed
+            self._job['failed'] += failed
+            # Keep a sample of errors, not one per failed memory
+            self._job['errors'].extend(errors[:max(0, 20 - len(self._job['errors']))])
+
+    def _finish(self, status: str, error: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self._job['status'] = status
+            self._job['finished_at'] = datetime.now().isoformat()
+            self._job['_finished'] = time.monotonic()
+            if error:
+                self._job['errors'].append(error)
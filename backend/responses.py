@@ -0,0 +1,145 @@
+"""
+API response layer: fast JSON encoding, gzip/brotli negotiation and streamed JSON arrays
+orjson is used when installed (Flask's json module otherwise); compression is applied to
+JSON/text responses above a size threshold, and to streamed responses chunk by chunk
+"""
+import gzip
+import json
+import os
+import zlib
+
+from flask import Response, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+from metrics import stage
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/csv')
+# Items serialized per chunk of a streamed array
+STREAM_BATCH_SIZE = 200
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; falls back to the stdlib encoder when it is missing"""
+
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if self.compact is False or (self.compact is None and self._app.debug):
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            with stage('encode'):
+                return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        with stage('encode'):
+            body = orjson.dumps(obj, default=self.default, option=self._options()) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def dumps_bytes(obj):
+    """Compact JSON bytes for one value (used for streamed items)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=DefaultJSONProvider.default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=DefaultJSONProvider.default, separators=(',', ':')).encode('utf-8')
+
+
+def stream_json_array(items, key, envelope=None, batch_size=STREAM_BATCH_SIZE):
+    """Response for {**envelope, key: [items...]} written incrementally, so the encoded
+    payload never sits in memory as a whole"""
+    head = dumps_bytes(envelope or {})[:-1]
+    head += (b',' if len(head) > 1 else b'') + dumps_bytes(key) + b':['
+
+    def generate():
+        yield head
+        batch = []
+        first = True
+        for item in items:
+            batch.append(dumps_bytes(item))
+            if len(batch) >= batch_size:
+                yield (b'' if first else b',') + b','.join(batch)
+                batch, first = [], False
+        if batch:
+            yield (b'' if first else b',') + b','.join(batch)
+        yield b']}\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def _negotiate_encoding():
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered, default=None)
+
+
+def _compress_stream(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def compress_response(response):
+    """after_request hook: gzip/brotli for JSON and text bodies the client accepts"""
+    if (response.status_code < 200 or response.status_code in (204, 304) or request.method == 'HEAD'
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    if response.is_streamed:
+        encoding = _negotiate_encoding()
+        if encoding:
+            response.response = _compress_stream(response.response, encoding)
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+        return response
+
+    if response.direct_passthrough or (response.content_length or 0) < COMPRESS_MIN_BYTES:
+        return response
+    encoding = _negotiate_encoding()
+    if not encoding:
+        return response
+
+    body = response.get_data()
+    response.set_data(brotli.compress(body, quality=5) if encoding == 'br' else gzip.compress(body, 6, mtime=0))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def install(app):
+    """Use the fast JSON provider and compress responses for an app"""
+    app.json = FastJSONProvider(app)
+    app.after_request(compress_response)
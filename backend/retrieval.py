@@ -0,0 +1,273 @@
+"""
+Hybrid retrieval: BM25 keyword search and vector search run in parallel and are fused
+with reciprocal rank fusion; metadata filters become row masks applied inside both indexes
+"""
+import math
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from vector_index import TOKEN_PATTERN, VectorIndex
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def parse_timestamp(value: Optional[str]) -> float:
+    """ISO timestamp to epoch seconds (NaN when missing or unparseable)"""
+    if not value:
+        return math.nan
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring over matrix rows"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._doc_terms: Dict[int, Counter] = {}
+        self._doc_lengths = np.zeros(1024, dtype=np.float32)
+        self._total_length = 0
+
+    def add(self, row: int, text: str):
+        """Index (or re-index) the text stored at a row"""
+        if row in self._doc_terms:
+            self._remove(row)
+
+        terms = Counter(tokenize(text))
+        self._doc_terms[row] = terms
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[row] = tf
+            self._arrays.pop(term, None)
+
+        if row >= self._doc_lengths.shape[0]:
+            self._doc_lengths = np.resize(self._doc_lengths, max(row + 1, self._doc_lengths.shape[0] * 2))
+        length = sum(terms.values())
+        self._doc_lengths[row] = length
+        self._total_length += length
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Top-k (row, score) pairs, restricted to rows where mask is set"""
+        doc_count = len(self._doc_terms)
+        if doc_count == 0:
+            return []
+
+        avg_length = self._total_length / doc_count
+        scores = np.zeros(self._doc_lengths.shape[0], dtype=np.float32)
+        for term in set(tokenize(query)):
+            postings = self._term_arrays(term)
+            if postings is None:
+                continue
+            rows, tfs = postings
+            idf = math.log(1 + (doc_count - rows.shape[0] + 0.5) / (rows.shape[0] + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[rows] / avg_length)
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        if mask is not None:
+            n = min(scores.shape[0], mask.shape[0])
+            scores[:n] *= mask[:n]
+            scores[n:] = 0
+        hits = np.flatnonzero(scores)
+        if hits.shape[0] == 0:
+            return []
+        k = min(k, hits.shape[0])
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def _term_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        # Postings are converted to arrays once and cached until the term changes
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return None
+            arrays = (np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                      np.fromiter(postings.values(), dtype=np.float32, count=len(postings)))
+            self._arrays[term] = arrays
+        return arrays
+
+    def remap(self, rows: Dict[int, int]):
+        """Move documents to new row numbers (old row -> new row); rows left out are dropped"""
+        doc_terms = {rows[row]: terms for row, terms in self._doc_terms.items() if row in rows}
+        doc_lengths = np.zeros(max(self._doc_lengths.shape[0], max(doc_terms, default=0) + 1), dtype=np.float32)
+        postings: Dict[str, Dict[int, int]] = {}
+        for row, terms in doc_terms.items():
+            for term, tf in terms.items():
+                postings.setdefault(term, {})[row] = tf
+            doc_lengths[row] = sum(terms.values())
+        self._doc_terms = doc_terms
+        self._doc_lengths = doc_lengths
+        self._postings = postings
+        self._arrays = {}
+        self._total_length = int(doc_lengths.sum())
+
+    def _remove(self, row: int):
+        for term in self._doc_terms.pop(row):
+            self._postings[term].pop(row, None)
+            self._arrays.pop(term, None)
+        self._total_length -= int(self._doc_lengths[row])
+        self._doc_lengths[row] = 0
+
+
+class RetrievalEngine:
+    MODES = ('hybrid', 'keyword', 'semantic')
+
+    def __init__(self, vector_index: VectorIndex, rrf_k: int = 60, initial_capacity: int = 1024):
+        self.vectors = vector_index
+        self.bm25 = BM25Index()
+        self.rrf_k = rrf_k
+
+        # Metadata columns aligned with vector index rows, so filters are plain array comparisons
+        self._codes: Dict[str, Dict[str, int]] = {'domain': {}, 'content_type': {}}
+        self._domain = np.full(initial_capacity, -1, dtype=np.int32)
+        self._content_type = np.full(initial_capacity, -1, dtype=np.int32)
+        self._timestamp = np.full(initial_capacity, np.nan, dtype=np.float64)
+        self._indexed = np.zeros(initial_capacity, dtype=bool)
+        self._summaries: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='retrieval')
+
+    def add(self, memory_id: str, text: str, owner: str, metadata: Dict[str, Any]):
+        self.add_many([memory_id], [text], owner, [metadata])
+
+    def retain(self, keep) -> int:
+        """Drop memories that no longer exist from the vector index and move this engine's per-row
+        state (BM25, metadata columns, summaries) to the renumbered rows; returns how many were dropped"""
+        with self._lock:
+            old_ids = list(self.vectors.ids)
+            dropped = self.vectors.retain(keep)
+            if not dropped:
+                return 0
+            rows = {}
+            for row, memory_id in enumerate(old_ids):
+                new_row = self.vectors.row_of(memory_id)
+                if new_row is not None:
+                    rows[row] = new_row
+            self.bm25.remap(rows)
+            capacity = max(self._domain.shape[0], len(self.vectors.ids))
+            old = np.fromiter(rows.keys(), dtype=np.int64, count=len(rows))
+            new = np.fromiter(rows.values(), dtype=np.int64, count=len(rows))
+            # Vector rows past the columns' end were never indexed here
+            tracked = old < self._domain.shape[0]
+            old, new = old[tracked], new[tracked]
+            for name, fill in (('_domain', -1), ('_content_type', -1), ('_timestamp', np.nan), ('_indexed', False)):
+                column = getattr(self, name)
+                moved = np.full(capacity, fill, dtype=column.dtype)
+                moved[new] = column[old]
+                setattr(self, name, moved)
+            self._summaries = {rows[row]: summary for row, summary in self._summaries.items() if row in rows}
+            return dropped
+
+    def add_many(self, ids: Sequence[str], texts: Sequence[str], owner: str, metadatas: Sequence[Dict[str, Any]],
+                 reuse_vectors: bool = False):
+        """Embed in one batch and index text plus filterable metadata for each memory;
+        reuse_vectors keeps a vector already stored for the same owner (e.g. loaded from disk) instead of re-embedding"""
+        embed = list(range(len(ids)))
+        if reuse_vectors:
+            with self._lock:
+                rows = [self.vectors.row_of(memory_id) for memory_id in ids]
+                embed = [i for i, row in enumerate(rows) if row is None or self.vectors.owners[row] != owner]
+        if embed:
+            self.vectors.add_texts([ids[i] for i in embed], [texts[i] for i in embed], owner=owner)
+        with self._lock:
+            for memory_id, text, metadata in zip(ids, texts, metadatas):
+                row = self.vectors.row_of(memory_id)
+                self._ensure_capacity(row + 1)
+                self.bm25.add(row, text)
+                self._indexed[row] = True
+                self._domain[row] = self._code('domain', metadata.get('domain'))
+                self._content_type[row] = self._code('content_type', metadata.get('content_type'))
+                self._timestamp[row] = parse_timestamp(metadata.get('timestamp'))
+                self._summaries[row] = {
+                    'id': memory_id,
+                    'url': metadata.get('url'),
+                    'title': metadata.get('title'),
+                    'domain': metadata.get('domain'),
+                    'content_type': metadata.get('content_type'),
+                    'timestamp': metadata.get('timestamp')
+                }
+
+    def search(self, query: str, owner: Optional[str] = None, k: int = 10, mode: str = 'hybrid',
+               domain: Optional[str] = None, content_type: Optional[str] = None,
+               since: Optional[str] = None, until: Optional[str] = None,
+               exclude_ids: Sequence[str] = ()) -> List[Dict[str, Any]]:
+        """One query plan: filter mask, BM25 and vector top-k in parallel, reciprocal rank fusion"""
+        with self._lock:
+            mask = self._filter_mask(owner, domain, content_type, since, until)
+            for memory_id in exclude_ids:
+                row = self.vectors.row_of(memory_id)
+                if row is not None:
+                    mask[row] = False
+
+        # Each side contributes a deeper candidate list than k so fusion has something to work with
+        depth = max(k * 4, 20)
+        keyword_future = self._executor.submit(self._keyword_search, query, depth, mask) \
+            if mode in ('hybrid', 'keyword') else None
+        vector_future = self._executor.submit(self.vectors.search, query, depth, None, 0.0, mask) \
+            if mode in ('hybrid', 'semantic') else None
+
+        keyword_hits = keyword_future.result() if keyword_future else []
+        vector_hits = [(self.vectors.row_of(memory_id), score) for memory_id, score in vector_future.result()] \
+            if vector_future else []
+
+        fused: Dict[int, Dict[str, Any]] = {}
+        for source, hits in (('keyword', keyword_hits), ('vector', vector_hits)):
+            for rank, (row, raw_score) in enumerate(hits, 1):
+                entry = fused.setdefault(row, {'score': 0.0, 'keyword_rank': None, 'vector_rank': None})
+                entry['score'] += 1.0 / (self.rrf_k + rank)
+                entry[f'{source}_rank'] = rank
+                entry[f'{source}_score'] = raw_score
+
+        ranked = sorted(fused.items(), key=lambda item: item[1]['score'], reverse=True)[:k]
+        with self._lock:
+            return [dict(self._summaries[row], **entry) for row, entry in ranked]
+
+    def _keyword_search(self, query: str, k: int, mask: np.ndarray) -> List[Tuple[int, float]]:
+        with self._lock:
+            return self.bm25.search(query, k, mask)
+
+    def _filter_mask(self, owner, domain, content_type, since, until) -> np.ndarray:
+        # Only rows indexed by this engine are eligible (a reloaded vector file may hold others)
+        mask = self._indexed.copy()
+        if owner is not None:
+            owner_mask = self.vectors.owner_mask(owner)
+            mask[:owner_mask.shape[0]] &= owner_mask
+            mask[owner_mask.shape[0]:] = False
+        if domain is not None:
+            mask &= self._domain == self._codes['domain'].get(domain, -2)
+        if content_type is not None:
+            mask &= self._content_type == self._codes['content_type'].get(content_type, -2)
+        # NaN timestamps compare False, so undated memories drop out of date-range queries
+        if since is not None:
+            mask &= self._timestamp >= parse_timestamp(since)
+        if until is not None:
+            mask &= self._timestamp <= parse_timestamp(until)
+        return mask
+
+    def _code(self, column: str, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        return self._codes[column].setdefault(value, len(self._codes[column]))
+
+    def _ensure_capacity(self, needed: int):
+        capacity = self._domain.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        for name, fill in (('_domain', -1), ('_content_type', -1), ('_timestamp', np.nan), ('_indexed', False)):
+            column = getattr(self, name)
+            grown = np.full(new_capacity, fill, dtype=column.dtype)
+            grown[:capacity] = column
+            setattr(self, name, grown)
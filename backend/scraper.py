@@ -0,0 +1,201 @@
+"""
+Local web scraping shared by the backend apps
+Cheap requests + BeautifulSoup extraction used when Gemini is skipped, unavailable or deferred.
+Fetching stays on the request thread; parsing runs in worker processes so large pages do not hold the GIL
+"""
+import os
+import threading
+
+import requests
+from requests.compat import chardet
+from bs4 import BeautifulSoup
+
+from metadata_extractor import structured_metadata
+from metrics import stage
+from workers import Worker
+
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', '2'))
+PARSE_MAX_PENDING = int(os.getenv('PARSE_MAX_PENDING', str(PARSE_WORKERS)))
+PARSE_TIMEOUT_SECONDS = float(os.getenv('PARSE_TIMEOUT_SECONDS', '10'))
+PARSE_MAX_HTML_BYTES = int(os.getenv('PARSE_MAX_HTML_BYTES', str(5 * 1024 * 1024)))
+# Pages below this size parse faster inline than the round trip to a worker costs
+PARSE_INLINE_BYTES = int(os.getenv('PARSE_INLINE_BYTES', '16384'))
+
+
+class ParserBusyError(Exception):
+    """Raised when the parse queue is full"""
+
+
+class ParseTimeoutError(Exception):
+    """Raised when a page takes longer than the per-task timeout to parse"""
+
+
+def parse_html(html, url):
+    """CPU-bound part of scraping: parse HTML into a compact dict (runs in a worker process)"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Extract title
+    title = soup.title.string if soup.title and soup.title.string else "No title"
+
+    # Extract meta description
+    meta_desc = ""
+    meta_tag = soup.find('meta', attrs={'name': 'description'})
+    if meta_tag:
+        meta_desc = meta_tag.get('content', '')
+
+    # JSON-LD lives in <script> tags, so read it before they are stripped
+    page_metadata = structured_metadata(soup)
+
+    # Extract main text
+    for script in soup(["script", "style"]):
+        script.decompose()
+    text = ' '.join(soup.get_text().split())
+
+    # Extract headers
+    headers_found = []
+    for i in range(1, 4):  # h1, h2, h3
+        headers_found.extend([h.get_text().strip() for h in soup.find_all(f'h{i}')])
+
+    return {
+        'title': str(title),
+        'content': text[:5000],  # Limit content
+        'meta_description': meta_desc,
+        'headers': headers_found[:10],  # First 10 headers
+        'structured_metadata': page_metadata,
+        'url': url,
+        'success': True
+    }
+
+
+def _serve(conn):
+    """Worker process loop: parse pages sent over the pipe until it is closed"""
+    while True:
+        try:
+            html, url = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((parse_html(html, url), None))
+        except Exception as e:
+            conn.send((None, e))
+
+
+class ParsePool:
+    def __init__(self, workers=PARSE_WORKERS, max_pending=PARSE_MAX_PENDING, timeout=PARSE_TIMEOUT_SECONDS,
+                 inline_bytes=PARSE_INLINE_BYTES):
+        """max_pending: scrapes that may wait for a busy worker; more than that are rejected at once"""
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.inline_bytes = inline_bytes
+        # Each worker parses one page at a time, so a stuck parse can be killed on its own. Not forked: workers
+        # are started from a threaded server, and a forked child can inherit locks held by other threads
+        self._idle = []
+        self._started = 0
+        self._waiting = 0
+        self._available = threading.Condition()
+        self.killed = 0
+
+    def parse(self, html, url):
+        """Parse in a worker process; raises ParserBusyError or ParseTimeoutError"""
+        if self.workers <= 0 or len(html) < self.inline_bytes:
+            return parse_html(html, url)
+
+        worker = self._checkout()
+        try:
+            worker.conn.send((html, url))
+            # The timeout covers the parse itself, not the wait for a free worker
+            if not worker.conn.poll(self.timeout):
+                self._recycle(worker, f'a page took longer than {self.timeout}s to parse')
+                worker = None
+                raise ParseTimeoutError(f'Parsing took longer than {self.timeout}s')
+            result, error = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            if worker is not None:
+                self._recycle(worker, 'it exited')
+                worker = None
+            raise RuntimeError('HTML parser worker exited') from e
+        finally:
+            self._checkin(worker)
+        if error is not None:
+            raise error
+        return result
+
+    def _checkout(self):
+        with self._available:
+            if not self._idle and self._started >= self.workers:
+                # Bounded queue depth: shed load instead of piling up pages behind a slow one
+                if self._waiting >= self.max_pending:
+                    raise ParserBusyError('HTML parser queue is full')
+                self._waiting += 1
+                try:
+                    while not self._idle and self._started >= self.workers:
+                        self._available.wait()
+                finally:
+                    self._waiting -= 1
+            if self._idle:
+                return self._idle.pop()
+            self._started += 1
+        try:
+            return Worker(_serve)
+        except Exception:
+            self._checkin(None)
+            raise
+
+    def _checkin(self, worker):
+        """Return a worker to the pool; None frees the slot of one that was stopped"""
+        with self._available:
+            if worker is None:
+                self._started -= 1
+            else:
+                self._idle.append(worker)
+            self._available.notify()
+
+    def _recycle(self, worker, reason):
+        """Kill switch: a running parse cannot be cancelled, so stop its worker; the others keep running"""
+        worker.stop()
+        with self._available:
+            self.killed += 1
+        print(f"HTML parser worker restarted: {reason}")
+
+
+parse_pool = ParsePool()
+
+
+def fetch_html(url):
+    """Download a page, stopping at PARSE_MAX_HTML_BYTES so a huge page cannot exhaust memory"""
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+    }
+    with requests.get(url, headers=headers, timeout=10, stream=True) as response:
+        response.raise_for_status()
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(chunk_size=65536):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= PARSE_MAX_HTML_BYTES:
+                break
+        encoding = response.encoding
+    data = b''.join(chunks)[:PARSE_MAX_HTML_BYTES]
+    if encoding is None:
+        # No charset in the headers: detect it from the bytes already read (the body has been consumed,
+        # so response.apparent_encoding can no longer be used)
+        encoding = chardet.detect(data[:65536])['encoding'] or 'utf-8'
+    return data.decode(encoding, errors='replace')
+
+
+def extract_content_from_url(url):
+    """Simple web scraping as fallback"""
+    try:
+        with stage('fetch'):
+            html = fetch_html(url)
+        with stage('parse'):
+            return parse_pool.parse(html, url)
+    except Exception as e:
+        return {
+            'title': 'Error',
+            'content': str(e),
+            'url': url,
+            'success': False
+        }
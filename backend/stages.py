@@ -0,0 +1,88 @@
+"""
+Local (no-LLM) stages of the digestion app: classification, title and metadata extraction, routing.
+Kept free of app state so reprocessing workers can import them without starting the app
+"""
+from metadata_extractor import extract_metadata
+
+# Metadata the local stages derive; reprocessing replaces all of them, so a field that no longer applies is dropped
+DERIVED_FIELDS = ('content_type', 'routes', 'author', 'publish_date', 'keywords', 'context_type')
+
+
+def detect_content_type(extracted_data, analysis):
+    """Classify content from the analysis text, URL and submission options"""
+    analysis_lower = analysis.lower()
+    content_type = 'general'
+    
+    # Check if it's from feedback/context submission
+    if (extracted_data.get('options') or {}).get('context_type'):
+        content_type = extracted_data['options']['context_type']
+    elif 'loom' in analysis_lower or 'loom.com' in extracted_data['url']:
+        content_type = 'bug_report' if 'bug' in analysis_lower else 'video_feedback'
+    elif 'youtube' in analysis_lower or 'video' in analysis_lower:
+        content_type = 'video'
+    elif 'repository' in analysis_lower or 'github' in analysis_lower:
+        content_type = 'code'
+    elif 'documentation' in analysis_lower or 'docs' in analysis_lower:
+        content_type = 'documentation'
+    elif 'article' in analysis_lower or 'blog' in analysis_lower:
+        content_type = 'article'
+    elif 'product' in analysis_lower or 'service' in analysis_lower:
+        content_type = 'product'
+    return content_type
+
+
+def extract_title(analysis):
+    """Extract title from analysis (first line or first sentence)"""
+    title = "Untitled"
+    lines = analysis.split('\n')
+    for line in lines:
+        if line.strip() and len(line.strip()) > 5:
+            title = line.strip()
+            if title.endswith(':'):
+                title = title[:-1]
+            break
+    return title
+
+
+def determine_routes(content_type):
+    """Map a content type to its destinations"""
+    if content_type == 'bug_report':
+        return [{'destination': 'bug_tracker'}, {'destination': 'development_backlog'}, {'destination': 'knowledge_base'}]
+    elif content_type == 'video_feedback':
+        return [{'destination': 'feedback_library'}, {'destination': 'knowledge_base'}]
+    elif content_type == 'video':
+        return [{'destination': 'video_library'}, {'destination': 'knowledge_base'}]
+    elif content_type == 'code':
+        return [{'destination': 'code_repository'}, {'destination': 'knowledge_base'}]
+    elif content_type == 'documentation':
+        return [{'destination': 'docs_repository'}, {'destination': 'knowledge_base'}]
+    elif content_type == 'article':
+        return [{'destination': 'article_archive'}, {'destination': 'knowledge_base'}]
+    elif content_type == 'product':
+        return [{'destination': 'product_database'}, {'destination': 'knowledge_base'}]
+    return [{'destination': 'knowledge_base'}]
+
+
+def local_stages(extracted_data, content):
+    """Classification, metadata extraction and routing - everything derived without an LLM call.
+    Fields missing from the text are filled from the page's JSON-LD/OpenGraph tags when it was scraped"""
+    content_type = detect_content_type(extracted_data, content)
+    document_metadata = extract_metadata(content, fallback=extracted_data.get('structured_metadata'))
+    document_metadata.pop('title', None)
+    fields = {'content_type': content_type, 'routes': determine_routes(content_type)}
+    fields.update(document_metadata)
+    context_type = (extracted_data.get('options') or {}).get('context_type')
+    if context_type:
+        fields['context_type'] = context_type
+    return fields
+
+
+def reprocess_stage(record):
+    """Re-run the local stages for one memory (runs in a worker process)"""
+    metadata = record['metadata']
+    extracted_data = {'url': metadata.get('url', ''), 'options': {'context_type': metadata.get('context_type')},
+                      'structured_metadata': metadata.get('structured_metadata')}
+    fields = local_stages(extracted_data, record['content'])
+    if metadata.get('extraction_method') == 'gemini_url_digestion':
+        fields['title'] = extract_title(record['content'])
+    return fields
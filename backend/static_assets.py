@@ -0,0 +1,113 @@
+"""
+Prebuilt static responses for the UI
+Pages and bundle files are encoded once (identity, gzip and, when the brotli module is installed, br)
+and served with an ETag and Cache-Control, so a page load costs a header check instead of a
+template render. nginx serves the same bundle (frontend/build.py) directly in production
+"""
+import functools
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import Response, request
+
+import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# HTML must revalidate so a new deploy is picked up; hashed assets never change under the same name
+PAGE_CACHE_CONTROL = 'no-cache'
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class StaticAsset:
+    def __init__(self, body, mimetype, cache_control=PAGE_CACHE_CONTROL, encodings=None):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(body).hexdigest()[:20]
+        self.encodings = {'identity': body}
+        self.encodings.update(encodings or {})
+        if 'gzip' not in self.encodings:
+            self.encodings['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+        if 'br' not in self.encodings and brotli is not None:
+            self.encodings['br'] = brotli.compress(body)
+
+    @classmethod
+    def from_text(cls, text, mimetype='text/html', cache_control=PAGE_CACHE_CONTROL):
+        return cls(text.encode('utf-8'), mimetype, cache_control)
+
+    @classmethod
+    def from_file(cls, path, cache_control=ASSET_CACHE_CONTROL):
+        """Load a file plus the .gz/.br variants the bundle build wrote next to it"""
+        with open(path, 'rb') as f:
+            body = f.read()
+        encodings = {}
+        for encoding, suffix in (('gzip', '.gz'), ('br', '.br')):
+            if os.path.exists(path + suffix):
+                with open(path + suffix, 'rb') as f:
+                    encodings[encoding] = f.read()
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        return cls(body, mimetype, cache_control, encodings)
+
+    def response(self):
+        """304 when the client's copy is current, otherwise the best encoding it accepts"""
+        headers = {'ETag': f'"{self.etag}"', 'Cache-Control': self.cache_control, 'Vary': 'Accept-Encoding'}
+        if request.if_none_match.contains(self.etag):
+            metrics.cache_hit('static')
+            return Response(status=304, headers=headers)
+        metrics.cache_miss('static')
+
+        encoding = request.accept_encodings.best_match(
+            [e for e in ('br', 'gzip') if e in self.encodings], default='identity'
+        )
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(self.encodings[encoding], mimetype=self.mimetype, headers=headers)
+
+
+def static_page(view=None, override=None):
+    """Render a view's HTML once and serve it as a StaticAsset from then on;
+    override (e.g. a prebuilt bundle's index page) is served instead when given"""
+    def decorate(view):
+        lock = threading.Lock()
+        built = []
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if override is not None:
+                return override.response()
+            if not built:
+                with lock:
+                    if not built:
+                        built.append(StaticAsset.from_text(view(*args, **kwargs)))
+            return built[0].response()
+        return wrapper
+    return decorate(view) if view is not None else decorate
+
+
+def register_bundle(app, directory):
+    """Serve a prebuilt frontend bundle's hashed files under /assets/ and return its index page
+    (None when no bundle has been built)"""
+    index_path = os.path.join(directory, 'index.html') if directory else None
+    if not index_path or not os.path.exists(index_path):
+        return None
+
+    assets_dir = os.path.join(directory, 'assets')
+    cache = {}
+
+    @app.route('/assets/<path:filename>')
+    def bundle_asset(filename):
+        asset = cache.get(filename)
+        if asset is None:
+            path = os.path.realpath(os.path.join(assets_dir, filename))
+            if not path.startswith(os.path.realpath(assets_dir) + os.sep) or not os.path.isfile(path):
+                return Response(status=404)
+            asset = cache[filename] = StaticAsset.from_file(path)
+        return asset.response()
+
+    return StaticAsset.from_file(index_path, cache_control=PAGE_CACHE_CONTROL)
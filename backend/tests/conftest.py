@@ -0,0 +1,46 @@
+"""
+Shared test helpers. Backend modules are flat, so the backend directory goes on sys.path;
+app-level tests run each phase in a fresh interpreter, the way a restarted server would see it
+"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+
+def app_environment(**env):
+    """The environment for running an app in a new process: local embeddings and no files written outside the
+    test's directory; env values override the app's configuration variables"""
+    environment = {key: value for key, value in os.environ.items() if not key.startswith(('WAL_', 'ARCHIVE_'))}
+    environment.update({
+        'PYTHONPATH': BACKEND,
+        'EMBEDDING_BACKEND': 'hashing',
+        'VECTOR_INDEX_DIR': '',
+        'USAGE_PATH': '',
+        'ANALYTICS_DIR': ''
+    })
+    environment.update({key: str(value) for key, value in env.items()})
+    return environment
+
+
+@pytest.fixture
+def run_script(tmp_path):
+    """run_script(code, **env) runs code in a new interpreter from the backend directory and returns the
+    JSON printed on its last line; env values override the app's configuration variables.
+    as_script=True runs it from a file, as `python main.py` would, instead of with -c"""
+    def run(code, as_script=False, **env):
+        command = [sys.executable, '-c', textwrap.dedent(code)]
+        if as_script:
+            tmp_path.joinpath('main.py').write_text(textwrap.dedent(code))
+            command = [sys.executable, 'main.py']
+        result = subprocess.run(command, cwd=str(tmp_path), env=app_environment(**env), capture_output=True, text=True,
+                                timeout=120)
+        assert result.returncode == 0, result.stderr
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    return run
@@ -0,0 +1,84 @@
+import io
+
+import pytest
+
+import archive
+from archive import ArchiveError, export_chunks, iter_batches, iter_records
+
+
+def memories(count):
+    return [{'id': f'm{i}', 'user_id': 'u1', 'title': f'Note {i}', 'content': f'text {i} ' * 20,
+             'metadata': {'url': f'https://example.com/{i}'}} for i in range(count)]
+
+
+@pytest.mark.parametrize('compression', [None, 'zstd'])
+def test_an_export_reads_back_in_order_across_chunk_boundaries(monkeypatch, compression):
+    monkeypatch.setattr(archive, 'CHUNK_SIZE', 100)
+    exported = memories(50)
+    body = b''.join(export_chunks(iter(exported), compression))
+    assert body.startswith(archive.ZSTD_MAGIC) == (compression == 'zstd')
+    assert [record for _, record in iter_records(io.BytesIO(body))] == exported
+    if compression is None:
+        assert len(list(export_chunks(iter(exported)))) > 1
+
+
+def test_records_are_validated_with_their_line_numbers():
+    body = b'{"user_id": "u1", "content": "a"}\n\n{"content": "b"}\n'
+    with pytest.raises(ArchiveError, match='Line 2: no user_id'):
+        list(iter_records(io.BytesIO(body)))
+    assert [r['user_id'] for _, r in iter_records(io.BytesIO(body), default_user_id='u9')] == ['u9', 'u9']
+    for line, error in ((b'{"user_id": "u1"', 'invalid JSON'), (b'[1]', 'needs a "content" string'),
+                        (b'{"user_id": "u1", "content": "a", "metadata": "x"}', 'must be an object')):
+        with pytest.raises(ArchiveError, match=error):
+            list(iter_records(io.BytesIO(line)))
+    with pytest.raises(ArchiveError, match='Unsupported compression'):
+        export_chunks([], 'gzip')
+
+
+def test_a_bad_record_stops_the_import_before_its_batch_is_yielded():
+    body = b''.join(archive.dumps_bytes(m) + b'\n' for m in memories(3)) + b'not json\n'
+    batches = iter_batches(iter_records(io.BytesIO(body)), batch_size=2)
+    assert [m['id'] for m in next(batches)] == ['m0', 'm1']
+    with pytest.raises(ArchiveError, match='Line 4'):
+        next(batches)
+
+
+def test_export_and_import_move_an_archive_between_apps(run_script):
+    body = run_script('''
+        import json
+        import app_url_digestion as app
+        from records import MemoryRecord
+        for i in range(5):
+            app.store_memory(MemoryRecord(f'm{i}', 'u1', f'Note {i}', f'glacier field notes {i}', {
+                'timestamp': '2030-01-01T00:00:00', 'url': f'https://example.com/{i}'}))
+        app.store_memory(MemoryRecord('other', 'u2', 'Other', 'not exported', {}))
+        response = app.app.test_client().get('/api/export?user_id=u1&compression=zstd')
+        print(json.dumps({'archive': response.get_data().hex()}))
+    ''')['archive']
+
+    result = run_script(f'''
+        import functools
+        import json
+        import archive
+        import app_url_digestion as app
+        app.iter_batches = functools.partial(archive.iter_batches, batch_size=2)
+        client = app.app.test_client()
+        body = bytes.fromhex({body!r})
+        first = client.post('/api/import?user_id=u3', data=body).get_json()
+        again = client.post('/api/import?user_id=u3', data=body).get_json()
+        lines = [b'{{"content": "new one"}}', b'{{"content": "new two"}}', b'{{"content": "new three"}}', b'oops']
+        broken = client.post('/api/import?user_id=u3', data=b'\\n'.join(lines)).get_json()
+        search = client.post('/api/search', json={{'query': 'glacier', 'user_id': 'u3', 'mode': 'keyword'}}).get_json()
+        print(json.dumps({{
+            'first': first, 'again': again, 'broken': broken,
+            'contents': sorted(m.content for m in app.memories.for_user('u3')),
+            'found': len(search['results'])
+        }}))
+    ''')
+    assert (result['first']['imported'], result['first']['batches']) == (5, 3)
+    assert (result['again']['imported'], result['again']['skipped_duplicates']) == (0, 5)
+    assert result['broken']['status'] == 'error'
+    assert 'Line 4' in result['broken']['error']
+    assert result['broken']['imported'] == 2
+    assert result['contents'] == sorted([f'glacier field notes {i}' for i in range(5)] + ['new one', 'new two'])
+    assert result['found'] == 5
@@ -0,0 +1,80 @@
+from archive import content_hash
+from memory_store import MemoryStore
+from records import ArchivedRecord, MemoryRecord
+
+
+def memory(memory_id, content, user_id='u1', timestamp='2020-01-01T00:00:00', **metadata):
+    return MemoryRecord(memory_id, user_id, memory_id.upper(), content, dict(metadata, timestamp=timestamp))
+
+
+def test_compaction_moves_old_memories_into_a_segment_that_reopens(tmp_path):
+    store = MemoryStore(str(tmp_path))
+    store.extend([memory('a', 'alpha text', domain='a.example'), memory('b', 'beta text', user_id='u2'),
+                  memory('new', 'fresh text', timestamp='2999-01-01T00:00:00')])
+    assert store.compact() == 2
+    assert store.stats()['recent'] == 1
+
+    store = MemoryStore(str(tmp_path))
+    a = store.get('a')
+    assert isinstance(a, ArchivedRecord)
+    assert (a.title, a.content, a.get_meta('domain')) == ('A', 'alpha text', 'a.example')
+    assert [m.id for m in store.for_user('u2')] == ['b']
+    assert store.content_id('u1', content_hash('alpha text')) == 'a'
+    assert store.get('new') is None
+    assert len(store) == 2
+
+
+def test_a_changed_archived_memory_shadows_its_archived_copy(tmp_path):
+    store = MemoryStore(str(tmp_path))
+    store.extend([memory('a', 'alpha text'), memory('b', 'beta text')])
+    store.compact()
+    a = store.mutable('a')
+    a.update_metadata({'author': 'Ada'})
+    store.persist([a])
+    assert [m.id for m in store] == ['b', 'a']
+    assert len(store) == 2
+
+    store.compact()
+    store = MemoryStore(str(tmp_path), max_segments=1)
+    assert store.get('a').get_meta('author') == 'Ada'
+    assert sorted(m.id for m in store) == ['a', 'b']
+    store.compact()
+    assert store.stats()['segments'] == 1
+    assert store.get('a').get_meta('author') == 'Ada'
+    assert len(store) == 2
+
+
+def test_archived_memories_are_searchable_after_a_restart(tmp_path, run_script):
+    env = {'ARCHIVE_DIR': tmp_path / 'archive', 'ARCHIVE_AFTER_DAYS': 1, 'VECTOR_INDEX_DIR': tmp_path / 'vectors'}
+    run_script('''
+        import json
+        import app_url_digestion as app
+        from records import MemoryRecord
+        for memory_id, content in (('a', 'alpha about volcanoes'), ('b', 'beta about glaciers')):
+            app.store_memory(MemoryRecord(memory_id, 'u1', memory_id, content, {
+                'timestamp': '2020-01-01T00:00:00', 'domain': memory_id + '.example'}))
+        print(json.dumps({'archived': app.memories.compact()}))
+    ''', **env)
+
+    found = run_script('''
+        import json
+        import app_url_digestion as app
+        embedded = []
+        embed = app.retrieval.vectors.embedder.embed
+        app.retrieval.vectors.embedder.embed = lambda texts: embedded.extend(texts) or embed(texts)
+        client = app.app.test_client()
+        found = {}
+        for mode in ('keyword', 'semantic', 'hybrid'):
+            response = client.post('/api/search', json={'query': 'glaciers', 'user_id': 'u1', 'mode': mode})
+            found[mode] = [hit['id'] for hit in response.get_json()['results']]
+        response = client.post('/api/search', json={'query': 'volcanoes', 'user_id': 'u1', 'domain': 'a.example'})
+        found['domain'] = [hit['id'] for hit in response.get_json()['results']]
+        found['embedded'] = [text for text in embedded if text != 'glaciers' and text != 'volcanoes']
+        print(json.dumps(found))
+    ''', **env)
+    assert found['keyword'] == ['b']
+    assert found['semantic'][0] == 'b'
+    assert found['hybrid'][0] == 'b'
+    assert found['domain'] == ['a']
+    # The persisted vectors were reused, not embedded again
+    assert found['embedded'] == []
@@ -0,0 +1,59 @@
+import pytest
+
+from records import ArchivedRecord, MemoryRecord, PageRecord
+
+
+def test_a_record_round_trips_through_the_api_shape():
+    data = {'id': 'm1', 'user_id': 'u1', 'title': 'Pooling', 'content': 'Why connection pooling matters',
+            'metadata': {'url': 'https://example.com/a', 'domain': 'example.com', 'timestamp': '2030-01-01T00:00:00',
+                         'content_type': 'article', 'routes': [{'destination': 'reading'}], 'author': 'Ada'}}
+    record = MemoryRecord.from_dict(data)
+    assert record.to_dict() == dict(data, metadata={
+        'url': 'https://example.com/a', 'domain': 'example.com', 'timestamp': '2030-01-01T00:00:00',
+        'content_length': 30, 'content_type': 'article', 'routes': [{'destination': 'reading'}], 'author': 'Ada'})
+    assert record.to_dict(text=False) == {key: value for key, value in record.to_dict().items() if key != 'content'}
+    assert record['title'] == 'Pooling'
+    assert record.get('metadata')['author'] == 'Ada'
+    with pytest.raises(KeyError):
+        record['analysis']
+
+
+def test_metadata_changes_keep_unset_keys_out():
+    record = MemoryRecord('m1', 'u1', 'T', 'text', {'content_type': 'article'})
+    record.update_metadata({'author': 'Ada', 'content_length': 99})
+    record.remove_metadata(['content_type', 'author', 'missing'])
+    assert record.metadata == {'content_length': 4}
+    assert record.get_meta('content_type', 'general') == 'general'
+
+
+def test_low_cardinality_values_and_routes_are_shared_between_records():
+    first = MemoryRecord('m1', ''.join(['u', '1']), 'T', 'a', {
+        'domain': ''.join(['example', '.com']), 'routes': [{'destination': 'reading'}, {'destination': 'code'}]})
+    second = MemoryRecord('m2', 'u1', 'T', 'b', {'domain': 'example.com', 'routes': ['reading', 'code']})
+    assert first.user_id is second.user_id
+    assert first.domain is second.domain
+    assert first.routes is second.routes
+
+
+def test_a_page_record_composes_its_content_from_the_parts_it_stores():
+    page = PageRecord('p1', 'u1', 'Pooling', 'The analysis', 'Raw page text', ['Intro', 'Setup'],
+                      {'url': 'https://example.com/a', 'meta_description': 'About pools'})
+    assert 'Analysis:\nThe analysis' in page.content
+    assert 'Content:\nRaw page text' in page.content
+    assert page.content_length == len(page.content)
+    data = page.to_dict()
+    assert (data['analysis'], data['raw_content'], data['headers']) == ('The analysis', 'Raw page text',
+                                                                       ['Intro', 'Setup'])
+    assert PageRecord.from_dict(data).content == page.content
+    page.analysis = 'Longer analysis'
+    assert page.content_length == len(page.content)
+
+
+def test_archived_records_are_read_only_views():
+    archived = ArchivedRecord('m1', 'u1', 'T', {'content_type': 'article', 'content_length': 5}, b'hello', False)
+    assert archived.content == 'hello'
+    with pytest.raises(TypeError):
+        archived.update_metadata({'author': 'Ada'})
+    record = archived.to_record()
+    record.update_metadata({'author': 'Ada'})
+    assert (record.content, record.get_meta('content_type'), record.get_meta('author')) == ('hello', 'article', 'Ada')
@@ -0,0 +1,26 @@
+def test_reprocessing_from_the_app_script_runs_workers_without_importing_it(run_script):
+    result = run_script('''
+        import json
+        # Runs once per interpreter that imports this script, as __main__ or as a worker's __mp_main__
+        with open('imports.log', 'a') as f:
+            f.write(__name__ + '\\n')
+
+        import app_url_digestion as app
+        from records import MemoryRecord
+
+        if __name__ == '__main__':
+            for i in range(5):
+                app.store_memory(MemoryRecord(f'm{i}', 'u1', f'Note {i}', f'Step 1: install the tool. Step 2: run it {i}',
+                                              {'timestamp': '2030-01-01T00:00:00', 'url': f'https://example.com/{i}'}))
+            app.reprocessor.chunk_size = 2
+            job = app.reprocessor.run(app.reprocess_records(), len(app.memories))
+            with open('imports.log') as f:
+                imports = f.read().split()
+            print(json.dumps({'job': job, 'imports': imports,
+                              'content_type': app.memories.get('m0').get_meta('content_type')}))
+    ''', as_script=True, REPROCESS_WORKERS=2)
+    assert result['imports'] == ['__main__']
+    assert result['job']['status'] == 'completed'
+    assert result['job']['processed'] == 5
+    assert result['job']['failed'] == 0
+    assert result['content_type'] is not None
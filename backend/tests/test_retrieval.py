@@ -0,0 +1,28 @@
+from retrieval import RetrievalEngine
+from vector_index import HashingEmbedder, VectorIndex
+
+
+def engine_with(memories, directory=None):
+    engine = RetrievalEngine(VectorIndex(HashingEmbedder(), directory=directory))
+    for memory_id, text, metadata in memories:
+        engine.add(memory_id, text, 'u1', metadata)
+    return engine
+
+
+def ids(hits):
+    return [hit['id'] for hit in hits]
+
+
+def test_retain_moves_keyword_and_metadata_state_with_the_renumbered_rows():
+    engine = engine_with([
+        ('gone', 'obsolete quartz notes', {'domain': 'old.example'}),
+        ('a', 'alpha about volcanoes', {'domain': 'a.example'}),
+        ('b', 'beta about glaciers', {'domain': 'b.example', 'content_type': 'article'})
+    ])
+    assert engine.retain(lambda memory_id: memory_id != 'gone') == 1
+
+    assert ids(engine.search('glaciers', owner='u1', mode='keyword')) == ['b']
+    assert ids(engine.search('glaciers', owner='u1', mode='semantic'))[0] == 'b'
+    assert ids(engine.search('volcanoes', owner='u1', domain='a.example')) == ['a']
+    assert ids(engine.search('glaciers', owner='u1', content_type='article')) == ['b']
+    assert 'gone' not in ids(engine.search('quartz', owner='u1'))
@@ -0,0 +1,19 @@
+def test_parse_workers_do_not_import_the_main_script(run_script):
+    result = run_script('''
+        import json
+        import os
+        # Runs once per interpreter that imports this script, as __main__ or as a worker's __mp_main__
+        with open('imports.log', 'a') as f:
+            f.write(__name__ + '\\n')
+
+        if __name__ == '__main__':
+            import scraper
+            pool = scraper.ParsePool(workers=1, inline_bytes=0)
+            page = '<html><head><title>Glaciers</title></head><body><h1>Ice</h1><p>Slow rivers</p></body></html>'
+            parsed = pool.parse(page, 'https://example.com/ice')
+            with open('imports.log') as f:
+                imports = f.read().split()
+            print(json.dumps({'title': parsed['title'], 'headers': parsed['headers'], 'imports': imports}))
+    ''', as_script=True)
+    assert result == {'title': 'Glaciers', 'headers': ['Ice'], 'imports': ['__main__']}
+
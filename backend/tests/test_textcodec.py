@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+import textcodec
+from records import MemoryRecord
+from textcodec import TextCodec
+
+WORDS = ('pool', 'connection', 'latency', 'request', 'worker', 'cache', 'index', 'query', 'shard', 'replica')
+
+
+def digest(seed):
+    rng = random.Random(seed)
+    body = ' '.join(rng.choice(WORDS) for _ in range(120))
+    return f"## Summary\nThis article explains {body}.\n\n## Key points\n- {rng.choice(WORDS)} matters\n"
+
+
+def test_long_text_is_compressed_and_short_text_left_alone():
+    codec = TextCodec(min_bytes=64)
+    assert codec.encode('short') == 'short'
+    text = digest(1) * 3
+    blob = codec.encode(text)
+    assert isinstance(blob, bytes) and len(blob) < len(text)
+    assert codec.decode(blob) == text
+    assert codec.decode(memoryview(blob)) == text
+    assert codec.stats()['ratio'] > 1
+
+
+def test_a_trained_dictionary_is_saved_and_old_frames_still_decode(tmp_path):
+    path = str(tmp_path / 'digests.dict')
+    codec = TextCodec(dictionary_path=path, train_samples=200, dictionary_size=4096)
+    before = codec.encode(digest(0))
+    for seed in range(1, 200):
+        codec.encode(digest(seed))
+    assert codec.stats()['dictionary_id']
+    after = codec.encode(digest(500))
+
+    reopened = TextCodec(dictionary_path=path)
+    assert reopened.decode(before) == digest(0)
+    assert reopened.decode(after) == digest(500)
+    with pytest.raises(ValueError):
+        TextCodec().decode(after)
+    other = TextCodec()
+    other.add_dictionary(codec.dictionary_data(codec.stats()['dictionary_id']))
+    assert other.decode(after) == digest(500)
+
+
+def test_records_hold_text_compressed_and_decode_it_only_when_read(monkeypatch):
+    codec = TextCodec(min_bytes=64)
+    monkeypatch.setattr(textcodec, 'codec', codec)
+    text = digest(7)
+    record = MemoryRecord('m1', 'u1', 'T', text)
+    compressed, stored = record.stored_text()
+    assert compressed and len(stored) < len(text)
+
+    decoded = []
+    decode = codec.decode
+    monkeypatch.setattr(codec, 'decode', lambda value: decoded.append(value) or decode(value))
+    assert record.to_dict(text=False)['metadata']['content_length'] == len(text)
+    assert decoded == []
+    assert record.content == text
+    assert len(decoded) == 1
@@ -0,0 +1,144 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+import tracing
+from conftest import BACKEND
+
+
+@pytest.fixture(scope='module')
+def exporter():
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    return exporter
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def otlp_sink(tmp_path):
+    """otlp_sink.py on a free port; yields (endpoint, read) where read() returns the spans it received"""
+    port = free_port()
+    output = tmp_path / 'spans.jsonl'
+    process = subprocess.Popen([sys.executable, os.path.join(BACKEND, 'otlp_sink.py'), '--port', str(port),
+                                '--output', str(output)], stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            assert time.monotonic() < deadline, 'OTLP sink did not start'
+            time.sleep(0.05)
+    yield f'http://127.0.0.1:{port}', lambda: [json.loads(line) for line in output.read_text().splitlines()]
+    process.terminate()
+    process.wait()
+
+
+def step(i):
+    with tracing.span(f'step {i}'):
+        return i
+
+
+def test_work_handed_to_other_threads_joins_the_submitting_span(exporter):
+    exporter.clear()
+    with tracing.span('request') as parent:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            assert list(executor.map(tracing.wrap(step), range(2))) == [0, 1]
+        captured = tracing.capture()
+    with tracing.resume(captured), tracing.span('background', {'skipped': None}):
+        tracing.record_usage(SimpleNamespace(usage_metadata=SimpleNamespace(
+            prompt_token_count=100, candidates_token_count=20, thoughts_token_count=5,
+            cached_content_token_count=60)))
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    request_id = parent.get_span_context().span_id
+    assert spans['background'].parent.span_id == request_id
+    assert dict(spans['background'].attributes) == {
+        'gen_ai.usage.input_tokens': 100, 'gen_ai.usage.output_tokens': 25, 'gen_ai.usage.cached_tokens': 60
+    }
+    assert spans['step 0'].parent.span_id == request_id
+    assert spans['step 1'].parent.span_id == request_id
+
+
+def test_requests_export_linked_spans_with_domain_model_token_and_cache_attributes(otlp_sink, run_script):
+    endpoint, received = otlp_sink
+    result = run_script('''
+        import json
+        import os
+        from fake_gemini import FakeGemini
+        gemini = FakeGemini(latency_ms=0).serve(0)
+        gemini_url = 'http://127.0.0.1:%d' % gemini.server_address[1]
+        os.environ['GEMINI_BASE_URL'] = gemini_url
+
+        import app_url_digestion as app
+        from opentelemetry import trace
+        client = app.app.test_client()
+        caller = '00-' + '1' * 32 + '-' + '2' * 16 + '-01'
+        client.post('/api/digest', json={'url': 'https://example.com/article.html', 'user_id': 'u1'},
+                    headers={'traceparent': caller})
+        ingest = client.post('/api/ingest', json={'user_id': 'u1', 'urls': [
+            gemini_url + '/pages/news.html', gemini_url + '/pages/docs.html']}).get_json()
+        enrichment = [client.get('/api/enrichment/%s?wait=30' % r['memory_id']).get_json()['enrichment']['status']
+                      for r in ingest['results']]
+        etag = client.get('/').headers['ETag']
+        client.get('/', headers={'If-None-Match': etag})
+        trace.get_tracer_provider().force_flush()
+        print(json.dumps({'enrichment': enrichment}))
+    ''', OTEL_EXPORTER_OTLP_ENDPOINT=endpoint, OTEL_SERVICE_NAME='website-eater-test', GOOGLE_API_KEY='test',
+        ENRICHMENT_REQUESTS_PER_MINUTE=6000, PARSE_INLINE_BYTES=0)
+    assert result['enrichment'] == ['enriched', 'enriched']
+
+    spans = received()
+    assert {span['service'] for span in spans} == {'website-eater-test'}
+    by_id = {span['span_id']: span for span in spans}
+
+    def named(name):
+        return [span for span in spans if span['name'] == name]
+
+    def parent_of(span):
+        return by_id[span['parent_id']]
+
+    # The server span continues the caller's trace; the Gemini call is a child of it
+    digest, = named('POST /api/digest')
+    assert (digest['trace_id'], digest['parent_id']) == ('1' * 32, '2' * 16)
+    assert digest['attributes']['url.domain'] == 'example.com'
+    assert digest['attributes']['gen_ai.request.model']
+    assert digest['attributes']['http.response.status_code'] == 200
+    llm = [span for span in named('llm') if span['trace_id'] == digest['trace_id']]
+    assert [span['parent_id'] for span in llm] == [digest['span_id']]
+    assert llm[0]['attributes']['gen_ai.request.model'] == digest['attributes']['gen_ai.request.model']
+    assert llm[0]['attributes']['gen_ai.usage.input_tokens'] == 412
+    assert llm[0]['attributes']['gen_ai.usage.output_tokens'] == 318
+    assert llm[0]['attributes']['gen_ai.usage.cached_tokens'] == 0
+
+    # Fetches run on executor threads and enrichment on the queue's worker, all under the ingest request
+    ingest, = named('POST /api/ingest')
+    for name in ('fetch', 'parse', 'enrichment'):
+        assert [parent_of(span)['span_id'] for span in named(name)] == [ingest['span_id']] * 2
+    for span in named('enrichment'):
+        assert span['trace_id'] == ingest['trace_id']
+        assert span['attributes']['enrichment.attempt'] == 1
+        assert [child['name'] for child in spans if child['parent_id'] == span['span_id']].count('llm') == 1
+
+    pages = sorted(named('GET /'), key=lambda span: span['attributes']['cache.hit'])
+    assert [(span['attributes']['cache.name'], span['attributes']['cache.hit']) for span in pages] == \
+        [('static', False), ('static', True)]
+    assert [span['attributes']['http.response.status_code'] for span in pages] == [200, 304]
@@ -0,0 +1,151 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+from conftest import BACKEND, app_environment
+from memory_store import MemoryStore
+from records import MemoryRecord
+from wal import FRAME, WALError, WriteAheadLog
+
+
+def memory(memory_id, content, user_id='u1', **metadata):
+    metadata.setdefault('timestamp', '2030-01-01T00:00:00')
+    return MemoryRecord(memory_id, user_id, memory_id.upper(), content, metadata)
+
+
+def test_replay_returns_entries_in_order_and_cuts_a_torn_tail(tmp_path):
+    log = WriteAheadLog(str(tmp_path))
+    log.append([{'n': 1}, {'n': 2}])
+    log.append([{'n': 3}])
+    path = os.path.join(str(tmp_path), 'wal-0000000001.log')
+    with open(path, 'ab') as f:
+        f.write(FRAME.pack(100, 0) + b'{"n": 4')
+    assert [entry['n'] for entry in log.replay()] == [1, 2, 3]
+    assert [entry['n'] for entry in log.replay()] == [1, 2, 3]
+    assert log.stats()['records'] == 3
+
+
+def test_one_process_owns_the_log(tmp_path):
+    log = WriteAheadLog(str(tmp_path))
+    log.open()
+    started = time.monotonic()
+    with pytest.raises(WALError):
+        WriteAheadLog(str(tmp_path)).open()
+    assert time.monotonic() - started < 1
+    log.close()
+    WriteAheadLog(str(tmp_path)).open()
+
+
+def test_store_recovers_writes_and_changes_from_the_log(tmp_path):
+    store = MemoryStore(wal=WriteAheadLog(str(tmp_path)))
+    store.extend([memory('a', 'alpha text'), memory('b', 'beta text')])
+    b = store.mutable('b')
+    b.update_metadata({'author': 'Ada'})
+    store.persist([b])
+    store.wal.close()
+
+    recovered = []
+    store = MemoryStore(wal=WriteAheadLog(str(tmp_path)), on_recover=recovered.extend)
+    assert len(store) == 2
+    assert sorted(m.id for m in recovered) == ['a', 'b']
+    assert store.get('b').get_meta('author') == 'Ada'
+    assert store.get('a').content == 'alpha text'
+
+
+def test_checkpoint_replaces_the_log_files_it_covers(tmp_path):
+    store = MemoryStore(wal=WriteAheadLog(str(tmp_path)))
+    store.extend([memory('a', 'alpha text')])
+    store.checkpoint()
+    store.extend([memory('b', 'beta text')])
+    assert store.wal.segments() == [2]
+    store.wal.close()
+
+    store = MemoryStore(wal=WriteAheadLog(str(tmp_path)))
+    assert sorted(m.id for m in store) == ['a', 'b']
+
+
+def test_recovered_memories_are_searchable_after_a_restart(tmp_path, run_script):
+    env = {'WAL_DIR': tmp_path / 'wal', 'VECTOR_INDEX_DIR': tmp_path / 'vectors'}
+    run_script('''
+        import json
+        import app_url_digestion as app
+        from records import MemoryRecord
+        app.memories.recover()
+        # A vector row whose memory was never logged: the next recovery drops it, renumbering the rows after it
+        app.index_memories([MemoryRecord('gone', 'u1', 'Gone', 'obsolete quartz notes', {})])
+        for memory_id, content in (('a', 'alpha about volcanoes'), ('b', 'beta about glaciers')):
+            app.store_memory(MemoryRecord(memory_id, 'u1', memory_id, content, {'timestamp': '2030-01-01T00:00:00'}))
+        print(json.dumps({'stored': len(app.memories)}))
+    ''', **env)
+
+    found = run_script('''
+        import json
+        import app_url_digestion as app
+        client = app.app.test_client()
+        found = {}
+        for mode in ('keyword', 'semantic', 'hybrid'):
+            response = client.post('/api/search', json={'query': 'glaciers', 'user_id': 'u1', 'mode': mode})
+            found[mode] = [hit['id'] for hit in response.get_json()['results']]
+        print(json.dumps(found))
+    ''', **env)
+    assert found['keyword'] == ['b']
+    assert found['semantic'][0] == 'b'
+    assert found['hybrid'][0] == 'b'
+    assert 'gone' not in found['semantic']
+
+
+def gunicorn(tmp_path, **env):
+    port = socket.socket()
+    port.bind(('127.0.0.1', 0))
+    env.setdefault('PORT', port.getsockname()[1])
+    port.close()
+    command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BACKEND, 'gunicorn.conf.py')]
+    return subprocess.Popen(command, cwd=str(tmp_path), env=app_environment(**env), stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True), env['PORT']
+
+
+def test_gunicorn_refuses_more_than_one_worker_on_a_log(tmp_path):
+    process, _ = gunicorn(tmp_path, WAL_DIR=tmp_path / 'wal', WEB_CONCURRENCY=2)
+    _, stderr = process.communicate(timeout=60)
+    assert process.returncode != 0
+    assert 'WEB_CONCURRENCY=1' in stderr
+
+
+def test_a_worker_that_cannot_take_the_log_stops_gunicorn_at_boot(tmp_path):
+    log = WriteAheadLog(str(tmp_path / 'wal'))
+    log.open()
+    process, _ = gunicorn(tmp_path, WAL_DIR=tmp_path / 'wal', WAL_LOCK_TIMEOUT_SECONDS=0.5)
+    _, stderr = process.communicate(timeout=60)
+    log.close()
+    assert process.returncode == 3
+    assert 'Cannot take over the write-ahead log' in stderr
+
+
+def test_a_gunicorn_worker_recovers_the_log_as_it_boots(tmp_path):
+    store = MemoryStore(wal=WriteAheadLog(str(tmp_path / 'wal')))
+    store.extend([memory('a', 'alpha text')])
+    store.wal.close()
+
+    process, port = gunicorn(tmp_path, WAL_DIR=tmp_path / 'wal')
+    try:
+        # The worker owns the log before it has served anything
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                WriteAheadLog(str(tmp_path / 'wal')).open()
+            except WALError:
+                break
+            assert process.poll() is None and time.monotonic() < deadline, 'the worker never took the log'
+            time.sleep(0.1)
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/memories/u1', timeout=30) as response:
+            listed = json.load(response)['memories']
+        assert [m['content'] for m in listed] == ['alpha text']
+    finally:
+        process.terminate()
+        process.communicate(timeout=60)
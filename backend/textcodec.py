@@ -0,0 +1,128 @@
+"""
+Compressed storage for long memory text
+Analysis and page text are held as zstd frames and decoded only when something reads them.
+Digests repeat a lot of boilerplate, so a dictionary trained on the first stored texts (or
+loaded from a file) shrinks them further; each frame records its dictionary ID, so text stored
+before a dictionary existed still decodes. Without the zstandard package text stays plain
+"""
+import os
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class TextCodec:
+    def __init__(self, level=3, min_bytes=256, dictionary_path=None, train_samples=0, dictionary_size=64 * 1024):
+        """train_samples: train a dictionary from this many stored texts (0 = never); it is saved to dictionary_path"""
+        self.level = level
+        self.min_bytes = min_bytes
+        self.dictionary_path = dictionary_path
+        self.train_samples = train_samples
+        self.dictionary_size = dictionary_size
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+        self._dictionaries = {}
+        self._active = None
+        self._samples = []
+        self._lock = threading.Lock()
+        # zstd (de)compressor objects must not be shared between threads
+        self._local = threading.local()
+        if zstandard is not None and dictionary_path and os.path.exists(dictionary_path):
+            with open(dictionary_path, 'rb') as f:
+                self._use(zstandard.ZstdCompressionDict(f.read()))
+
+    def encode(self, text):
+        """bytes (a zstd frame) for long text, the str itself for short or incompressible text"""
+        if zstandard is None or not text:
+            return text
+        data = text.encode('utf-8')
+        if len(data) < self.min_bytes:
+            return text
+        if self.train_samples and self._active is None:
+            self._collect(data)
+        blob = self._coder('compressor', self._active.dict_id() if self._active else 0).compress(data)
+        if len(blob) >= len(data):
+            return text
+        self.raw_bytes += len(data)
+        self.stored_bytes += len(blob)
+        return blob
+
+    def decode(self, value):
+        """Text back from encode(); also takes a zstd frame as any bytes-like object (e.g. an mmap slice)"""
+        if value is None or isinstance(value, str):
+            return value
+        dict_id = zstandard.get_frame_parameters(value).dict_id
+        return self._coder('decompressor', dict_id).decompress(value).decode('utf-8')
+
+    def stats(self):
+        return {
+            'compression': 'zstd' if zstandard is not None else None,
+            'dictionary_id': self._active.dict_id() if self._active else None,
+            'raw_bytes': self.raw_bytes,
+            'stored_bytes': self.stored_bytes,
+            'ratio': round(self.raw_bytes / self.stored_bytes, 2) if self.stored_bytes else None
+        }
+
+    def dictionary_data(self, dict_id):
+        """The raw bytes of a known dictionary, for saving next to data compressed with it"""
+        return self._dictionaries[dict_id].as_bytes()
+
+    def add_dictionary(self, data):
+        """Make a saved dictionary available for decoding (new text keeps using the active one)"""
+        dictionary = zstandard.ZstdCompressionDict(data)
+        self._dictionaries.setdefault(dictionary.dict_id(), dictionary)
+        return dictionary.dict_id()
+
+    def _coder(self, kind, dict_id):
+        coders = self._local.__dict__
+        coder = coders.get((kind, dict_id))
+        if coder is None:
+            if dict_id and dict_id not in self._dictionaries:
+                raise ValueError(f'Text was compressed with unknown zstd dictionary {dict_id}')
+            dictionary = self._dictionaries.get(dict_id)
+            if kind == 'compressor':
+                coder = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+            else:
+                coder = zstandard.ZstdDecompressor(dict_data=dictionary)
+            coders[(kind, dict_id)] = coder
+        return coder
+
+    def _use(self, dictionary):
+        self._dictionaries[dictionary.dict_id()] = dictionary
+        self._active = dictionary
+
+    def _collect(self, data):
+        with self._lock:
+            if self._active is not None or not self.train_samples:
+                return
+            self._samples.append(data)
+            if len(self._samples) < self.train_samples:
+                return
+            samples, self._samples = self._samples, []
+            try:
+                dictionary = zstandard.train_dictionary(self.dictionary_size, samples, level=self.level)
+            except zstandard.ZstdError as e:
+                print(f"zstd dictionary training failed, compressing without one: {e}")
+                self.train_samples = 0
+                return
+            if self.dictionary_path:
+                tmp_path = self.dictionary_path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(dictionary.as_bytes())
+                os.replace(tmp_path, self.dictionary_path)
+            self._use(dictionary)
+            print(f"Trained zstd dictionary {dictionary.dict_id()} from {len(samples)} texts")
+
+
+# Shared by every record in the process; apps replace it with configure() from their Config
+codec = TextCodec()
+
+
+def configure(**options):
+    global codec
+    codec = TextCodec(**options)
+    return codec
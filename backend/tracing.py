@@ -0,0 +1,158 @@
+"""
+Distributed tracing with OpenTelemetry
+Each API request gets a server span continued from the caller's traceparent header (nginx passes
+it through); metrics stages, Gemini calls, mem0 calls and background enrichment become child spans.
+Spans are exported over OTLP when OTEL_EXPORTER_OTLP_ENDPOINT is set - without it, or without the
+opentelemetry packages, every helper here is a no-op
+"""
+import functools
+import os
+from contextlib import contextmanager
+
+from flask import g, request
+
+from usage import token_counts
+
+try:
+    from opentelemetry import context as otel_context, propagate, trace
+    from opentelemetry.trace import SpanKind
+except ImportError:
+    trace = None
+
+_configured = False
+
+
+def configure(service_name):
+    """Install the tracer provider once per process; OTEL_TRACES_EXPORTER=console prints spans instead"""
+    global _configured
+    if trace is None or _configured:
+        return
+    _configured = True
+
+    exporter_name = os.getenv('OTEL_TRACES_EXPORTER') or (
+        'otlp' if os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT') or os.getenv('OTEL_EXPORTER_OTLP_TRACES_ENDPOINT') else 'none'
+    )
+    if exporter_name == 'none':
+        return
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+        if exporter_name == 'console':
+            exporter = ConsoleSpanExporter()
+        else:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            exporter = OTLPSpanExporter()
+    except ImportError as e:
+        print(f"Tracing disabled: {e}")
+        return
+
+    # BatchSpanProcessor restarts its export thread after fork, so gunicorn's preload is safe
+    provider = TracerProvider(resource=Resource.create({
+        'service.name': os.getenv('OTEL_SERVICE_NAME', 'website-eater'),
+        'website_eater.app': service_name
+    }))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+
+def _tracer():
+    return trace.get_tracer('website_eater')
+
+
+def _clean(attributes):
+    return {key: value for key, value in (attributes or {}).items() if value is not None}
+
+
+@contextmanager
+def span(name, attributes=None):
+    """Child span of the current context; exceptions are recorded on it"""
+    if trace is None:
+        yield None
+        return
+    with _tracer().start_as_current_span(name, attributes=_clean(attributes)) as current:
+        yield current
+
+
+def set_attributes(attributes):
+    """Add attributes to the current span"""
+    if trace is not None:
+        trace.get_current_span().set_attributes(_clean(attributes))
+
+
+def record_usage(response):
+    """Token counts from a Gemini response's usage_metadata, on the current span"""
+    tokens = token_counts(response)
+    if tokens:
+        set_attributes({
+            'gen_ai.usage.input_tokens': tokens['prompt_tokens'],
+            'gen_ai.usage.output_tokens': tokens['output_tokens'],
+            'gen_ai.usage.cached_tokens': tokens['cached_tokens']
+        })
+
+
+def capture():
+    """The current trace context, to hand to work that runs on another thread"""
+    return otel_context.get_current() if trace is not None else None
+
+
+@contextmanager
+def resume(captured):
+    """Run a block under a context from capture() so its spans join the submitting trace"""
+    if trace is None or captured is None:
+        yield
+        return
+    token = otel_context.attach(captured)
+    try:
+        yield
+    finally:
+        otel_context.detach(token)
+
+
+def wrap(fn):
+    """Bind fn to the current trace context (for executor.map/submit)"""
+    captured = capture()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with resume(captured):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def _start_request():
+    route = request.url_rule.rule if request.url_rule else request.path
+    server_span = _tracer().start_span(
+        f"{request.method} {route}",
+        context=propagate.extract(request.headers),
+        kind=SpanKind.SERVER,
+        attributes={'http.request.method': request.method, 'http.route': route, 'url.path': request.path}
+    )
+    g.trace_span = server_span
+    g.trace_token = otel_context.attach(trace.set_span_in_context(server_span))
+
+
+def _record_status(response):
+    if 'trace_span' in g:
+        g.trace_span.set_attribute('http.response.status_code', response.status_code)
+    return response
+
+
+def _end_request(exc):
+    if 'trace_span' not in g:
+        return
+    if exc is not None:
+        g.trace_span.record_exception(exc)
+    g.trace_span.end()
+    otel_context.detach(g.pop('trace_token'))
+    g.pop('trace_span')
+
+
+def install(app):
+    """Open a server span per request (a no-op without opentelemetry)"""
+    if trace is None:
+        return
+    configure(app.import_name)
+    app.before_request(_start_request)
+    app.after_request(_record_status)
+    app.teardown_request(_end_request)
@@ -0,0 +1,222 @@
+"""
+Token and cost accounting for LLM calls
+Each call's prompt, output and cached token counts and latency are folded into per-day
+aggregates keyed by user, model and content type (a few numbers per key, not a call log),
+persisted as JSON when a path is configured. Per-user budgets are checked before a call
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# USD per million tokens: (input, output, cached input); matched by model-name prefix, longest first
+MODEL_PRICES = {
+    'gemini-2.5-pro': (1.25, 10.00, 0.31),
+    'gemini-2.5-flash-lite': (0.10, 0.40, 0.025),
+    'gemini-2.5-flash': (0.30, 2.50, 0.075),
+    'gemini-2.0-flash-lite': (0.075, 0.30, 0.01875),
+    'gemini-2.0-flash': (0.10, 0.40, 0.025),
+    'gemini-1.5-pro': (1.25, 5.00, 0.3125),
+    'gemini-1.5-flash': (0.075, 0.30, 0.01875)
+}
+FIELDS = ('calls', 'errors', 'prompt_tokens', 'output_tokens', 'cached_tokens', 'latency_seconds', 'cost_usd')
+DIMENSIONS = ('day', 'user_id', 'model', 'content_type')
+
+
+class BudgetExceededError(Exception):
+    """Raised before an LLM call that would take a user over their budget"""
+
+
+def token_counts(response):
+    """Token counts from a Gemini response's usage_metadata (thinking tokens count as output)"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return None
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_token_count', None) or 0,
+        'output_tokens': (getattr(usage, 'candidates_token_count', None) or 0) + (getattr(usage, 'thoughts_token_count', None) or 0),
+        'cached_tokens': getattr(usage, 'cached_content_token_count', None) or 0
+    }
+
+
+def estimate_tokens(text):
+    """Rough prompt size before the call (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+class UsageLedger:
+    def __init__(self, path=None, prices=None, default_budget=None, flush_seconds=10):
+        """path: JSON file for aggregates and budgets; default_budget: {'daily_tokens', 'monthly_cost_usd'}"""
+        self.path = path
+        self.prices = sorted((prices or MODEL_PRICES).items(), key=lambda item: -len(item[0]))
+        self.default_budget = {key: value for key, value in (default_budget or {}).items() if value}
+        self.flush_seconds = flush_seconds
+
+        self._rows = {}
+        self._budgets = {}
+        # Running totals the budget check reads without scanning rows
+        self._daily_tokens = {}
+        self._monthly_cost = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._worker = None
+        if path and os.path.exists(path):
+            self._load()
+        if path:
+            atexit.register(self.flush)
+
+    def price(self, model):
+        for prefix, price in self.prices:
+            if (model or '').startswith(prefix):
+                return price
+        return None
+
+    def cost(self, model, tokens):
+        price = self.price(model)
+        if price is None or not tokens:
+            return 0.0
+        uncached = max(0, tokens['prompt_tokens'] - tokens['cached_tokens'])
+        return (uncached * price[0] + tokens['output_tokens'] * price[1] + tokens['cached_tokens'] * price[2]) / 1e6
+
+    def record(self, user_id, model, content_type, tokens, latency_seconds, error=False):
+        """Fold one call into the aggregates; tokens is token_counts() output or None"""
+        now = datetime.now()
+        day, month = now.strftime('%Y-%m-%d'), now.strftime('%Y-%m')
+        tokens = tokens or {'prompt_tokens': 0, 'output_tokens': 0, 'cached_tokens': 0}
+        cost = self.cost(model, tokens)
+        key = (day, user_id, model, content_type or 'unknown')
+
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                row = self._rows[key] = [0, 0, 0, 0, 0, 0.0, 0.0]
+            row[0] += 1
+            row[1] += 1 if error else 0
+            row[2] += tokens['prompt_tokens']
+            row[3] += tokens['output_tokens']
+            row[4] += tokens['cached_tokens']
+            row[5] += latency_seconds
+            row[6] += cost
+            self._daily_tokens[(user_id, day)] = (self._daily_tokens.get((user_id, day), 0)
+                                                  + tokens['prompt_tokens'] + tokens['output_tokens'])
+            self._monthly_cost[(user_id, month)] = self._monthly_cost.get((user_id, month), 0.0) + cost
+            self._dirty = True
+        if self.path:
+            self._ensure_worker()
+
+    def budget(self, user_id):
+        with self._lock:
+            return dict(self.default_budget, **self._budgets.get(user_id, {}))
+
+    def set_budget(self, user_id, daily_tokens=None, monthly_cost_usd=None):
+        """Set a user's caps; 0 removes a cap, None leaves it unchanged"""
+        with self._lock:
+            budget = self._budgets.setdefault(user_id, {})
+            for name, value in (('daily_tokens', daily_tokens), ('monthly_cost_usd', monthly_cost_usd)):
+                if value is not None:
+                    budget[name] = value
+            self._dirty = True
+        if self.path:
+            self._ensure_worker()
+        return self.budget_status(user_id)
+
+    def budget_status(self, user_id):
+        """Caps and what the user has spent against them"""
+        now = datetime.now()
+        budget = self.budget(user_id)
+        with self._lock:
+            used_tokens = self._daily_tokens.get((user_id, now.strftime('%Y-%m-%d')), 0)
+            used_cost = self._monthly_cost.get((user_id, now.strftime('%Y-%m')), 0.0)
+        return {
+            'user_id': user_id,
+            'daily_tokens': budget.get('daily_tokens') or None,
+            'monthly_cost_usd': budget.get('monthly_cost_usd') or None,
+            'tokens_today': used_tokens,
+            'cost_this_month_usd': round(used_cost, 6)
+        }
+
+    def check_budget(self, user_id, estimated_tokens=0):
+        """Raise BudgetExceededError if a call of about estimated_tokens would exceed the user's caps"""
+        status = self.budget_status(user_id)
+        if status['daily_tokens'] and status['tokens_today'] + estimated_tokens > status['daily_tokens']:
+            raise BudgetExceededError(
+                f"Daily token budget reached for {user_id} ({status['tokens_today']}/{status['daily_tokens']})"
+            )
+        if status['monthly_cost_usd'] and status['cost_this_month_usd'] >= status['monthly_cost_usd']:
+            raise BudgetExceededError(
+                f"Monthly budget reached for {user_id} (${status['cost_this_month_usd']:.2f}/${status['monthly_cost_usd']:.2f})"
+            )
+
+    def summary(self, group_by=('user_id', 'model', 'content_type'), since=None, until=None, **filters):
+        """Aggregates grouped by any of day, user_id, model, content_type; since/until are YYYY-MM-DD"""
+        for key in list(group_by) + list(filters):
+            if key not in DIMENSIONS:
+                raise ValueError(f'Unknown usage dimension: {key}')
+        positions = [DIMENSIONS.index(key) for key in group_by]
+        groups = {}
+        with self._lock:
+            for key, row in self._rows.items():
+                if (since and key[0] < since) or (until and key[0] > until):
+                    continue
+                if any(value is not None and key[DIMENSIONS.index(name)] != value for name, value in filters.items()):
+                    continue
+                group_key = tuple(key[i] for i in positions)
+                total = groups.get(group_key)
+                if total is None:
+                    groups[group_key] = list(row)
+                else:
+                    for i, value in enumerate(row):
+                        total[i] += value
+
+        results = []
+        for group_key, total in groups.items():
+            result = dict(zip(group_by, group_key))
+            result.update(zip(FIELDS, total))
+            result['cost_usd'] = round(result['cost_usd'], 6)
+            result['avg_latency_seconds'] = round(result['latency_seconds'] / result['calls'], 3) if result['calls'] else None
+            result['latency_seconds'] = round(result['latency_seconds'], 3)
+            results.append(result)
+        results.sort(key=lambda r: r['cost_usd'], reverse=True)
+        return results
+
+    def flush(self):
+        """Write aggregates and budgets to path atomically"""
+        with self._lock:
+            if not self._dirty:
+                return
+            state = {
+                'rows': [list(key) + row for key, row in self._rows.items()],
+                'budgets': self._budgets
+            }
+            self._dirty = False
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        with open(self.path) as f:
+            state = json.load(f)
+        self._budgets = state.get('budgets', {})
+        for entry in state.get('rows', []):
+            key, row = tuple(entry[:4]), entry[4:]
+            self._rows[key] = row
+            day, user_id = key[0], key[1]
+            self._daily_tokens[(user_id, day)] = self._daily_tokens.get((user_id, day), 0) + row[2] + row[3]
+            self._monthly_cost[(user_id, day[:7])] = self._monthly_cost.get((user_id, day[:7]), 0.0) + row[6]
+
+    def _ensure_worker(self):
+        # Started lazily so it runs in the serving process, not a pre-fork master
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='usage-flush', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Usage ledger flush error: {e}")
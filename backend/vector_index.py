@@ -0,0 +1,342 @@
+"""
+In-process semantic search over stored memories
+Embeddings live in one contiguous float32 matrix (memory-mapped when a directory is configured)
+and are searched with vectorized cosine top-k; an IVF index takes over for large corpora
+"""
+import json
+import os
+import re
+import threading
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so dot products are cosine similarities"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class HashingEmbedder:
+    """Local embedder: signed feature hashing of unigrams and bigrams, no model or service needed"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                h = zlib.crc32(feature.encode())
+                rows.append(row)
+                cols.append(h % self.dim)
+                signs.append(1.0 if h & 0x80000000 else -1.0)
+
+        # One bincount for the whole batch instead of a Python loop per document
+        flat = np.asarray(rows, dtype=np.int64) * self.dim + np.asarray(cols, dtype=np.int64)
+        counts = np.bincount(flat, weights=np.asarray(signs), minlength=len(texts) * self.dim)
+        matrix = counts.reshape(len(texts), self.dim)
+        # Sublinear term frequency keeps long pages from being dominated by repeated words
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        return normalize_rows(matrix)
+
+
+class GeminiEmbedder:
+    """Embeds through the Gemini embedding endpoint in batches"""
+
+    def __init__(self, genai_client, model: str = 'text-embedding-004', dim: int = 768, batch_size: int = 100):
+        self.genai_client = genai_client
+        self.model = model
+        self.dim = dim
+        self.batch_size = batch_size
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            response = self.genai_client.models.embed_content(
+                model=self.model,
+                contents=list(texts[start:start + self.batch_size])
+            )
+            vectors.extend(embedding.values for embedding in response.embeddings)
+        return normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim))
+
+
+class IVFIndex:
+    """Inverted-file index: spherical k-means lists, search probes only the closest lists"""
+
+    def __init__(self, matrix: np.ndarray, nprobe: int = 8, iterations: int = 10, seed: int = 0):
+        count = matrix.shape[0]
+        self.trained_count = count
+        self.nlist = max(1, int(np.sqrt(count)))
+        self.nprobe = min(nprobe, self.nlist)
+
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(count, size=min(count, self.nlist * 64), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=self.nlist, replace=False)]
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            empty = np.bincount(assignments, minlength=self.nlist) == 0
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums)
+        self.centroids = centroids
+
+        assignments = np.concatenate([
+            np.argmax(matrix[start:start + 65536] @ centroids.T, axis=1)
+            for start in range(0, count, 65536)
+        ])
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.searchsorted(assignments[order], np.arange(self.nlist + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(self.nlist)]
+
+    def assign(self, rows: np.ndarray, vectors: np.ndarray):
+        """Append newly added rows to their nearest lists without retraining"""
+        assignments = np.argmax(vectors @ self.centroids.T, axis=1)
+        for list_id in np.unique(assignments):
+            self.lists[list_id] = np.concatenate([self.lists[list_id], rows[assignments == list_id]])
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        """Row indices in the nprobe lists closest to the query"""
+        probe = np.argpartition(-(self.centroids @ query), self.nprobe - 1)[:self.nprobe]
+        return np.concatenate([self.lists[i] for i in probe])
+
+
+class VectorIndex:
+    def __init__(self, embedder, directory: Optional[str] = None, ivf_threshold: int = 50000,
+                 initial_capacity: int = 1024, batch_size: int = 64):
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.directory = directory
+        self.ivf_threshold = ivf_threshold
+        self.initial_capacity = initial_capacity
+        self.batch_size = batch_size
+
+        self.ids: List[str] = []
+        self.owners: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._owner_codes: Dict[str, int] = {}
+        self._owner_array = np.zeros(initial_capacity, dtype=np.int32)
+        self._ivf: Optional[IVFIndex] = None
+        self._lock = threading.RLock()
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load(initial_capacity)
+        else:
+            self._matrix = np.zeros((initial_capacity, self.dim), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add_texts(self, ids: Sequence[str], texts: Sequence[str], owner: str):
+        """Embed texts in batches and insert (or replace) their vectors"""
+        for start in range(0, len(ids), self.batch_size):
+            batch_ids = ids[start:start + self.batch_size]
+            vectors = self.embedder.embed(texts[start:start + self.batch_size])
+            self.add(batch_ids, vectors, owner)
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray, owner: str):
+        with self._lock:
+            owner_code = self._owner_codes.setdefault(owner, len(self._owner_codes))
+            new_rows = []
+            new_row_indices = []
+            for memory_id, vector in zip(ids, vectors):
+                row = self._row_of.get(memory_id)
+                if row is None:
+                    row = len(self.ids)
+                    self._ensure_capacity(row + 1)
+                    self._row_of[memory_id] = row
+                    self.ids.append(memory_id)
+                    self.owners.append(owner)
+                    new_rows.append({'id': memory_id, 'owner': owner})
+                    new_row_indices.append(row)
+                elif self.owners[row] != owner:
+                    # Upsert: a later line for the same id replaces the owner when the file is loaded
+                    self.owners[row] = owner
+                    new_rows.append({'id': memory_id, 'owner': owner})
+                self._matrix[row] = vector
+                self._owner_array[row] = owner_code
+
+            if self.directory:
+                self._matrix.flush()
+                with open(os.path.join(self.directory, 'rows.jsonl'), 'a') as f:
+                    f.writelines(json.dumps(r) + '\n' for r in new_rows)
+
+            # Retrain once the corpus has doubled since the last IVF build
+            count = len(self.ids)
+            if count >= self.ivf_threshold and (self._ivf is None or count >= 2 * self._ivf.trained_count):
+                self._ivf = IVFIndex(self._matrix[:count])
+            elif self._ivf is not None and new_row_indices:
+                rows = np.asarray(new_row_indices)
+                self._ivf.assign(rows, self._matrix[rows])
+
+    def retain(self, keep: Callable[[str], bool]) -> int:
+        """Drop rows whose memory no longer exists (rows persisted by an earlier run can outlive
+        in-process memories); remaining rows are renumbered, so call this before indexing anything else.
+        Returns how many rows were dropped"""
+        with self._lock:
+            kept = [row for row, memory_id in enumerate(self.ids) if keep(memory_id)]
+            dropped = len(self.ids) - len(kept)
+            if not dropped:
+                return 0
+            vectors = np.array(self._matrix[kept], dtype=np.float32)
+            ids = [self.ids[row] for row in kept]
+            owners = [self.owners[row] for row in kept]
+            capacity = max(self.initial_capacity, len(ids))
+
+            if self.directory:
+                self._matrix.flush()
+                del self._matrix
+                # Rewrite both files; vectors first, as the row list is what _load trusts
+                vectors_path = os.path.join(self.directory, 'vectors.f32')
+                with open(vectors_path + '.tmp', 'wb') as f:
+                    f.write(vectors.tobytes())
+                    f.truncate(capacity * self.dim * 4)
+                os.replace(vectors_path + '.tmp', vectors_path)
+                rows_path = os.path.join(self.directory, 'rows.jsonl')
+                with open(rows_path + '.tmp', 'w') as f:
+                    f.writelines(json.dumps({'id': i, 'owner': o}) + '\n' for i, o in zip(ids, owners))
+                os.replace(rows_path + '.tmp', rows_path)
+                self._open_matrix(capacity)
+            else:
+                self._matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+                self._matrix[:len(ids)] = vectors
+
+            self.ids, self.owners = ids, owners
+            self._row_of = {memory_id: row for row, memory_id in enumerate(ids)}
+            self._owner_codes = {}
+            self._owner_array = np.zeros(capacity, dtype=np.int32)
+            for row, owner in enumerate(owners):
+                self._owner_array[row] = self._owner_codes.setdefault(owner, len(self._owner_codes))
+            self._ivf = IVFIndex(self._matrix[:len(ids)]) if len(ids) >= self.ivf_threshold else None
+            return dropped
+
+    def row_of(self, memory_id: str) -> Optional[int]:
+        """Matrix row holding a memory's vector"""
+        return self._row_of.get(memory_id)
+
+    def owner_mask(self, owner: str) -> np.ndarray:
+        """Boolean mask over rows belonging to one owner"""
+        with self._lock:
+            count = len(self.ids)
+            owner_code = self._owner_codes.get(owner)
+            if owner_code is None:
+                return np.zeros(count, dtype=bool)
+            return self._owner_array[:count] == owner_code
+
+    def search(self, query: str, k: int = 10, owner: Optional[str] = None,
+               min_score: float = 0.0, mask: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Cosine top-k for a text query, optionally restricted to one owner's memories
+        and to rows where the boolean mask (indexed by row) is set"""
+        query_vector = self.embedder.embed([query])[0]
+        with self._lock:
+            count = len(self.ids)
+            if count == 0:
+                return []
+
+            rows = None
+            if mask is not None:
+                padded = np.zeros(count, dtype=bool)
+                n = min(count, mask.shape[0])
+                padded[:n] = mask[:n]
+                mask = padded
+            if owner is not None:
+                owner_code = self._owner_codes.get(owner)
+                if owner_code is None:
+                    return []
+                owner_mask = self._owner_array[:count] == owner_code
+                mask = owner_mask if mask is None else mask & owner_mask
+            if mask is not None:
+                rows = np.flatnonzero(mask)
+
+            # Probe the IVF lists only when the filtered set is still large; small sets are scanned exactly
+            if self._ivf is not None and (rows is None or rows.shape[0] >= self.ivf_threshold):
+                candidates = self._ivf.candidates(query_vector)
+                rows = candidates if rows is None else candidates[mask[candidates]]
+
+            matrix = self._matrix[:count] if rows is None else self._matrix[rows]
+            scores = matrix @ query_vector
+            k = min(k, scores.shape[0])
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            row_ids = top if rows is None else rows[top]
+            return [(self.ids[r], float(scores[i])) for r, i in zip(row_ids, top) if scores[i] > min_score]
+
+    def score(self, query: str, ids: Sequence[str]) -> Dict[str, float]:
+        """Cosine similarity of the query against specific memories"""
+        query_vector = self.embedder.embed([query])[0]
+        with self._lock:
+            known = [memory_id for memory_id in ids if memory_id in self._row_of]
+            if not known:
+                return {}
+            rows = np.fromiter((self._row_of[memory_id] for memory_id in known), dtype=np.int64, count=len(known))
+            scores = self._matrix[rows] @ query_vector
+            return dict(zip(known, scores.tolist()))
+
+    def _ensure_capacity(self, needed: int):
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        self._owner_array = np.resize(self._owner_array, new_capacity)
+        if self.directory:
+            self._matrix.flush()
+            del self._matrix
+            self._open_matrix(new_capacity)
+        else:
+            grown = np.zeros((new_capacity, self.dim), dtype=np.float32)
+            grown[:capacity] = self._matrix
+            self._matrix = grown
+
+    def _open_matrix(self, capacity: int):
+        path = os.path.join(self.directory, 'vectors.f32')
+        size = capacity * self.dim * 4
+        with open(path, 'ab') as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._matrix = np.memmap(path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+
+    def _load(self, initial_capacity: int):
+        rows_path = os.path.join(self.directory, 'rows.jsonl')
+        if os.path.exists(rows_path):
+            with open(rows_path) as f:
+                for line in f:
+                    row = json.loads(line)
+                    existing = self._row_of.get(row['id'])
+                    if existing is not None:
+                        # Owner changed by a later add()
+                        self.owners[existing] = row['owner']
+                        continue
+                    self._row_of[row['id']] = len(self.ids)
+                    self.ids.append(row['id'])
+                    self.owners.append(row['owner'])
+
+        capacity = max(initial_capacity, len(self.ids))
+        self._open_matrix(capacity)
+        self._owner_array = np.zeros(capacity, dtype=np.int32)
+        for row, owner in enumerate(self.owners):
+            self._owner_array[row] = self._owner_codes.setdefault(owner, len(self._owner_codes))
+        if len(self.ids) >= self.ivf_threshold:
+            self._ivf = IVFIndex(self._matrix[:len(self.ids)])
+
+
+def create_embedder(backend: str, genai_client=None, model: str = 'text-embedding-004'):
+    """Pick the embedder named by the EMBEDDING_BACKEND setting"""
+    if backend == 'gemini':
+        return GeminiEmbedder(genai_client, model=model)
+    return HashingEmbedder()
+
+
+def memory_text(memory: Dict[str, Any]) -> str:
+    """Text that represents a memory for embedding"""
+    return f"{memory.get('title', '')}\n{memory.get('content', '')[:2000]}"
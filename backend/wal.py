@@ -0,0 +1,236 @@
+"""
+Write-ahead log for memory writes, with group commit
+Writers append their records and wait until the log is on disk; whichever writer finds no flush in
+progress writes everything queued so far with a single fsync, so concurrent writes (and every record
+of a bulk batch) share one. Records are length- and CRC-framed JSON; replay stops at a torn tail.
+The log is split into numbered files so a checkpoint can drop the ones it has made redundant.
+Nothing is opened until first use, so a pre-fork master never owns the log; each process that uses it
+takes the lock itself
+"""
+import fcntl
+import glob
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+from responses import dumps_bytes
+
+FRAME = struct.Struct('<II')  # payload length, CRC-32 of the payload
+
+
+class WALError(Exception):
+    """Raised when the log can no longer be written (after a failed fsync nothing is known to be durable)"""
+
+
+def fsync_directory(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadLog:
+    def __init__(self, directory, commit_delay_ms=0.0, lock_timeout_seconds=0.0):
+        """commit_delay_ms: how long a flushing writer waits for others to join its fsync;
+        lock_timeout_seconds: how long open() waits for another owner to exit (0 fails at once; a gunicorn worker
+        replacing another raises lock_timeout while it boots)"""
+        self.directory = directory
+        self.commit_delay = commit_delay_ms / 1000
+        self.lock_timeout = lock_timeout_seconds
+        self.commits = 0
+        self.records = 0
+        self._pid = None
+        self._open_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+
+    def open(self):
+        """Take ownership of the log in this process; a no-op once done (called by every method that needs it)"""
+        if self._pid == os.getpid():
+            return
+        with self._open_lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            # One process owns the log; a second app instance on the same directory would interleave writes.
+            # A lock file description inherited over fork would be shared with the parent, so open a new one
+            owner = open(os.path.join(self.directory, '.lock'), 'a')
+            deadline = time.monotonic() + self.lock_timeout
+            while True:
+                try:
+                    fcntl.flock(owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        owner.close()
+                        raise WALError(f'{self.directory} is in use by another process')
+                    time.sleep(0.1)
+            self._owner = owner
+            # Anything copied from a parent process belongs to the parent
+            self._lock = threading.Lock()
+            self._flushed = threading.Condition(self._lock)
+            self._pending = []
+            self._pending_records = 0
+            self._enqueued = 0
+            self._durable = 0
+            self._flushing = False
+            self._error = None
+            self.commits = 0
+            self.records = 0
+            numbers = self.segments()
+            self._number = numbers[-1] if numbers else 1
+            self._file = self._open(self._number)
+            self._pid = os.getpid()
+
+    def close(self):
+        """Flush, close the current file and give up ownership of the log"""
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            while self._flushing:
+                self._flushed.wait()
+            if self._pending:
+                self._flush()
+            self._file.close()
+            self._owner.close()
+            self._pid = None
+
+    def segments(self):
+        """Numbers of the log files on disk, oldest first"""
+        paths = glob.glob(os.path.join(self.directory, 'wal-*.log'))
+        return sorted(int(os.path.basename(p)[len('wal-'):-len('.log')]) for p in paths)
+
+    def _path(self, number):
+        return os.path.join(self.directory, f'wal-{number:010d}.log')
+
+    def _open(self, number):
+        path = self._path(number)
+        created = not os.path.exists(path)
+        f = open(path, 'ab')
+        if created:
+            fsync_directory(self.directory)
+        return f
+
+    @staticmethod
+    def encode(entries):
+        """Framed bytes for a list of JSON-serializable entries"""
+        frames = []
+        for entry in entries:
+            payload = dumps_bytes(entry)
+            frames.append(FRAME.pack(len(payload), zlib.crc32(payload)))
+            frames.append(payload)
+        return b''.join(frames), len(entries)
+
+    def enqueue(self, encoded):
+        """Queue encoded entries for the next commit; returns the ticket to wait() on"""
+        self.open()
+        data, count = encoded
+        with self._lock:
+            self._pending.append(data)
+            self._pending_records += count
+            self._enqueued += 1
+            return self._enqueued
+
+    def wait(self, ticket):
+        """Block until everything up to the ticket is on disk"""
+        with self._lock:
+            while self._durable < ticket and self._error is None:
+                if self._flushing:
+                    self._flushed.wait()
+                else:
+                    self._flush()
+            if self._error is not None:
+                raise WALError(f'Write-ahead log failed: {self._error}')
+
+    def append(self, entries):
+        self.wait(self.enqueue(self.encode(entries)))
+
+    def _flush(self):
+        # Caller holds the lock; it is released while writing so more writers can queue for the next commit
+        self._flushing = True
+        if self.commit_delay:
+            self._lock.release()
+            time.sleep(self.commit_delay)
+            self._lock.acquire()
+        batch, self._pending = self._pending, []
+        records, self._pending_records = self._pending_records, 0
+        target = self._enqueued
+        f = self._file
+        self._lock.release()
+        error = None
+        try:
+            f.write(b''.join(batch))
+            f.flush()
+            os.fsync(f.fileno())
+        except OSError as e:
+            error = e
+        finally:
+            self._lock.acquire()
+            self._flushing = False
+            if error is not None:
+                self._error = error
+            else:
+                self._durable = target
+                self.commits += 1
+                self.records += records
+            self._flushed.notify_all()
+
+    def rotate(self):
+        """Flush and start a new log file; returns the number of the last file that is now closed"""
+        self.open()
+        with self._lock:
+            while self._flushing:
+                self._flushed.wait()
+            if self._pending:
+                self._flush()
+            if self._error is not None:
+                raise WALError(f'Write-ahead log failed: {self._error}')
+            self._file.close()
+            closed = self._number
+            self._number += 1
+            self._file = self._open(self._number)
+            return closed
+
+    def remove_through(self, number):
+        """Delete the log files a checkpoint has made redundant"""
+        self.open()
+        for old in self.segments():
+            if old <= number:
+                os.remove(self._path(old))
+
+    def size(self):
+        self.open()
+        with self._lock:
+            return sum(os.path.getsize(self._path(n)) for n in self.segments())
+
+    def replay(self):
+        """Every entry on disk, oldest first; a torn or corrupt tail (a crash mid-write) is cut off"""
+        self.open()
+        for number in self.segments():
+            path = self._path(number)
+            with open(path, 'rb') as f:
+                data = f.read()
+            offset = 0
+            while offset + FRAME.size <= len(data):
+                length, crc = FRAME.unpack_from(data, offset)
+                payload = data[offset + FRAME.size:offset + FRAME.size + length]
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                yield json.loads(payload)
+                offset += FRAME.size + length
+            if offset < len(data):
+                print(f"Write-ahead log {os.path.basename(path)}: dropping {len(data) - offset} bytes of torn tail")
+                with open(path, 'r+b') as f:
+                    f.truncate(offset)
+                    os.fsync(f.fileno())
+
+    def stats(self):
+        if self._pid != os.getpid():
+            return {'file': None, 'commits': 0, 'records': 0, 'records_per_commit': None}
+        with self._lock:
+            return {'file': self._number, 'commits': self.commits, 'records': self.records,
+                    'records_per_commit': round(self.records / self.commits, 1) if self.commits else None}
@@ -0,0 +1,48 @@
+"""
+Worker processes that start from a clean interpreter
+multiprocessing's spawn and forkserver children re-import the parent's __main__ script, so a pool started
+from `python app_url_digestion.py` would build a second copy of the app in every worker, files and all.
+These workers are a fresh `python -c` that imports only the module of the function it runs
+"""
+import os
+import socket
+import subprocess
+import sys
+from multiprocessing.connection import Connection
+
+
+def _child(fd):
+    """Child side: receive the target and its arguments, then hand it the connection"""
+    conn = Connection(fd)
+    target, args = conn.recv()
+    target(conn, *args)
+
+
+class Worker:
+    def __init__(self, target, *args):
+        """Run target(conn, *args) in a new process; target must be a module-level function outside __main__
+        (it is pickled by reference) and conn is the other end of self.conn"""
+        parent, child = socket.socketpair()
+        # The child finds modules where this process does, wherever it was started from
+        path = os.pathsep.join(os.path.abspath(p or os.curdir) for p in sys.path)
+        code = 'import sys, workers; workers._child(int(sys.argv[1]))'
+        try:
+            self.process = subprocess.Popen([sys.executable, '-c', code, str(child.fileno())],
+                                            pass_fds=(child.fileno(),), stdin=subprocess.DEVNULL,
+                                            env=dict(os.environ, PYTHONPATH=path))
+        except Exception:
+            parent.close()
+            raise
+        finally:
+            child.close()
+        self.conn = Connection(parent.detach())
+        self.conn.send((target, args))
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.conn.close()
@@ -3,11 +3,25 @@
 Website Eater CLI - Command line interface for the Google URL Context-powered Website Eater
 """
 import argparse
+import asyncio
+import bisect
 import json
 import sys
+import time
 import requests
+from collections import Counter
+from datetime import datetime
 from typing import Optional
 
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Upper bounds of the latency histogram buckets (ms); the last bucket is open-ended
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+BULK_ENDPOINTS = ('/api/batch', '/api/ingest')
+
 class WebsiteEaterClient:
     def __init__(self, base_url: str = "http://localhost:5000", user_id: str = "default_user"):
         self.base_url = base_url
@@ -57,10 +71,79 @@ class WebsiteEaterClient:
         data = response.json()
         return data.get("results", []) if data.get("status") == "success" else []
     
-    def get_all_memories(self) -> list:
-        """Get all memories for the user"""
+    def start_reprocess(self, all_users: bool = False) -> dict:
+        """Start re-running the local stages over stored memories"""
+        payload = {} if all_users else {"user_id": self.user_id}
+        response = self.session.post(f"{self.base_url}/api/reprocess", json=payload)
+        return response.json()
+    
+    def reprocess_status(self) -> dict:
+        """Progress of the current or last reprocessing job"""
+        response = self.session.get(f"{self.base_url}/api/reprocess")
+        return response.json()
+    
+    def export_memories(self, path: str, all_users: bool = False, compression: Optional[str] = None) -> int:
+        """Stream the NDJSON archive to a file; returns bytes written"""
+        params = {} if all_users else {"user_id": self.user_id}
+        if compression:
+            params["compression"] = compression
+        written = 0
+        with self.session.get(f"{self.base_url}/api/export", params=params, stream=True) as response:
+            response.raise_for_status()
+            with open(path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+                    written += len(chunk)
+        return written
+    
+    def import_memories(self, path: str, user_id: Optional[str] = None) -> dict:
+        """Stream an NDJSON archive (plain or .zst) from a file into the server"""
+        params = {"user_id": user_id} if user_id else {}
+        with open(path, 'rb') as f:
+            response = self.session.post(
+                f"{self.base_url}/api/import",
+                params=params,
+                data=f,
+                headers={"Content-Type": "application/x-ndjson"}
+            )
+        return response.json()
+    
+    def analytics(self, group_by: Optional[list] = None, all_users: bool = False, refresh: bool = False, **params) -> dict:
+        """Aggregate memory metadata on the server (counts and content lengths per group)"""
+        if refresh:
+            self.session.post(f"{self.base_url}/api/analytics/snapshot").raise_for_status()
+        params = {key: value for key, value in params.items() if value is not None}
+        if group_by:
+            params["group_by"] = ",".join(group_by)
+        if not all_users:
+            params["user_id"] = self.user_id
+        response = self.session.get(f"{self.base_url}/api/analytics", params=params)
+        return response.json()
+    
+    def usage(self, group_by: Optional[list] = None, all_users: bool = False, **params) -> dict:
+        """Token, latency and cost totals from the server's usage ledger"""
+        params = {key: value for key, value in params.items() if value is not None}
+        if group_by:
+            params["group_by"] = ",".join(group_by)
+        if not all_users:
+            params["user_id"] = self.user_id
+        response = self.session.get(f"{self.base_url}/api/usage", params=params)
+        return response.json()
+    
+    def budget(self, daily_tokens: Optional[int] = None, monthly_cost_usd: Optional[float] = None) -> dict:
+        """Show the user's budget, or set it when a cap is given"""
+        url = f"{self.base_url}/api/usage/budget/{self.user_id}"
+        if daily_tokens is None and monthly_cost_usd is None:
+            response = self.session.get(url)
+        else:
+            response = self.session.put(url, json={"daily_tokens": daily_tokens, "monthly_cost_usd": monthly_cost_usd})
+        return response.json()
+    
+    def get_all_memories(self, text: bool = True) -> list:
+        """Get all memories for the user (text=False fetches metadata only)"""
         response = self.session.get(
-            f"{self.base_url}/api/memories/{self.user_id}"
+            f"{self.base_url}/api/memories/{self.user_id}",
+            params=None if text else {'text': '0'}
         )
         
         data = response.json()
@@ -87,6 +170,24 @@ Examples:
   # Get memory statistics
   website-eater stats
 
+  # Weekly counts per content type across all users
+  website-eater analytics --group-by content_type --bucket week --all-users
+
+  # Token and cost totals per user and model, and a daily token cap
+  website-eater usage --group-by user_id,model --all-users
+  website-eater budget --daily-tokens 200000
+
+  # Back up and restore the memory archive (NDJSON, .zst for zstd)
+  website-eater export backup.ndjson.zst --all-users
+  website-eater import backup.ndjson.zst
+
+  # Re-classify and re-index every stored memory after changing routing rules
+  website-eater reprocess --all-users
+
+  # Capacity test: replay a URL list at 20 req/s, or a JSONL traffic log with its original timing
+  website-eater bench urls.txt --rate 20 --requests 2000
+  website-eater bench traffic.jsonl --replay-timing --speed 4
+
 Note: This tool uses Google's URL Context API which has a limit of 20 URLs per request.
 Daily quotas: 1500 requests/day via API, 100 requests/day in Google AI Studio.
         """
@@ -129,11 +230,88 @@ Daily quotas: 1500 requests/day via API, 100 requests/day in Google AI Studio.
     stats_parser.add_argument('--json', action='store_true',
                               help='Output raw JSON response')
     
+    # Analytics command
+    analytics_parser = subparsers.add_parser('analytics', help='Group and filter memory metadata on the server')
+    analytics_parser.add_argument('--group-by', default='domain',
+                                  help='Comma-separated: user_id, domain, content_type, extraction_method, url_accessed')
+    analytics_parser.add_argument('--bucket', choices=['day', 'week', 'month'],
+                                  help='Also group by time period')
+    analytics_parser.add_argument('--domain', help='Only this domain')
+    analytics_parser.add_argument('--content-type', help='Only this content type')
+    analytics_parser.add_argument('--since', help='ISO date/time lower bound')
+    analytics_parser.add_argument('--until', help='ISO date/time upper bound')
+    analytics_parser.add_argument('--limit', type=int, default=20,
+                                  help='Maximum groups (default: 20)')
+    analytics_parser.add_argument('--all-users', action='store_true',
+                                  help='Aggregate every user, not just --user-id')
+    analytics_parser.add_argument('--refresh', action='store_true',
+                                  help='Rebuild the snapshot first')
+    analytics_parser.add_argument('--json', action='store_true',
+                                  help='Output raw JSON response')
+    
+    # Usage command
+    usage_parser = subparsers.add_parser('usage', help='Show LLM token usage and cost')
+    usage_parser.add_argument('--group-by', default='model,content_type',
+                              help='Comma-separated: day, user_id, model, content_type (default: model,content_type)')
+    usage_parser.add_argument('--since', help='First day, YYYY-MM-DD')
+    usage_parser.add_argument('--until', help='Last day, YYYY-MM-DD')
+    usage_parser.add_argument('--all-users', action='store_true',
+                              help='Every user, not just --user-id')
+    usage_parser.add_argument('--json', action='store_true',
+                              help='Output raw JSON response')
+    
+    # Budget command
+    budget_parser = subparsers.add_parser('budget', help='Show or set the LLM budget for --user-id')
+    budget_parser.add_argument('--daily-tokens', type=int,
+                               help='Daily token cap (0 removes it)')
+    budget_parser.add_argument('--monthly-usd', type=float,
+                               help='Monthly cost cap in USD (0 removes it)')
+    
     # List command
     list_parser = subparsers.add_parser('list', help='List all memories')
     list_parser.add_argument('--limit', type=int, default=20,
                              help='Maximum results (default: 20)')
     
+    # Reprocess command
+    reprocess_parser = subparsers.add_parser('reprocess', help='Re-run classification, routing and indexing locally')
+    reprocess_parser.add_argument('--all-users', action='store_true',
+                                  help='Reprocess every user, not just --user-id')
+    reprocess_parser.add_argument('--no-wait', action='store_true',
+                                  help='Start the job and exit without polling progress')
+    
+    # Export command
+    export_parser = subparsers.add_parser('export', help='Export memories as NDJSON')
+    export_parser.add_argument('file', help='Output file (.zst compresses with zstd)')
+    export_parser.add_argument('--all-users', action='store_true',
+                               help='Export every user, not just --user-id')
+    
+    # Import command
+    import_parser = subparsers.add_parser('import', help='Import memories from an NDJSON export')
+    import_parser.add_argument('file', help='NDJSON file, plain or zstd-compressed')
+    import_parser.add_argument('--as-user', action='store_true',
+                               help='Import every memory under --user-id instead of its original user')
+    
+    # Bench command
+    bench_parser = subparsers.add_parser('bench', help='Load-test a server by replaying URLs or a traffic log')
+    bench_parser.add_argument('file', help='URLs (one per line) or a JSONL traffic log of {"method", "path", "body", "timestamp"}')
+    bench_parser.add_argument('--endpoint', default='/api/process',
+                              help='Endpoint for plain URLs (default: /api/process)')
+    bench_parser.add_argument('-n', '--requests', type=int,
+                              help='Total requests, cycling through the file (default: one pass)')
+    bench_parser.add_argument('-c', '--concurrency', type=int, default=10,
+                              help='Requests in flight at once (default: 10)')
+    bench_parser.add_argument('--rate', type=float,
+                              help='Target requests per second (open loop); without it each slot sends as soon as the last finishes')
+    bench_parser.add_argument('--replay-timing', action='store_true',
+                              help='Send log entries at their recorded timestamps')
+    bench_parser.add_argument('--speed', type=float, default=1.0,
+                              help='Replay speed-up for --replay-timing (default: 1.0)')
+    bench_parser.add_argument('--timeout', type=float, default=120.0,
+                              help='Per-request timeout in seconds (default: 120)')
+    bench_parser.add_argument('--interval', type=float, default=1.0,
+                              help='Seconds between live updates (default: 1)')
+    bench_parser.add_argument('--output', help='Write the results as JSON to this file')
+    
     args = parser.parse_args()
     
     if not args.command:
@@ -152,8 +330,22 @@ Daily quotas: 1500 requests/day via API, 100 requests/day in Google AI Studio.
             batch_process_command(client, args)
         elif args.command == 'stats':
             show_stats_command(client, args)
+        elif args.command == 'analytics':
+            analytics_command(client, args)
+        elif args.command == 'usage':
+            usage_command(client, args)
+        elif args.command == 'budget':
+            budget_command(client, args)
         elif args.command == 'list':
             list_memories_command(client, args)
+        elif args.command == 'reprocess':
+            reprocess_command(client, args)
+        elif args.command == 'export':
+            export_command(client, args)
+        elif args.command == 'import':
+            import_command(client, args)
+        elif args.command == 'bench':
+            bench_command(client, args)
     except KeyboardInterrupt:
         print("\nOperation cancelled.")
         sys.exit(1)
@@ -252,53 +444,137 @@ def batch_process_command(client: WebsiteEaterClient, args):
 
 def show_stats_command(client: WebsiteEaterClient, args):
     """Show memory statistics"""
-    memories = client.get_all_memories()
+    stats = server_stats(client) or local_stats(client)
     
     if args.json:
-        stats = {
-            'total_memories': len(memories),
-            'content_types': {},
-            'domains': {}
-        }
-        
-        for memory in memories:
-            metadata = memory.get('metadata', {})
-            
-            # Count content types
-            ct = metadata.get('content_type', 'general')
-            stats['content_types'][ct] = stats['content_types'].get(ct, 0) + 1
-            
-            # Count domains
-            domain = metadata.get('domain', 'unknown')
-            stats['domains'][domain] = stats['domains'].get(domain, 0) + 1
-        
         print(json.dumps(stats, indent=2))
     else:
         print("📊 Memory Statistics")
         print("=" * 40)
-        print(f"Total memories: {len(memories)}")
-        
-        # Content type analysis
-        content_types = {}
-        domains = {}
-        
-        for memory in memories:
-            metadata = memory.get('metadata', {})
-            
-            ct = metadata.get('content_type', 'general')
-            content_types[ct] = content_types.get(ct, 0) + 1
-            
-            domain = metadata.get('domain', 'unknown')
-            domains[domain] = domains.get(domain, 0) + 1
+        print(f"Total memories: {stats['total_memories']}")
         
         print("\n📑 Content Types:")
-        for ct, count in sorted(content_types.items(), key=lambda x: x[1], reverse=True):
+        for ct, count in sorted(stats['content_types'].items(), key=lambda x: x[1], reverse=True):
             print(f"  {ct}: {count}")
         
         print("\n🌐 Top Domains:")
-        for domain, count in sorted(domains.items(), key=lambda x: x[1], reverse=True)[:10]:
+        for domain, count in sorted(stats['domains'].items(), key=lambda x: x[1], reverse=True)[:10]:
             print(f"  {domain}: {count}")
 
+def server_stats(client: WebsiteEaterClient) -> Optional[dict]:
+    """Statistics from the server's analytics, or None if the server has no analytics"""
+    try:
+        # Rebuild the snapshot first so the counts are current, not up to one refresh interval old
+        content_types = client.analytics(group_by=['content_type'], refresh=True)
+        domains = client.analytics(group_by=['domain'])
+    except (requests.RequestException, ValueError):
+        return None
+    if content_types.get('status') != 'success' or domains.get('status') != 'success':
+        return None
+    
+    stats = {
+        'total_memories': sum(row['count'] for row in content_types['results']),
+        'content_types': {},
+        'domains': {},
+        'snapshot': content_types.get('snapshot')
+    }
+    # Memories without a content type or domain count towards the same labels local_stats uses
+    for row in content_types['results']:
+        ct = row['content_type'] or 'general'
+        stats['content_types'][ct] = stats['content_types'].get(ct, 0) + row['count']
+    for row in domains['results']:
+        domain = row['domain'] or 'unknown'
+        stats['domains'][domain] = stats['domains'].get(domain, 0) + row['count']
+    return stats
+
+def local_stats(client: WebsiteEaterClient) -> dict:
+    """Statistics computed from the full memory listing (servers without /api/analytics)"""
+    memories = client.get_all_memories(text=False)
+    stats = {
+        'total_memories': len(memories),
+        'content_types': {},
+        'domains': {}
+    }
+    
+    for memory in memories:
+        metadata = memory.get('metadata', {})
+        
+        # Count content types
+        ct = metadata.get('content_type', 'general')
+        stats['content_types'][ct] = stats['content_types'].get(ct, 0) + 1
+        
+        # Count domains
+        domain = metadata.get('domain', 'unknown')
+        stats['domains'][domain] = stats['domains'].get(domain, 0) + 1
+    
+    return stats
+
+def analytics_command(client: WebsiteEaterClient, args):
+    """Show grouped metadata aggregates"""
+    group_by = [key.strip() for key in args.group_by.split(',') if key.strip()]
+    result = client.analytics(
+        group_by=group_by,
+        all_users=args.all_users,
+        refresh=args.refresh,
+        bucket=args.bucket,
+        domain=args.domain,
+        content_type=args.content_type,
+        since=args.since,
+        until=args.until,
+        limit=args.limit
+    )
+    
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    if result.get('status') != 'success':
+        print(f"❌ Analytics failed: {result.get('error')}")
+        return
+    
+    keys = group_by + (['period'] if args.bucket else [])
+    snapshot = result.get('snapshot') or {}
+    print(f"📈 {len(result['results'])} groups (snapshot: {snapshot.get('rows', '?')} memories, "
+          f"built {snapshot.get('built_at', 'n/a')})\n")
+    for row in result['results']:
+        label = ' / '.join(str(row.get(key)) for key in keys) or 'all'
+        avg = row['avg_content_length'] or 0
+        print(f"  {label}: {row['count']} memories, avg {avg:,.0f} chars")
+
+def usage_command(client: WebsiteEaterClient, args):
+    """Show token usage and cost"""
+    group_by = [key.strip() for key in args.group_by.split(',') if key.strip()]
+    result = client.usage(group_by=group_by, all_users=args.all_users, since=args.since, until=args.until)
+    
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    if result.get('status') != 'success':
+        print(f"❌ Usage failed: {result.get('error')}")
+        return
+    
+    rows = result['results']
+    print(f"🪙 LLM usage ({len(rows)} groups)\n")
+    for row in rows:
+        label = ' / '.join(str(row.get(key)) for key in group_by) or 'all'
+        print(f"  {label}: {row['calls']} calls ({row['errors']} failed), "
+              f"{row['prompt_tokens']:,} in / {row['output_tokens']:,} out / {row['cached_tokens']:,} cached tokens, "
+              f"${row['cost_usd']:.4f}, avg {row['avg_latency_seconds']}s")
+    print(f"\n  Total: ${sum(row['cost_usd'] for row in rows):.4f}")
+
+def budget_command(client: WebsiteEaterClient, args):
+    """Show or set the user's budget"""
+    result = client.budget(daily_tokens=args.daily_tokens, monthly_cost_usd=args.monthly_usd)
+    if result.get('status') != 'success':
+        print(f"❌ Budget failed: {result.get('error')}")
+        return
+    
+    budget = result['budget']
+    daily = f"{budget['daily_tokens']:,}" if budget['daily_tokens'] else 'unlimited'
+    monthly = f"${budget['monthly_cost_usd']:.2f}" if budget['monthly_cost_usd'] else 'unlimited'
+    print(f"💰 Budget for {budget['user_id']}")
+    print(f"  Tokens today: {budget['tokens_today']:,} / {daily}")
+    print(f"  Cost this month: ${budget['cost_this_month_usd']:.4f} / {monthly}")
+
 def list_memories_command(client: WebsiteEaterClient, args):
     """List all memories"""
     memories = client.get_all_memories()
@@ -323,5 +599,255 @@ def list_memories_command(client: WebsiteEaterClient, args):
         print(f"   Preview: {content[:100]}...")
         print()
 
+def export_command(client: WebsiteEaterClient, args):
+    """Export memories to an NDJSON file"""
+    compression = 'zstd' if args.file.endswith('.zst') else None
+    start = time.time()
+    written = client.export_memories(args.file, all_users=args.all_users, compression=compression)
+    print(f"✅ Exported {written / 1024 / 1024:.1f} MB to {args.file} in {time.time() - start:.1f}s")
+
+def import_command(client: WebsiteEaterClient, args):
+    """Import memories from an NDJSON file"""
+    start = time.time()
+    result = client.import_memories(args.file, user_id=args.user_id if args.as_user else None)
+    if result.get('status') == 'success':
+        print(f"✅ Imported {result['imported']} memories "
+              f"({result['skipped_duplicates']} duplicates skipped) in {time.time() - start:.1f}s")
+    else:
+        print(f"❌ Failed after {result.get('imported', 0)} memories: {result.get('error')}")
+
+def reprocess_command(client: WebsiteEaterClient, args):
+    """Start a reprocessing job and follow its progress"""
+    result = client.start_reprocess(all_users=args.all_users)
+    if result.get('status') != 'success':
+        print(f"❌ Failed: {result.get('error')}")
+        return
+    
+    job = result['job']
+    print(f"♻️  Reprocessing {job['total']} memories")
+    while not args.no_wait and job['status'] == 'running':
+        time.sleep(1)
+        job = client.reprocess_status()['job']
+        eta = f", ETA {job['eta_seconds']}s" if job.get('eta_seconds') is not None else ''
+        print(f"\r  {job['processed']}/{job['total']} processed, {job['changed']} changed{eta}   ", end='', flush=True)
+    
+    if not args.no_wait:
+        print()
+        print(f"{'✅' if job['status'] == 'completed' else '❌'} {job['status']}: "
+              f"{job['changed']} changed, {job['failed']} failed in {job['elapsed_seconds']}s")
+        for error in job.get('errors', [])[:5]:
+            print(f"   {error['id']}: {error['error']}")
+
+class LatencyHistogram:
+    """Log-spaced latency buckets plus raw samples for exact percentiles"""
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.samples = []
+    
+    def add(self, latency_ms: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.samples.append(latency_ms)
+    
+    def percentiles(self, *quantiles) -> list:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return [None for _ in quantiles]
+        return [ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in quantiles]
+    
+    def render(self, width: int = 40) -> list:
+        peak = max(self.counts) or 1
+        lines = []
+        for i, count in enumerate(self.counts):
+            label = f"<= {LATENCY_BUCKETS_MS[i]:,} ms" if i < len(LATENCY_BUCKETS_MS) else f" > {LATENCY_BUCKETS_MS[-1]:,} ms"
+            lines.append(f"  {label:>12} {'█' * round(count / peak * width):<{width}} {count}")
+        return lines
+
+class BenchStats:
+    def __init__(self, total: int):
+        self.total = total
+        self.sent = 0
+        self.succeeded = 0
+        self.errors = Counter()
+        self.histogram = LatencyHistogram()
+        self.start = time.perf_counter()
+    
+    @property
+    def completed(self) -> int:
+        return self.succeeded + sum(self.errors.values())
+    
+    def record(self, latency_ms: Optional[float], error: Optional[str]):
+        if error:
+            self.errors[error] += 1
+        else:
+            self.succeeded += 1
+            self.histogram.add(latency_ms)
+    
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.start
+        p50, p95, p99 = self.histogram.percentiles(0.50, 0.95, 0.99)
+        return {
+            'requests': self.completed,
+            'succeeded': self.succeeded,
+            'errors': dict(self.errors),
+            'elapsed_seconds': round(elapsed, 2),
+            'throughput_rps': round(self.completed / elapsed, 2) if elapsed else 0,
+            'latency_ms': {q: round(v, 1) if v is not None else None for q, v in (('p50', p50), ('p95', p95), ('p99', p99))},
+            'histogram': dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ['inf'], self.histogram.counts))
+        }
+    
+    def render(self) -> list:
+        s = self.summary()
+        latency = '  '.join(f"{q} {v:,.0f} ms" for q, v in s['latency_ms'].items() if v is not None) or 'no successes yet'
+        errors = ', '.join(f"{kind} {count}" for kind, count in self.errors.most_common()) or 'none'
+        return [
+            f"⏱  {s['elapsed_seconds']:.0f}s  {self.completed}/{self.total} done, {self.sent - self.completed} in flight, "
+            f"{s['throughput_rps']:.1f} req/s",
+            f"  {latency}",
+            f"  errors: {errors}"
+        ] + self.histogram.render()
+
+def load_bench_requests(path: str, endpoint: str, user_id: str) -> list:
+    """Requests to replay: plain lines are URLs for endpoint, JSON lines are traffic log entries"""
+    items = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                entry = json.loads(line)
+                timestamp = entry.get('timestamp')
+                if isinstance(timestamp, str):
+                    timestamp = datetime.fromisoformat(timestamp).timestamp()
+                items.append({
+                    'method': entry.get('method', 'POST').upper(),
+                    'path': entry.get('path', endpoint),
+                    'body': entry.get('body'),
+                    'timestamp': timestamp
+                })
+            else:
+                body = {'urls': [line]} if endpoint in BULK_ENDPOINTS else {'url': line}
+                body['user_id'] = user_id
+                items.append({'method': 'POST', 'path': endpoint, 'body': body, 'timestamp': None})
+    return items
+
+def classify_bench_response(status_code: int, body) -> Optional[str]:
+    """None for a success, otherwise quota, extraction or http_<status>"""
+    body = body if isinstance(body, dict) else {}
+    error = str(body.get('error', ''))
+    if status_code == 429 or 'RESOURCE_EXHAUSTED' in error or 'quota' in error.lower():
+        return 'quota'
+    if status_code >= 500 or status_code in (401, 403, 404, 405):
+        return f"http_{status_code}"
+    if status_code >= 400 or body.get('status') == 'error':
+        return 'extraction'
+    # Bulk endpoints answer 200/202 and report failed URLs per item
+    if any(isinstance(item, dict) and item.get('status') == 'error' for item in body.get('results', [])):
+        return 'extraction'
+    return None
+
+async def run_bench(base_url: str, items: list, stats: BenchStats, concurrency: int, rate: Optional[float],
+                    replay_timing: bool, speed: float, timeout: float):
+    """Send stats.total requests over one pooled connection set.
+    Open loop (rate or replay timing) measures latency from each request's scheduled time,
+    so queueing behind slow requests is counted rather than hidden"""
+    loop = asyncio.get_running_loop()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as http:
+        async def send(item, scheduled):
+            stats.sent += 1
+            try:
+                response = await http.request(item['method'], item['path'], json=item['body'])
+            except httpx.TimeoutException:
+                stats.record(None, 'timeout')
+                return
+            except httpx.HTTPError:
+                stats.record(None, 'connection')
+                return
+            try:
+                body = response.json()
+            except ValueError:
+                body = None
+            stats.record((loop.time() - scheduled) * 1000, classify_bench_response(response.status_code, body))
+        
+        if rate or replay_timing:
+            slots = asyncio.Semaphore(concurrency)
+            first = min((item['timestamp'] for item in items if item['timestamp'] is not None), default=0)
+            
+            async def scheduled_send(item, scheduled):
+                async with slots:
+                    await send(item, scheduled)
+            
+            start = loop.time()
+            tasks = []
+            for i in range(stats.total):
+                item = items[i % len(items)]
+                offset = ((item['timestamp'] or first) - first) / speed if replay_timing else i / rate
+                delay = start + offset - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(scheduled_send(item, start + offset)))
+            await asyncio.gather(*tasks)
+        else:
+            next_index = iter(range(stats.total))
+            
+            async def worker():
+                for i in next_index:
+                    await send(items[i % len(items)], loop.time())
+            
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+async def show_bench_progress(stats: BenchStats, interval: float):
+    """Redraw the live view in place on a terminal, or print one line per interval otherwise"""
+    drawn = 0
+    while True:
+        await asyncio.sleep(interval)
+        lines = stats.render()
+        if sys.stdout.isatty():
+            if drawn:
+                print(f"\x1b[{drawn}F\x1b[J", end='')
+            print('\n'.join(lines), flush=True)
+            drawn = len(lines)
+        else:
+            print(f"{lines[0]} |{lines[1]} |{lines[2]}", flush=True)
+
+async def bench(base_url: str, items: list, stats: BenchStats, args):
+    progress = asyncio.create_task(show_bench_progress(stats, args.interval))
+    try:
+        await run_bench(base_url, items, stats, args.concurrency, args.rate, args.replay_timing, args.speed, args.timeout)
+    finally:
+        progress.cancel()
+
+def bench_command(client: WebsiteEaterClient, args):
+    """Replay URLs or a traffic log against the server and report latency, errors and throughput"""
+    if httpx is None:
+        print("❌ bench needs httpx (pip install httpx)")
+        sys.exit(1)
+    items = load_bench_requests(args.file, args.endpoint, client.user_id)
+    if not items:
+        print(f"❌ No requests in {args.file}")
+        sys.exit(1)
+    if args.replay_timing and not any(item['timestamp'] is not None for item in items):
+        print("❌ --replay-timing needs a traffic log with timestamps")
+        sys.exit(1)
+    
+    total = len(items) if args.replay_timing else (args.requests or len(items))
+    mode = ('replaying recorded timing' + (f" x{args.speed:g}" if args.speed != 1 else '') if args.replay_timing
+            else f"{args.rate:g} req/s" if args.rate else f"concurrency {args.concurrency}")
+    print(f"🏋️  {total} requests to {client.base_url} ({mode}, up to {args.concurrency} in flight)")
+    
+    stats = BenchStats(total)
+    try:
+        asyncio.run(bench(client.base_url, items, stats, args))
+    except KeyboardInterrupt:
+        print("\nStopped early.")
+    
+    result = stats.summary()
+    print("\n" + "\n".join(stats.render()))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults saved to: {args.output}")
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Build the static UI bundle served by nginx (and by the Flask app as a fallback)
+
+Inline <style> and <script> blocks move into content-hashed files under dist/assets/ so they can be
+cached forever; every output file gets precompressed .gz and .br (when brotli is installed) siblings.
+
+    python frontend/build.py
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FRONTEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DIST_DIR = os.path.join(FRONTEND_DIR, 'dist')
+PAGES = ['index.html', 'index-static.html']
+
+STYLE_PATTERN = re.compile(r'<style>(.*?)</style>', re.DOTALL)
+# Inline scripts only: <script src=...> tags pointing at CDNs are left alone
+SCRIPT_PATTERN = re.compile(r'<script(?P<attrs>(?![^>]*\bsrc=)[^>]*)>(?P<body>.*?)</script>', re.DOTALL)
+
+
+def write_asset(stem, extension, content, manifest):
+    """Write content under a hashed name and return its URL"""
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:10]
+    name = f"{stem}.{digest}.{extension}"
+    with open(os.path.join(DIST_DIR, 'assets', name), 'w', encoding='utf-8') as f:
+        f.write(content)
+    manifest[f"{stem}.{extension}"] = f"assets/{name}"
+    return f"/assets/{name}"
+
+
+def build_page(page, manifest):
+    with open(os.path.join(FRONTEND_DIR, page), encoding='utf-8') as f:
+        html = f.read()
+    stem = os.path.splitext(page)[0]
+
+    html = STYLE_PATTERN.sub(
+        lambda m: f'<link rel="stylesheet" href="{write_asset(stem, "css", m.group(1).strip(), manifest)}">',
+        html
+    )
+    html = SCRIPT_PATTERN.sub(
+        lambda m: f'<script{m.group("attrs")} src="{write_asset(stem, "js", m.group("body").strip(), manifest)}"></script>',
+        html
+    )
+    with open(os.path.join(DIST_DIR, page), 'w', encoding='utf-8') as f:
+        f.write(html)
+
+
+def precompress(directory):
+    """Write .gz and .br next to every file so servers never compress on the fly"""
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                body = f.read()
+            with open(path + '.gz', 'wb') as f:
+                f.write(gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(path + '.br', 'wb') as f:
+                    f.write(brotli.compress(body))
+
+
+def main():
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    os.makedirs(os.path.join(DIST_DIR, 'assets'))
+
+    manifest = {}
+    for page in PAGES:
+        build_page(page, manifest)
+    with open(os.path.join(DIST_DIR, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    precompress(DIST_DIR)
+
+    print(f"Built {len(PAGES)} pages and {len(manifest)} assets into {DIST_DIR}")
+    if brotli is None:
+        print("brotli is not installed - only .gz variants were written")
+
+
+if __name__ == '__main__':
+    main()